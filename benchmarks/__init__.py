@@ -0,0 +1 @@
+"""Benchmarks of the drift SDK."""
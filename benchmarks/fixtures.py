@@ -0,0 +1,132 @@
+"""Account-byte fixtures for the benchmarks.
+
+Fixtures are read from `<directory>/<kind>.bin` when they were recorded from the chain (see `record_fixtures`), and
+are otherwise built deterministically from the account layouts with a seeded random generator, so every run of the
+suite parses exactly the same bytes.
+"""
+import os
+import random
+from typing import Dict, Optional
+
+from construct import Array, BytesInteger, Container, Flag, FormatField, Renamed, Struct
+from solana.publickey import PublicKey
+from solana.rpc.async_api import AsyncClient as SolanaClient
+
+from sdk.constants import CLEARING_HOUSE_ADDRESSES, NUMBER_OF_CURRENT_MARKETS
+from sdk.layouts import Base58EncodingLayout
+from sdk.calls.asynchronous import load_account_bytes, load_program_accounts_bytes
+from sdk.state.all import *
+
+FIXTURES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+DEFAULT_SEED = 42
+
+FIXTURE_KINDS = {
+    'DriftMarkets': DriftMarkets,
+    'UserAccount': UserAccount,
+    'UserPositions': UserPositions,
+    'CurveHistory': CurveHistory,
+    'DepositHistory': DepositHistory,
+    'FundingPaymentHistory': FundingPaymentHistory,
+    'FundingRateHistory': FundingRateHistory,
+    'LiquidationHistory': LiquidationHistory,
+    'TradeHistory': TradeHistory
+}
+
+HISTORY_FIXTURE_ADDRESSES = {
+    'CurveHistory': 'curve',
+    'DepositHistory': 'deposit',
+    'FundingPaymentHistory': 'funding_payment',
+    'FundingRateHistory': 'funding_rate',
+    'LiquidationHistory': 'liquidation',
+    'TradeHistory': 'trade'
+}
+
+START_TS = 1640995200
+
+
+def _build_value(subcon, name: Optional[str], rng: random.Random):
+    """Get a random value that the layout can build, keeping enums and indices in range."""
+    if isinstance(subcon, Renamed):
+        return _build_value(subcon.subcon, subcon.name, rng)
+    if isinstance(subcon, Struct):
+        return Container({
+            field.name: _build_value(field.subcon, field.name, rng) for field in subcon.subcons if field.name
+        })
+    if isinstance(subcon, Array):
+        return [_build_value(subcon.subcon, name, rng) for _ in range(subcon.count)]
+    if isinstance(subcon, Base58EncodingLayout):
+        return PublicKey(bytes(rng.getrandbits(8) for _ in range(32)))
+    if subcon is Flag:
+        return rng.random() < 0.5
+    if isinstance(subcon, BytesInteger):
+        value = rng.randrange(10 ** 6, 10 ** 18)
+        return -value if subcon.signed and rng.random() < 0.5 else value
+    if isinstance(subcon, FormatField):
+        if name == 'market_index':
+            return rng.randrange(NUMBER_OF_CURRENT_MARKETS)
+        if name is not None and name.endswith('ts'):
+            return START_TS + rng.randrange(86400)
+        if subcon.length == 1:
+            # enums such as directions and oracle sources
+            return rng.randrange(2)
+        return rng.randrange(2 ** 31)
+    raise Exception(f'Cannot build a fixture value for {subcon}.')
+
+
+def build_fixture(kind: str, seed: int = DEFAULT_SEED) -> bytes:
+    """Build the bytes of an account of a kind from random values, deterministically for a seed.
+
+    History buffers are filled completely, with increasing timestamps and record ids."""
+    account_class = FIXTURE_KINDS[kind]
+    rng = random.Random(f'{kind}-{seed}')
+    container = _build_value(account_class.layout, None, rng)
+    if 'records' in container:
+        for index, record in enumerate(container.records):
+            record.ts = START_TS + 60 * index
+            record.record_id = index + 1
+        container.head = 0
+    return account_class.layout.build(container)
+
+
+def load_fixture(kind: str, directory: str = FIXTURES_DIRECTORY, seed: int = DEFAULT_SEED) -> bytes:
+    """Get the recorded bytes of an account of a kind, or build them if none were recorded."""
+    path = os.path.join(directory, f'{kind}.bin')
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            return f.read()
+    return build_fixture(kind=kind, seed=seed)
+
+
+def load_fixtures(directory: str = FIXTURES_DIRECTORY, seed: int = DEFAULT_SEED) -> Dict[str, bytes]:
+    """Get the bytes of every fixture kind."""
+    return {kind: load_fixture(kind=kind, directory=directory, seed=seed) for kind in FIXTURE_KINDS}
+
+
+async def record_fixtures(client: SolanaClient, directory: str = FIXTURES_DIRECTORY) -> Dict[str, int]:
+    """Save the current bytes of the markets, the history buffers and one user account and positions account.
+
+    :param client: Solana client object.
+    :param directory: Where to write the fixtures.
+    :return: The number of bytes written per kind."""
+    accounts = {
+        'DriftMarkets': await load_account_bytes(
+            client=client,
+            address=CLEARING_HOUSE_ADDRESSES.markets
+        )
+    }
+    for kind, history_type in HISTORY_FIXTURE_ADDRESSES.items():
+        accounts[kind] = await load_account_bytes(
+            client=client,
+            address=getattr(CLEARING_HOUSE_ADDRESSES.history, history_type)
+        )
+    for kind, account_name in [('UserAccount', 'User'), ('UserPositions', 'UserPositions')]:
+        program_accounts = await load_program_accounts_bytes(
+            client=client,
+            account_name=account_name
+        )
+        accounts[kind] = program_accounts[0][1]
+    os.makedirs(directory, exist_ok=True)
+    for kind, bytes_data in accounts.items():
+        with open(os.path.join(directory, f'{kind}.bin'), 'wb') as f:
+            f.write(bytes_data)
+    return {kind: len(bytes_data) for kind, bytes_data in accounts.items()}
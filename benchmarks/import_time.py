@@ -0,0 +1,78 @@
+"""Cold-start cost of importing the SDK modules.
+
+Every module is imported in a fresh interpreter with `-X importtime`, so nothing is cached between measurements.
+Run from the repository root::
+
+    python -m benchmarks.import_time --repeat 5 > import_time.json
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from typing import Dict, List
+
+MODULES = [
+    'sdk',
+    'sdk.constants',
+    'sdk.state.all',
+    'sdk.instructions.all',
+    'sdk.calls.asynchronous',
+    'sdk.sends.asynchronous',
+    'sdk.client',
+    'drift.drift'
+]
+
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_import_time(module: str) -> int:
+    """Get the cumulative import time of a module in microseconds, as reported by `-X importtime`."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=REPOSITORY_ROOT,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise Exception(f'Importing {module} failed: {result.stderr.strip().splitlines()[-1]}')
+    for line in reversed(result.stderr.splitlines()):
+        # import time: self [us] | cumulative | imported package
+        if line.startswith('import time:') and line.rsplit('|', 1)[-1].strip() == module:
+            return int(line.split('|')[1])
+    raise Exception(f'No import time reported for {module}.')
+
+
+def run(modules: List[str], repeat: int) -> Dict[str, dict]:
+    """Measure the import time of each module several times.
+
+    :param modules: The modules to import.
+    :param repeat: The number of cold imports per module."""
+    results = {}
+    for module in modules:
+        try:
+            timings = [measure_import_time(module=module) for _ in range(repeat)]
+        except Exception as e:
+            results[module] = {'error': str(e)}
+            continue
+        results[module] = {
+            'median_us': statistics.median(timings),
+            'min_us': min(timings),
+            'max_us': max(timings),
+            'runs': repeat
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('modules', nargs='*', default=MODULES, help='modules to import')
+    parser.add_argument('--repeat', type=int, default=5, help='cold imports per module')
+    args = parser.parse_args()
+    results = run(modules=args.modules, repeat=args.repeat)
+    print(json.dumps({'python': sys.version.split()[0], 'import_time': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+"""Benchmarks of the parsing, instruction building and analytics hot paths.
+
+Run from the repository root and keep the JSON of each commit to compare them::
+
+    python -m benchmarks.suite --output bench.json
+    python -m benchmarks.suite --output bench_new.json --compare bench.json
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import datetime
+import subprocess
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+from solana.publickey import PublicKey
+
+from sdk.constants import CLEARING_HOUSE_ADDRESSES
+from sdk.instructions.all import OpenPositionInstruction, ClosePositionInstruction
+from benchmarks.fixtures import FIXTURE_KINDS, FIXTURES_DIRECTORY, DEFAULT_SEED, load_fixtures
+
+DEFAULT_USER_COUNTS = [10_000, 100_000]
+
+
+def time_call(function: Callable, number: int, repeat: int = 3) -> float:
+    """Get the best time per call in seconds over several repeats."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def benchmark_parsing(fixtures: Dict[str, bytes], number: int) -> Dict[str, dict]:
+    """Parse throughput of each account layout."""
+    results = {}
+    for kind, bytes_data in fixtures.items():
+        account_class = FIXTURE_KINDS[kind]
+        seconds = time_call(lambda: account_class.parse(bytes_data=bytes_data), number=number)
+        results[kind] = {
+            'bytes': len(bytes_data),
+            'seconds_per_parse': seconds,
+            'parses_per_second': 1 / seconds,
+            'megabytes_per_second': len(bytes_data) / seconds / 1e6
+        }
+    return results
+
+
+def benchmark_instructions(number: int) -> Dict[str, dict]:
+    """Build rate of the position instructions, from the instruction object to a TransactionInstruction."""
+    rng = random.Random(DEFAULT_SEED)
+    accounts = {
+        name: PublicKey(bytes(rng.getrandbits(8) for _ in range(32)))
+        for name in ['user', 'authority', 'user_positions', 'oracle']
+    }
+    instruction_accounts = dict(
+        state=CLEARING_HOUSE_ADDRESSES.state,
+        markets=CLEARING_HOUSE_ADDRESSES.markets,
+        trade_history=CLEARING_HOUSE_ADDRESSES.history.trade,
+        funding_payment_history=CLEARING_HOUSE_ADDRESSES.history.funding_payment,
+        funding_rate_history=CLEARING_HOUSE_ADDRESSES.history.funding_rate,
+        program_id=CLEARING_HOUSE_ADDRESSES.program,
+        **accounts
+    )
+    instructions = {
+        'OpenPositionInstruction': lambda: OpenPositionInstruction(
+            direction=0,
+            quote_asset_amount=100_000_000,
+            market_index=0,
+            limit_price=0
+        ),
+        'ClosePositionInstruction': lambda: ClosePositionInstruction(
+            market_index=0
+        )
+    }
+    results = {}
+    for name, create in instructions.items():
+        seconds = time_call(lambda: create().get_instruction(**instruction_accounts), number=number)
+        results[name] = {
+            'seconds_per_build': seconds,
+            'builds_per_second': 1 / seconds
+        }
+    return results
+
+
+def synthetic_drift(number_of_users: int, seed: int = DEFAULT_SEED):
+    """Get a Drift analytics object holding random markets and users shaped like the anchorpy accounts."""
+    from drift.drift import Drift, MARKET_INDEX_TO_PERP
+
+    rng = random.Random(seed)
+    now = int(datetime.datetime(2022, 1, 1).timestamp())
+    markets = []
+    for _ in MARKET_INDEX_TO_PERP:
+        amm = SimpleNamespace(
+            oracle=str(rng.getrandbits(64)),
+            base_asset_reserve=rng.randrange(10 ** 17, 10 ** 18),
+            quote_asset_reserve=rng.randrange(10 ** 17, 10 ** 18),
+            cumulative_funding_rate_long=rng.randrange(-10 ** 14, 10 ** 14),
+            cumulative_funding_rate_short=rng.randrange(-10 ** 14, 10 ** 14),
+            last_funding_rate=rng.randrange(-10 ** 12, 10 ** 12),
+            last_funding_rate_ts=now,
+            last_oracle_price_twap=rng.randrange(10 ** 10, 10 ** 14),
+            last_mark_price_twap=rng.randrange(10 ** 10, 10 ** 14),
+            last_mark_price_twap_ts=now,
+            sqrt_k=rng.randrange(10 ** 17, 10 ** 18),
+            peg_multiplier=rng.randrange(10 ** 3, 10 ** 6),
+            total_fee=rng.randrange(10 ** 12),
+            total_fee_minus_distributions=rng.randrange(10 ** 12),
+            total_fee_withdrawn=rng.randrange(10 ** 10)
+        )
+        base_asset_amount_long = rng.randrange(10 ** 17)
+        base_asset_amount_short = -rng.randrange(10 ** 17)
+        markets.append(SimpleNamespace(
+            initialized=True,
+            base_asset_amount=base_asset_amount_long + base_asset_amount_short,
+            base_asset_amount_long=base_asset_amount_long,
+            base_asset_amount_short=base_asset_amount_short,
+            open_interest=rng.randrange(10 ** 5),
+            amm=amm
+        ))
+    users = [
+        SimpleNamespace(
+            public_key=f'user-{index}',
+            account=SimpleNamespace(
+                authority=f'authority-{index}',
+                collateral=rng.randrange(10 ** 12),
+                cumulative_deposits=rng.randrange(10 ** 12),
+                total_fee_paid=rng.randrange(10 ** 10),
+                total_token_discount=rng.randrange(10 ** 8)
+            )
+        ) for index in range(number_of_users)
+    ]
+    drift = Drift.__new__(Drift)
+    drift.mkt_account = SimpleNamespace(markets=markets)
+    drift.all_users = users
+    return drift
+
+
+def benchmark_summaries(user_counts: List[int], repeat: int) -> Dict[str, dict]:
+    """Latency of Drift.market_summary, and of Drift.user_summary per number of users."""
+    results = {}
+    drift = synthetic_drift(number_of_users=0)
+    try:
+        seconds = time_call(drift.market_summary, number=1, repeat=repeat)
+        results['market_summary'] = {'seconds': seconds}
+    except Exception as e:
+        results['market_summary'] = {'error': repr(e)}
+    for number_of_users in user_counts:
+        drift = synthetic_drift(number_of_users=number_of_users)
+        try:
+            seconds = time_call(drift.user_summary, number=1, repeat=repeat)
+            results[f'user_summary_{number_of_users}'] = {
+                'seconds': seconds,
+                'users_per_second': number_of_users / seconds
+            }
+        except Exception as e:
+            results[f'user_summary_{number_of_users}'] = {'error': repr(e)}
+    return results
+
+
+def get_commit() -> Optional[str]:
+    """Get the commit the suite runs on, if it runs in a git checkout."""
+    try:
+        result = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def run(
+        fixtures_directory: str = FIXTURES_DIRECTORY, user_counts: List[int] = DEFAULT_USER_COUNTS,
+        number: int = 20, repeat: int = 3
+) -> dict:
+    """Run every benchmark.
+
+    :param fixtures_directory: Where recorded fixtures are looked for.
+    :param user_counts: The numbers of synthetic users for the user summary.
+    :param number: Calls per timing of the parse and build benchmarks.
+    :param repeat: Timings per benchmark, of which the best is kept."""
+    fixtures = load_fixtures(directory=fixtures_directory)
+    results = {
+        'commit': get_commit(),
+        'python': sys.version.split()[0],
+        'created': datetime.datetime.utcnow().isoformat(timespec='seconds'),
+        'parse': benchmark_parsing(fixtures=fixtures, number=number),
+        'instructions': benchmark_instructions(number=number * 50),
+        'summaries': benchmark_summaries(user_counts=user_counts, repeat=repeat)
+    }
+    return results
+
+
+def compare(previous: dict, current: dict) -> Dict[str, float]:
+    """Get the ratio current / previous of every timing present in both results; above 1 is a slowdown."""
+    ratios = {}
+    for group in ['parse', 'instructions', 'summaries']:
+        for name, result in current.get(group, {}).items():
+            previous_result = previous.get(group, {}).get(name, {})
+            for key, value in result.items():
+                if key.startswith('seconds') and key in previous_result:
+                    ratios[f'{group}.{name}'] = value / previous_result[key]
+    return ratios
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', help='file to save the results to, printed if not given')
+    parser.add_argument('--compare', help='results of a previous run to compare with')
+    parser.add_argument('--fixtures', default=FIXTURES_DIRECTORY, help='directory of recorded fixtures')
+    parser.add_argument('--users', type=int, nargs='+', default=DEFAULT_USER_COUNTS, help='synthetic user counts')
+    parser.add_argument('--number', type=int, default=20, help='calls per parse timing')
+    parser.add_argument('--repeat', type=int, default=3, help='timings per benchmark')
+    args = parser.parse_args()
+    results = run(fixtures_directory=args.fixtures, user_counts=args.users, number=args.number, repeat=args.repeat)
+    if args.compare:
+        with open(args.compare) as f:
+            results['ratios'] = compare(previous=json.load(f), current=results)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
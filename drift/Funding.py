@@ -0,0 +1,126 @@
+import numpy as np
+
+ONE_HOUR = 3600
+
+
+def calculateTwap(last_twap, last_ts, price, ts, period):
+    '''
+    Time weighted average price, updated the same way the clearing house
+    updates last_mark_price_twap: the previous average keeps the weight of
+    whatever is left of the period and the new price gets the weight of the
+    time elapsed since the last update.
+    '''
+    since_last = max(1, ts - last_ts)
+    from_start = max(0, period - since_last)
+    return (last_twap*from_start + price*since_last)/(from_start + since_last)
+
+
+def calculateFundingPayments(sizes, last_cumulative_funding_rates,
+                             cumulative_funding_rate_long, cumulative_funding_rate_short):
+    '''
+    Funding owed to every position at once. Sizes are signed base asset
+    amounts (positive for longs). Longs are paid against the long cumulative
+    rate and shorts against the short one; a positive rate means longs pay
+    shorts. Returns the quote amount to add to each position's margin.
+    '''
+    sizes = np.asarray(sizes, dtype=float)
+    last_cumulative_funding_rates = np.asarray(last_cumulative_funding_rates, dtype=float)
+    cumulative_funding_rates = np.where(
+        sizes > 0, cumulative_funding_rate_long, cumulative_funding_rate_short
+    )
+    return -(cumulative_funding_rates - last_cumulative_funding_rates)*sizes
+
+
+class Funding():
+    '''
+    The funding function of a market. It keeps time weighted averages of the
+    mark and oracle prices and, every funding period, moves the market's
+    cumulative funding rates by the mark/oracle spread scaled to a daily rate.
+    Positions are then settled against the cumulative rates in a single array
+    operation.
+    '''
+    def __init__(self, market, funding_period=ONE_HOUR, twap_period=ONE_HOUR, start_ts=0) -> None:
+        self.market = market
+        self.funding_period = funding_period
+        self.twap_period = twap_period
+        self.last_mark_price_twap = market.getSpot()
+        self.last_oracle_price_twap = market.index
+        self.last_twap_ts = start_ts
+        self.last_funding_rate = 0
+        self.last_funding_rate_ts = start_ts
+        # One row per funding update: ts, funding rate, mark twap, oracle twap
+        self.history = []
+
+    def updateTwaps(self, ts, oracle_price=None):
+        '''
+        Fold the current mark price and the oracle price (the market index by
+        default) into the running averages.
+        '''
+        if oracle_price is not None:
+            self.market.index = oracle_price
+        self.last_mark_price_twap = calculateTwap(
+            self.last_mark_price_twap, self.last_twap_ts, self.market.getSpot(), ts, self.twap_period
+        )
+        self.last_oracle_price_twap = calculateTwap(
+            self.last_oracle_price_twap, self.last_twap_ts, self.market.index, ts, self.twap_period
+        )
+        self.last_twap_ts = ts
+
+    def updateFundingRate(self, ts):
+        '''
+        Once a funding period has elapsed, move the cumulative funding rates of
+        the market. Returns the funding rate applied, or None if it is too early.
+        '''
+        if ts < self.last_funding_rate_ts + self.funding_period:
+            return None
+        period_adjustment = (24*ONE_HOUR)/max(ONE_HOUR, self.funding_period)
+        price_spread = self.last_mark_price_twap - self.last_oracle_price_twap
+        funding_rate = price_spread/period_adjustment
+        self.market.cumulative_funding_rate_long += funding_rate
+        self.market.cumulative_funding_rate_short += funding_rate
+        self.last_funding_rate = funding_rate
+        self.last_funding_rate_ts = ts
+        self.history.append(
+            (ts, funding_rate, self.last_mark_price_twap, self.last_oracle_price_twap)
+        )
+        return funding_rate
+
+    def update(self, ts, oracle_price=None):
+        '''
+        Advance the funding state to time ts.
+        '''
+        self.updateTwaps(ts, oracle_price)
+        return self.updateFundingRate(ts)
+
+    def settleArrays(self, sizes, last_cumulative_funding_rates):
+        '''
+        Settle positions given as arrays. Returns the payments and the new
+        last cumulative funding rate of every position.
+        '''
+        payments = calculateFundingPayments(
+            sizes, last_cumulative_funding_rates,
+            self.market.cumulative_funding_rate_long, self.market.cumulative_funding_rate_short
+        )
+        settled_rates = np.where(
+            np.asarray(sizes) > 0,
+            self.market.cumulative_funding_rate_long, self.market.cumulative_funding_rate_short
+        )
+        return payments, settled_rates
+
+    def settlePositions(self, positions=None):
+        '''
+        Settle funding for a list of positions (all open positions of the
+        market by default) and return the payment owed to each of them.
+        '''
+        if positions is None:
+            positions = self.market.positions
+        if len(positions) == 0:
+            return np.zeros(0)
+        sizes = np.fromiter((pos.size for pos in positions), dtype=float, count=len(positions))
+        last_rates = np.fromiter(
+            (pos.last_cumulative_funding_rate for pos in positions), dtype=float, count=len(positions)
+        )
+        payments, settled_rates = self.settleArrays(sizes, last_rates)
+        for pos, rate in zip(positions, settled_rates):
+            pos.last_cumulative_funding_rate = rate
+        return payments
@@ -17,6 +17,9 @@ class Market():
         # List of open positions on this market
         self.positions = []
         self.ID = marketID
+        # Funding paid per unit of base asset since the market opened
+        self.cumulative_funding_rate_long = 0
+        self.cumulative_funding_rate_short = 0
 
     def swapBaseIn(self, amountInBase):
         '''
@@ -64,12 +67,14 @@ class Market():
             # = *(-1) the trader gets a net negative base asset amount
             size, _ = self.swapQuoteIn(quoteOpenSize)
             size = -size
-            pos = Position(traderID, self.ID, abs(quoteOpenSize), size, "short")
+            pos = Position(traderID, self.ID, abs(quoteOpenSize), size, "short", 
+                           self.cumulative_funding_rate_short)
             self.positions.append(pos)
             return pos 
         size, _ = self.swapQuoteIn(quoteOpenSize)
         size = -size
-        pos = Position(traderID, self.ID, quoteOpenSize, size, "long")
+        pos = Position(traderID, self.ID, quoteOpenSize, size, "long", 
+                       self.cumulative_funding_rate_long)
         self.positions.append(pos)
         return pos
 
@@ -1,7 +1,8 @@
 class Position():
     '''
     '''
-    def __init__(self, traderID, marketID, notional, base_asset_amount, side) -> None:
+    def __init__(self, traderID, marketID, notional, base_asset_amount, side, 
+                 last_cumulative_funding_rate=0) -> None:
         self.marketID = marketID
         self.traderID = traderID
         # Initial net value of the position in quote asset
@@ -9,6 +10,8 @@ class Position():
         # Base asset amount in the position
         self.size = base_asset_amount
         self.side = side
+        # Cumulative funding rate of the market when funding was last settled
+        self.last_cumulative_funding_rate = last_cumulative_funding_rate
 
     def getUnrealizedPnL(self, Market):
         '''
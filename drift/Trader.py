@@ -44,6 +44,15 @@ class Trader():
         self.margin += pnl 
         self.positions.pop(pos_index)
 
+    def settleFunding(self, fundings):
+        '''
+        Given a dictionary of funding functions whose keys are the market IDs,
+        settle the funding owed on every open position into the margin account.
+        '''
+        for marketID, funding in fundings.items():
+            positions = [pos for pos in self.positions if pos.marketID == marketID]
+            self.margin += funding.settlePositions(positions).sum()
+
     def getMarginRatio(self, markets):
         '''
         Given a dictionary of markets where each index is the market ID, 
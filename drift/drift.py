@@ -2,13 +2,12 @@ from pathlib import Path
 import asyncio
 import json
 from solana.publickey import PublicKey
-from anchorpy import Idl, Program, Provider
-import anchorpy
 import os
-import pandas as pd
-import numpy as np
 import datetime
 
+# anchorpy, pandas and numpy are imported where they are used, so that importing
+# this module stays cheap for short-lived jobs
+
 from .chmath import calculate_mark_price
 
 IDL_FILE = "drift-py/drift/clearing_house.json"
@@ -41,8 +40,101 @@ MARKET_INDEX_TO_PERP = {
 }
 
 
+# attribute holding the records of each history account
+HISTORY_RECORDS_ATTRIBUTE = {
+    "deposit": "deposit_records",
+    "trade": "trade_records",
+    "liquidation": "liquidation_records",
+    "fundingPayment": "funding_payment_records",
+    "fundingRate": "funding_rate_records",
+    "curve": "curve_records",
+    "extendedCurve": "curve_records",
+    "orderHistory": "order_records",
+}
+
+QUOTE_PRECISION = 1e6
+MARK_PRICE_PRECISION = 1e10
+FUNDING_PRECISION = 1e14
+BASE_PRECISION = 1e13
+PEG_PRECISION = 1e3
+
+_CURVE_PRECISIONS = {
+    "peg_multiplier_before": PEG_PRECISION,
+    "peg_multiplier_after": PEG_PRECISION,
+    "base_asset_reserve_before": BASE_PRECISION,
+    "base_asset_reserve_after": BASE_PRECISION,
+    "quote_asset_reserve_before": BASE_PRECISION,
+    "quote_asset_reserve_after": BASE_PRECISION,
+    "sqrt_k_before": BASE_PRECISION,
+    "sqrt_k_after": BASE_PRECISION,
+    "base_asset_amount_long": BASE_PRECISION,
+    "base_asset_amount_short": BASE_PRECISION,
+    "base_asset_amount": BASE_PRECISION,
+    "open_interest": BASE_PRECISION,
+    "total_fee": QUOTE_PRECISION,
+    "total_fee_minus_distributions": QUOTE_PRECISION,
+    "adjustment_cost": QUOTE_PRECISION,
+    "oracle_price": MARK_PRICE_PRECISION,
+}
+
+# precision of the integer fields of each history type
+HISTORY_PRECISIONS = {
+    "deposit": {
+        "collateral_before": QUOTE_PRECISION,
+        "cumulative_deposits_before": QUOTE_PRECISION,
+        "amount": QUOTE_PRECISION,
+    },
+    "trade": {
+        "base_asset_amount": BASE_PRECISION,
+        "quote_asset_amount": QUOTE_PRECISION,
+        "mark_price_before": MARK_PRICE_PRECISION,
+        "mark_price_after": MARK_PRICE_PRECISION,
+        "fee": QUOTE_PRECISION,
+        "referrer_reward": QUOTE_PRECISION,
+        "referee_discount": QUOTE_PRECISION,
+        "token_discount": QUOTE_PRECISION,
+        "oracle_price": MARK_PRICE_PRECISION,
+    },
+    "liquidation": {
+        "base_asset_value": QUOTE_PRECISION,
+        "base_asset_value_closed": QUOTE_PRECISION,
+        "liquidation_fee": QUOTE_PRECISION,
+        "fee_to_liquidator": QUOTE_PRECISION,
+        "fee_to_insurance_fund": QUOTE_PRECISION,
+        "total_collateral": QUOTE_PRECISION,
+        "collateral": QUOTE_PRECISION,
+        "unrealized_pnl": QUOTE_PRECISION,
+    },
+    "fundingPayment": {
+        "funding_payment": QUOTE_PRECISION,
+        "base_asset_amount": BASE_PRECISION,
+        "user_last_cumulative_funding": FUNDING_PRECISION,
+        "amm_cumulative_funding_long": FUNDING_PRECISION,
+        "amm_cumulative_funding_short": FUNDING_PRECISION,
+    },
+    "fundingRate": {
+        "funding_rate": FUNDING_PRECISION,
+        "cumulative_funding_rate_long": FUNDING_PRECISION,
+        "cumulative_funding_rate_short": FUNDING_PRECISION,
+        "oracle_price_twap": MARK_PRICE_PRECISION,
+        "mark_price_twap": MARK_PRICE_PRECISION,
+    },
+    "curve": _CURVE_PRECISIONS,
+    "extendedCurve": _CURVE_PRECISIONS,
+    "orderHistory": {
+        "base_asset_amount_filled": BASE_PRECISION,
+        "quote_asset_amount_filled": QUOTE_PRECISION,
+        "fee": QUOTE_PRECISION,
+        "filler_reward": QUOTE_PRECISION,
+        "quote_asset_amount_surplus": QUOTE_PRECISION,
+    },
+}
+
+
 def load_config():
     # todo
+    import pandas as pd
+
     if os.path.exists("config.txt"):
         return pd.read_csv("config.txt", header=None).values[0][0]
     else:
@@ -51,18 +143,25 @@ def load_config():
 
 def load_provider():
     # todo
+    import pandas as pd
+
     if os.path.exists("config.txt"):
         return pd.read_csv("config.txt", header=None).values[1][0]
     else:
         return "https://api.mainnet-beta.solana.com/"
 
 
-if "ANCHOR_PROVIDER_URL" not in os.environ:
-    os.environ["ANCHOR_PROVIDER_URL"] = load_provider()
+def set_provider_url():
+    if "ANCHOR_PROVIDER_URL" not in os.environ:
+        os.environ["ANCHOR_PROVIDER_URL"] = load_provider()
 
 
 class Drift:
     def __init__(self, USER_AUTHORITY=None):
+        from anchorpy import Idl
+
+        set_provider_url()
+
         # Read the generated IDL.
         idl_f = IDL_FILE
         if not os.path.exists(idl_f):
@@ -80,11 +179,15 @@ class Drift:
         self.last_update = None
 
     async def open_position(self):
+        from anchorpy import Program, Provider
+
         # Execute the RPC.
         program = Program(self.idl, self.program_id, Provider.env())
         await program.rpc["initialize"]()
 
     async def load(self):
+        from anchorpy import Program, Provider
+
         # Generate the program client from IDL.
         # print(self.idl, self.program_id, Provider.env())
         program = Program(self.idl, self.program_id, Provider.env())
@@ -121,6 +224,8 @@ class Drift:
         self.last_update = datetime.datetime.utcnow()
 
     async def load_account(self, key, pubkey):
+        from anchorpy import Program, Provider
+
         # Generate the program client from IDL.
         program = Program(self.idl, self.program_id, Provider.env())
         account = await program.account[key].fetch(pubkey)
@@ -165,19 +270,52 @@ class Drift:
 
         return history
 
-    async def load_history_df(self):
+    async def load_history_df(self, scale=True, skip_empty=True):
+        """load every history buffer as a DataFrame indexed by US/Eastern timestamp
+
+        scale: divide the integer fields by their precision (see HISTORY_PRECISIONS)
+        skip_empty: leave out ring buffer slots that were never written (ts == 0)
+        """
+        import numpy as np
+        import pandas as pd
+
         history = await self.load_history()
+        history_columns = {}
+        for key, account in history.items():
+            records = getattr(account, HISTORY_RECORDS_ATTRIBUTE[key])
+            # oldest record first
+            records = list(records[account.head :]) + list(records[: account.head])
+            if skip_empty:
+                records = [x for x in records if x.ts != 0]
+            fields = ["ts"]
+            if len(records):
+                first = records[0] if isinstance(records[0], dict) else records[0].__dict__
+                # skip construct internals such as _io
+                fields = [x for x in first.keys() if not x.startswith("_")]
+            columns = {field: [getattr(x, field) for x in records] for field in fields}
+            for field, precision in HISTORY_PRECISIONS.get(key, {}).items():
+                if scale and field in columns:
+                    columns[field] = np.array(columns[field], dtype=np.float64) / precision
+            history_columns[key] = columns
+
+        # convert the timestamps of all history types at once
+        all_ts = np.concatenate(
+            [np.array(columns["ts"], dtype=np.int64) for columns in history_columns.values()]
+        )
+        all_index = (
+            pd.to_datetime(all_ts, unit="s")
+            .tz_localize("UTC")
+            .tz_convert("US/Eastern")
+        )
+
         history_df = {}
-        for key in history.keys():
-            record_key = [x for x in dir(history[key]) if "_records" in x.lower()][0]
-            df = pd.DataFrame(history[key].__dict__[record_key]).set_index("ts")
-            # df = df[df['marketIndex']==0]
-            df.index = (
-                pd.to_datetime(df.index * 1000000000)
-                .tz_localize("UTC")
-                .tz_convert("US/Eastern")
-            )
+        start = 0
+        for key, columns in history_columns.items():
+            end = start + len(columns["ts"])
+            df = pd.DataFrame(columns).drop(columns="ts")
+            df.index = all_index[start:end].rename("ts")
             history_df[key] = df
+            start = end
         return history_df
 
     def base_asset_imbalance(self, market_index=0):
@@ -185,6 +323,8 @@ class Drift:
         return market_i.baseAssetAmount / 1e13
 
     def market_summary(self):
+        import pandas as pd
+
         market_cols = [
             "initialized",
             "base_asset_amount",
@@ -280,6 +420,8 @@ class Drift:
         return pd.concat(mdfs, axis=1)
 
     def user_summary(self):
+        import pandas as pd
+
         if self.all_users is None:
             return pd.DataFrame()
         users_df = pd.DataFrame([x.account.__dict__ for x in self.all_users])
@@ -311,6 +453,9 @@ class Drift:
         return user_summary_df
 
     async def user_position_summary(self):
+        import pandas as pd
+        from anchorpy import Program, Provider
+
         # if self.all_users is None:
         #     return pd.DataFrame()
 
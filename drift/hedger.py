@@ -0,0 +1,446 @@
+"""Asynchronous hedger keeping an FTX position on a target without blocking the event loop.
+
+ftx_trade_to_target_position in drift/ftx.py blocks for seconds on every call: it cancels all orders, places a new
+one and sleeps between polls. The Hedger instead runs as a task next to the Drift loop. set_target returns at once,
+and each reconcile cycle makes one position read and, when an order is working, one order read. A working order
+is amended in place while it stays on the right side and is only cancelled when the hedge flips side or becomes
+too small.
+
+The exchange is any object with the asynchronous ccxt methods used here, e.g. ccxt.async_support.ftx (see
+create_ftx_exchange) or FakeExchange for tests and dry runs. Hedge latency, exchange calls and the time the hedger
+holds the event loop are reported to sdk.instrumentation and summarized in Hedger.stats.
+"""
+import asyncio
+import itertools
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+from sdk import instrumentation
+
+# the limits of drift/ftx.py
+MAX_LONG = 250
+MAX_SHORT = 88
+MIN_TRADE = 1
+PASSIVE_SPREAD = 0.075
+POLL_INTERVAL = 1.0
+# working orders are re-priced when the mark moves by more than this
+REPRICE_THRESHOLD = 0.01
+SIZE_DECIMALS = 2
+
+
+def create_ftx_exchange(secret_path: str = "~/.ftx"):
+    """Create an asynchronous ccxt FTX exchange from the secret json used by drift/ftx.py."""
+    import ccxt.async_support as ccxt_async
+
+    with open(os.path.expanduser(secret_path), "r") as f:
+        secret = json.load(f)
+    return ccxt_async.ftx(secret)
+
+
+def get_position(positions: List[dict], symbol: str) -> float:
+    """Get the signed position of a symbol from ccxt positions, zero when there is none."""
+    for position in positions:
+        if position.get("symbol") == symbol and position.get("contracts"):
+            side = {"long": 1, "short": -1}[position["side"]]
+            return side * float(position["contracts"])
+    return 0.0
+
+
+def get_mark_price(positions: List[dict], symbol: str) -> Optional[float]:
+    """Get the mark price of a symbol from ccxt positions, if one is listed."""
+    for position in positions:
+        if position.get("symbol") == symbol and position.get("markPrice"):
+            return float(position["markPrice"])
+    return None
+
+
+class HedgerStats:
+    """Counters and timings of a hedger since it was created."""
+
+    def __init__(self) -> None:
+        self.cycles = 0
+        self.orders_created = 0
+        self.orders_amended = 0
+        self.orders_cancelled = 0
+        self.errors = 0
+        self.hedge_latencies: List[float] = []
+        self.exchange_seconds = 0.0
+        self.blocked_seconds = 0.0
+
+    def to_dict(self) -> dict:
+        """For pretty printing."""
+        latencies = sorted(self.hedge_latencies)
+        return {
+            "cycles": self.cycles,
+            "orders_created": self.orders_created,
+            "orders_amended": self.orders_amended,
+            "orders_cancelled": self.orders_cancelled,
+            "errors": self.errors,
+            "hedges": len(latencies),
+            "median_hedge_latency": latencies[len(latencies) // 2] if latencies else None,
+            "max_hedge_latency": latencies[-1] if latencies else None,
+            "exchange_seconds": self.exchange_seconds,
+            "blocked_seconds": self.blocked_seconds,
+        }
+
+
+class Hedger:
+    """Keeps the position of one symbol on a target with a single passive limit order."""
+
+    def __init__(
+        self,
+        exchange,
+        symbol: str = "SOL-PERP",
+        max_long: float = MAX_LONG,
+        max_short: float = MAX_SHORT,
+        min_trade: float = MIN_TRADE,
+        passive_spread: float = PASSIVE_SPREAD,
+        poll_interval: float = POLL_INTERVAL,
+        reprice_threshold: float = REPRICE_THRESHOLD,
+    ) -> None:
+        """
+        :param exchange: The asynchronous ccxt exchange, or a FakeExchange.
+        :param symbol: The symbol to hedge on.
+        :param max_long: The largest long position, targets above are clipped.
+        :param max_short: The largest short position, as a positive size.
+        :param min_trade: The smallest difference to the target worth an order.
+        :param passive_spread: How far from the mark price orders rest, in quote.
+        :param poll_interval: The longest wait between reconcile cycles, in seconds.
+        :param reprice_threshold: The mark move, in quote, after which a working order is re-priced.
+        """
+        self.exchange = exchange
+        self.symbol = symbol
+        self.max_long = max_long
+        self.max_short = max_short
+        self.min_trade = min_trade
+        self.passive_spread = passive_spread
+        self.poll_interval = poll_interval
+        self.reprice_threshold = reprice_threshold
+        self.target: Optional[float] = None
+        self.position = 0.0
+        self.order: Optional[dict] = None
+        self.stats = HedgerStats()
+        self._target_set_at: Optional[float] = None
+        self._target_changed = asyncio.Event()
+        self._stopped = False
+        self._task: Optional[asyncio.Task] = None
+        self._calls_in_flight = 0
+        self._calls_in_flight_since = 0.0
+
+    def set_target(self, target: float) -> None:
+        """Set the position to hedge to, clipped to the limits; returns at once and wakes the hedger."""
+        target = round(min(max(target, -self.max_short), self.max_long), SIZE_DECIMALS)
+        if self.target is None or abs(target - self.target) >= self.min_trade:
+            self._target_set_at = time.perf_counter()
+        self.target = target
+        self._target_changed.set()
+
+    """EXCHANGE CALLS"""
+
+    async def _call(self, method: str, *args, **kwargs):
+        """Await an exchange method, timing it apart from the time the hedger holds the loop."""
+        start = time.perf_counter()
+        if self._calls_in_flight == 0:
+            self._calls_in_flight_since = start
+        self._calls_in_flight += 1
+        try:
+            return await getattr(self.exchange, method)(*args, **kwargs)
+        except Exception:
+            instrumentation.collector.record_error(instrumentation.NETWORK, f"ftx.{method}")
+            raise
+        finally:
+            end = time.perf_counter()
+            self._calls_in_flight -= 1
+            # concurrent calls overlap, so only the time with any call in flight counts as waiting
+            if self._calls_in_flight == 0:
+                self.stats.exchange_seconds += end - self._calls_in_flight_since
+            instrumentation.collector.record_timing(instrumentation.NETWORK, f"ftx.{method}", end - start)
+
+    async def _refresh_order(self) -> None:
+        """Forget the working order once it is no longer open."""
+        if self.order is None:
+            return
+        order = await self._call("fetch_order", self.order["id"], self.symbol)
+        self.order = order if order["status"] == "open" else None
+
+    async def _cancel_order(self) -> None:
+        if self.order is None:
+            return
+        try:
+            await self._call("cancel_order", self.order["id"], self.symbol)
+        except Exception:
+            # the order may have filled or been cancelled meanwhile, it is only forgotten once a read shows it closed
+            await self._refresh_order()
+            if self.order is not None:
+                raise
+            return
+        self.stats.orders_cancelled += 1
+        self.order = None
+
+    """RECONCILING"""
+
+    async def reconcile(
+        self,
+        positions: Optional[List[dict]] = None,
+        open_orders: Optional[List[dict]] = None,
+        mark_price: Optional[float] = None,
+    ) -> None:
+        """Run one cycle: read the position and the working order, then create, amend or cancel the order.
+
+        :param positions: The ccxt positions when they were already fetched, e.g. for many symbols at once.
+        :param open_orders: The open ccxt orders when they were already fetched; the working order is
+            considered gone when it is not among them.
+        :param mark_price: The mark price when it was already read, e.g. from the tickers of many symbols at once.
+        """
+        cycle_start = time.perf_counter()
+        exchange_seconds = self.stats.exchange_seconds
+        self.stats.cycles += 1
+        try:
+            if open_orders is not None and self.order is not None:
+                open_orders_by_id = {order["id"]: order for order in open_orders}
+                self.order = open_orders_by_id.get(self.order["id"])
+            if positions is None:
+                positions, _ = await asyncio.gather(
+                    self._call("fetch_positions"),
+                    self._refresh_order() if open_orders is None else asyncio.sleep(0),
+                )
+            elif open_orders is None:
+                await self._refresh_order()
+            self.position = get_position(positions, self.symbol)
+            if self.target is None:
+                return
+            trade_size = round(self.target - self.position, SIZE_DECIMALS)
+            if abs(trade_size) < self.min_trade:
+                await self._cancel_order()
+                self._record_hedge()
+                return
+            if mark_price is None:
+                mark_price = get_mark_price(positions, self.symbol)
+            if mark_price is None:
+                ticker = await self._call("fetch_ticker", self.symbol)
+                mark_price = float(ticker["last"])
+            side = "buy" if trade_size > 0 else "sell"
+            price = (
+                mark_price - self.passive_spread
+                if side == "buy"
+                else mark_price + self.passive_spread
+            )
+            await self._place(side, abs(trade_size), price)
+        except Exception:
+            self.stats.errors += 1
+            raise
+        finally:
+            # whatever was not spent awaiting the exchange held the event loop
+            blocked = (time.perf_counter() - cycle_start) - (
+                self.stats.exchange_seconds - exchange_seconds
+            )
+            self.stats.blocked_seconds += blocked
+            instrumentation.collector.record_timing(
+                instrumentation.BLOCKED, "hedger", blocked
+            )
+
+    async def _place(self, side: str, amount: float, price: float) -> None:
+        """Get a working order of a side, size and price, amending the current one when it is on that side."""
+        if self.order is not None and self.order["side"] != side:
+            await self._cancel_order()
+        if self.order is None:
+            self.order = await self._call(
+                "create_order", self.symbol, "limit", side, amount, price
+            )
+            self.stats.orders_created += 1
+            return
+        remaining = float(self.order["remaining"])
+        if (
+            abs(remaining - amount) < 10**-SIZE_DECIMALS
+            and abs(float(self.order["price"]) - price) <= self.reprice_threshold
+        ):
+            return
+        try:
+            self.order = await self._call(
+                "edit_order", self.order["id"], self.symbol, "limit", side, amount, price
+            )
+            self.stats.orders_amended += 1
+        except Exception:
+            # the order may have filled or been cancelled since it was read, in which case reconcile again right
+            # away; while a read still shows it open it is kept and the next cycle retries
+            await self._refresh_order()
+            if self.order is not None:
+                raise
+            self._target_changed.set()
+
+    def _record_hedge(self) -> None:
+        if self._target_set_at is None:
+            return
+        latency = time.perf_counter() - self._target_set_at
+        self._target_set_at = None
+        self.stats.hedge_latencies.append(latency)
+        instrumentation.collector.record_timing(
+            instrumentation.HEDGE_LATENCY, self.symbol, latency
+        )
+
+    async def run(self) -> None:
+        """Reconcile until stopped, right after every new target and at least every poll interval."""
+        while not self._stopped:
+            self._target_changed.clear()
+            try:
+                await self.reconcile()
+            except Exception:
+                instrumentation.collector.record_error(
+                    instrumentation.HEDGE, self.symbol
+                )
+            try:
+                await asyncio.wait_for(
+                    self._target_changed.wait(), timeout=self.poll_interval
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> asyncio.Task:
+        """Run the hedger as a task of the running event loop."""
+        self._stopped = False
+        self._task = asyncio.ensure_future(self.run())
+        return self._task
+
+    async def stop(self) -> None:
+        """Stop the hedger and cancel its working order."""
+        self._stopped = True
+        self._target_changed.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self._refresh_order()
+        await self._cancel_order()
+
+
+class FakeExchange:
+    """In-memory stand-in for the asynchronous ccxt FTX exchange.
+
+    Limit orders fill at their price when they are marketable on arrival or when set_price moves the market through
+    them. Every call sleeps for the latency, so concurrency and blocking behave like against the real exchange.
+    """
+
+    def __init__(self, prices: Dict[str, float], latency: float = 0.0) -> None:
+        """
+        :param prices: The mark price of every symbol.
+        :param latency: The duration of every call, in seconds.
+        """
+        self.prices = dict(prices)
+        self.latency = latency
+        self.positions: Dict[str, float] = {symbol: 0.0 for symbol in prices}
+        self.orders: Dict[str, dict] = {}
+        self.calls: Dict[str, int] = {}
+        self._ids = itertools.count(1)
+
+    async def _respond(self, method: str) -> None:
+        self.calls[method] = self.calls.get(method, 0) + 1
+        await asyncio.sleep(self.latency)
+
+    def _fill(self, order: dict) -> None:
+        sign = 1 if order["side"] == "buy" else -1
+        self.positions[order["symbol"]] += sign * order["remaining"]
+        order["filled"] = order["amount"]
+        order["remaining"] = 0.0
+        order["status"] = "closed"
+
+    def _marketable(self, order: dict) -> bool:
+        price = self.prices[order["symbol"]]
+        if order["side"] == "buy":
+            return order["price"] >= price
+        return order["price"] <= price
+
+    def _new_order(
+        self, symbol: str, side: str, amount: float, price: float
+    ) -> dict:
+        order = {
+            "id": str(next(self._ids)),
+            "symbol": symbol,
+            "type": "limit",
+            "side": side,
+            "amount": float(amount),
+            "price": float(price),
+            "filled": 0.0,
+            "remaining": float(amount),
+            "status": "open",
+        }
+        if self._marketable(order):
+            self._fill(order)
+        self.orders[order["id"]] = order
+        return dict(order)
+
+    def set_price(self, symbol: str, price: float) -> None:
+        """Move the market of a symbol, filling the resting orders it crosses."""
+        self.prices[symbol] = price
+        for order in self.orders.values():
+            if order["symbol"] == symbol and order["status"] == "open" and self._marketable(order):
+                self._fill(order)
+
+    async def fetch_positions(self, symbols=None, params={}) -> List[dict]:
+        await self._respond("fetch_positions")
+        return [
+            {
+                "symbol": symbol,
+                "contracts": abs(position),
+                "side": "long" if position >= 0 else "short",
+                "markPrice": self.prices[symbol],
+            }
+            for symbol, position in self.positions.items()
+            if position != 0
+        ]
+
+    async def fetch_ticker(self, symbol: str, params={}) -> dict:
+        await self._respond("fetch_ticker")
+        return {"symbol": symbol, "last": self.prices[symbol]}
+
+    async def fetch_tickers(self, symbols: List[str] = None, params={}) -> Dict[str, dict]:
+        await self._respond("fetch_tickers")
+        return {
+            symbol: {"symbol": symbol, "last": price}
+            for symbol, price in self.prices.items()
+            if symbols is None or symbol in symbols
+        }
+
+    async def fetch_order(self, id: str, symbol: str = None, params={}) -> dict:
+        await self._respond("fetch_order")
+        return dict(self.orders[id])
+
+    async def fetch_open_orders(self, symbol: str = None, since=None, limit=None, params={}) -> List[dict]:
+        await self._respond("fetch_open_orders")
+        return [
+            dict(order)
+            for order in self.orders.values()
+            if order["status"] == "open" and symbol in (None, order["symbol"])
+        ]
+
+    async def create_order(
+        self, symbol: str, type: str, side: str, amount: float, price: float = None, params={}
+    ) -> dict:
+        await self._respond("create_order")
+        return self._new_order(symbol, side, amount, price)
+
+    async def edit_order(
+        self, id: str, symbol: str, type: str, side: str, amount: float = None, price: float = None, params={}
+    ) -> dict:
+        """Modify an open order; like FTX, the modified order gets a new id."""
+        await self._respond("edit_order")
+        order = self.orders[id]
+        if order["status"] != "open":
+            raise Exception(f"Order {id} is {order['status']}.")
+        order["status"] = "canceled"
+        return self._new_order(
+            symbol,
+            side,
+            order["remaining"] if amount is None else amount,
+            order["price"] if price is None else price,
+        )
+
+    async def cancel_order(self, id: str, symbol: str = None, params={}) -> dict:
+        await self._respond("cancel_order")
+        order = self.orders[id]
+        if order["status"] == "open":
+            order["status"] = "canceled"
+        return dict(order)
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,109 @@
+import asyncio
+
+from sdk import instrumentation
+
+from drift.hedger import FakeExchange, Hedger
+
+collector = instrumentation.HistogramCollector()
+instrumentation.set_collector(collector)
+
+
+async def fail(*args, **kwargs):
+    raise Exception("Request timed out.")
+
+
+async def hedge():
+    exchange = FakeExchange({"SOL-PERP": 100.0})
+    hedger = Hedger(exchange)
+
+    # A new target rests one passive limit order away from the mark price
+
+    hedger.set_target(10)
+    await hedger.reconcile()
+    print("Created: ", hedger.order)
+
+    assert hedger.order["side"] == "buy" and hedger.order["amount"] == 10
+    assert hedger.order["price"] == 100.0 - hedger.passive_spread
+    assert hedger.stats.orders_created == 1
+
+    # When the mark moves, the working order is amended rather than replaced
+
+    order_id = hedger.order["id"]
+    exchange.set_price("SOL-PERP", 100.5)
+    await hedger.reconcile()
+    print("Amended: ", hedger.order)
+
+    assert hedger.order["id"] != order_id
+    assert hedger.order["price"] == 100.5 - hedger.passive_spread
+    assert exchange.orders[order_id]["status"] == "canceled"
+    assert hedger.stats.orders_amended == 1
+
+    # A target on the other side cancels the order before selling
+
+    order_id = hedger.order["id"]
+    hedger.set_target(-5)
+    await hedger.reconcile()
+
+    assert exchange.orders[order_id]["status"] == "canceled"
+    assert hedger.stats.orders_cancelled == 1
+    assert hedger.order["side"] == "sell" and hedger.order["amount"] == 5
+
+    # Once the market trades through the order, the position is on target and
+    # the hedge latency is recorded
+
+    exchange.set_price("SOL-PERP", 101.0)
+    await hedger.reconcile()
+    print("Position: ", hedger.position)
+
+    assert hedger.position == -5
+    assert hedger.order is None
+    assert len(hedger.stats.hedge_latencies) == 1
+
+    # A failed edit keeps the order while a read still shows it open, so it is
+    # neither forgotten nor doubled
+
+    hedger.set_target(5)
+    await hedger.reconcile()
+    order_id = hedger.order["id"]
+    exchange.edit_order, edit_order = fail, exchange.edit_order
+    exchange.set_price("SOL-PERP", 102.0)
+    try:
+        await hedger.reconcile()
+        assert False
+    except Exception as e:
+        assert str(e) == "Request timed out."
+    assert hedger.order["id"] == order_id
+    assert exchange.orders[order_id]["status"] == "open"
+    assert hedger.stats.errors == 1
+
+    # When the edit failed because the order filled meanwhile, it is forgotten
+    # and the hedger wakes up to reconcile again
+
+    async def fill_and_fail(*args, **kwargs):
+        exchange.set_price("SOL-PERP", 100.0)
+        raise Exception(f"Order {order_id} is closed.")
+
+    exchange.edit_order = fill_and_fail
+    exchange.set_price("SOL-PERP", 103.0)
+    hedger._target_changed.clear()
+    await hedger.reconcile()
+
+    assert hedger.order is None
+    assert hedger._target_changed.is_set()
+    assert exchange.positions["SOL-PERP"] == 5
+
+    # Running as a task, errors are counted in their own phase
+
+    exchange.edit_order = edit_order
+    exchange.fetch_positions = fail
+    hedger.poll_interval = 0.01
+    hedger.start()
+    await asyncio.sleep(0.05)
+    await hedger.stop()
+    print("Errors: ", collector.errors)
+
+    assert collector.errors[(instrumentation.HEDGE, "SOL-PERP")] > 0
+    assert (instrumentation.HEDGE_LATENCY, "SOL-PERP") not in collector.errors
+
+
+asyncio.run(hedge())
@@ -0,0 +1,374 @@
+"""Reconciles target positions of all markets on Drift and FTX at once.
+
+The arbitrage flow of drift/ftx.py trades one symbol toward its target at a time and reads the positions again
+for every trade. Here each cycle reads the state of every venue in one batch (the user positions and the markets
+on Drift, the positions, the open orders and the tickers on FTX), turns the targets of all markets into the minimal trades in
+one vectorized pass, clipped to per-market limits like MAX_LONG and MAX_SHORT and skipping trades below the
+minimum size, and sends the legs of both venues concurrently.
+
+Positions and targets are in base asset, indexed by Drift market index; FTX symbols follow MARKET_INDEX_TO_PERP.
+For a delta-neutral arbitrage, the FTX targets are the negated Drift targets. Only SOL has default limits, those of
+drift/ftx.py; every other market needs its own, see create_limits.
+"""
+import asyncio
+from types import SimpleNamespace
+from typing import Dict, Mapping, NamedTuple, Optional, Union
+
+import pandas as pd
+
+from sdk import instrumentation
+from sdk.constants import (
+    AMM_RESERVE_PRECISION,
+    MARK_PRICE_PRECISION,
+    MARKET_INDEX_TO_SYMBOL,
+    MARKET_SYMBOL_TO_INDEX,
+    PEG_PRECISION,
+    QUOTE_PRECISION,
+)
+from sdk.math.amm import calculate_mark_price
+
+from .drift import MARKET_INDEX_TO_PERP
+from .hedger import (
+    MAX_LONG,
+    MAX_SHORT,
+    MIN_TRADE,
+    PASSIVE_SPREAD,
+    REPRICE_THRESHOLD,
+    SIZE_DECIMALS,
+    Hedger,
+    get_mark_price,
+    get_position,
+)
+
+LIMIT_COLUMNS = ["max_long", "max_short", "min_trade", "passive_spread", "reprice_threshold"]
+
+# drift/ftx.py only traded SOL-PERP: its sizes are in SOL and its spreads in USD, so they fit no other market
+DEFAULT_LIMITS = {
+    MARKET_SYMBOL_TO_INDEX["SOL-PERP"]: {
+        "max_long": MAX_LONG,
+        "max_short": MAX_SHORT,
+        "min_trade": MIN_TRADE,
+        "passive_spread": PASSIVE_SPREAD,
+        "reprice_threshold": REPRICE_THRESHOLD,
+    }
+}
+
+Targets = Union[Mapping[int, float], pd.Series]
+
+
+def create_limits(
+    market_indexes, overrides: Optional[Mapping[int, Mapping[str, float]]] = None
+) -> pd.DataFrame:
+    """Build the position limits and order spreads of many markets.
+
+    SOL defaults to the limits of drift/ftx.py (DEFAULT_LIMITS), any other market must be given all of its limits.
+
+    :param market_indexes: The market indexes to cover.
+    :param overrides: Limits by market index, e.g. {1: {"max_long": 0.5, "max_short": 0.5, "min_trade": 0.001,
+        "passive_spread": 15, "reprice_threshold": 2}}.
+    :return: max_long, max_short (as a positive size) and min_trade in base asset, passive_spread and
+        reprice_threshold (see Hedger) in quote, by market index.
+    """
+    overrides = overrides or {}
+    market_indexes = list(market_indexes)
+    market_indexes += [market_index for market_index in overrides if market_index not in market_indexes]
+    rows = []
+    for market_index in market_indexes:
+        market_limits = {**DEFAULT_LIMITS.get(market_index, {}), **overrides.get(market_index, {})}
+        for column in market_limits:
+            if column not in LIMIT_COLUMNS:
+                raise Exception(f"Unknown position limit: {column}.")
+        missing = [column for column in LIMIT_COLUMNS if column not in market_limits]
+        if missing:
+            raise Exception(f"No {', '.join(missing)} for market {market_index}, only SOL has default limits.")
+        rows.append([float(market_limits[column]) for column in LIMIT_COLUMNS])
+    return pd.DataFrame(
+        rows, columns=LIMIT_COLUMNS, index=pd.Index(market_indexes, name="market_index")
+    )
+
+
+def calculate_trades(targets: Targets, positions: pd.Series, limits: pd.DataFrame) -> pd.DataFrame:
+    """Get the minimal trades taking the positions of many markets to their targets.
+
+    Targets are clipped to the limits of their market, and trades smaller than the minimum trade of their market are
+    zeroed. Markets without a target are left alone, markets without a position are flat.
+
+    :param targets: The target positions by market index, in base asset.
+    :param positions: The current positions by market index, in base asset.
+    :param limits: max_long, max_short and min_trade by market index, see create_limits.
+    :return: position, target (clipped) and trade by market index, for every market with a target.
+    """
+    targets = pd.Series(targets, dtype=float)
+    market_limits = limits.reindex(targets.index)
+    if market_limits.isna().any(axis=None):
+        missing = market_limits.index[market_limits.isna().any(axis=1)].tolist()
+        raise Exception(f"No position limits for markets {missing}.")
+    position = positions.reindex(targets.index, fill_value=0.0).to_numpy(dtype=float)
+    target = targets.clip(
+        lower=-market_limits["max_short"], upper=market_limits["max_long"]
+    ).to_numpy()
+    trade = (target - position).round(SIZE_DECIMALS)
+    trade[abs(trade) < market_limits["min_trade"].to_numpy()] = 0.0
+    return pd.DataFrame(
+        {"position": position, "target": target, "trade": trade},
+        index=pd.Index(targets.index, name="market_index"),
+    )
+
+
+class VenueState(NamedTuple):
+    """Positions and mark prices of one venue by market index, read in one batch."""
+
+    positions: pd.Series
+    mark_prices: pd.Series
+
+
+class DriftVenue:
+    """Drift leg: reads the user positions and the markets together and trades the AMMs by quote amount."""
+
+    def __init__(self, client, limits: Optional[pd.DataFrame] = None) -> None:
+        """
+        :param client: The sdk.client.DriftClient of the user, or a FakeDriftClient.
+        :param limits: Position limits by market index, see create_limits; defaults to those of drift/ftx.py,
+            which only cover SOL.
+        """
+        self.client = client
+        self.limits = create_limits(DEFAULT_LIMITS) if limits is None else limits
+
+    async def read_state(self) -> VenueState:
+        with instrumentation.collector.measure(instrumentation.NETWORK, "drift.read_state"):
+            user_positions, drift_markets = await asyncio.gather(
+                self.client.get_positions(), self.client.get_all_markets()
+            )
+        positions: Dict[int, float] = {}
+        for position in user_positions.positions:
+            if position.base_asset_amount != 0:
+                positions[position.market_index] = (
+                    positions.get(position.market_index, 0.0)
+                    + position.base_asset_amount / AMM_RESERVE_PRECISION
+                )
+        mark_prices = {
+            market_index: calculate_mark_price(
+                market.amm.base_asset_reserve, market.amm.quote_asset_reserve, market.amm.peg_multiplier
+            )
+            / MARK_PRICE_PRECISION
+            for market_index, market in enumerate(drift_markets.markets)
+            if market.initialized and market.amm.base_asset_reserve != 0
+        }
+        return VenueState(
+            positions=pd.Series(positions, dtype=float),
+            mark_prices=pd.Series(mark_prices, dtype=float),
+        )
+
+    async def execute(self, trades: pd.DataFrame, state: VenueState) -> list:
+        """Send the nonzero trades of all markets concurrently, closing positions whose target is flat.
+
+        :return: The responses of the transactions, by nonzero trade.
+        """
+        trades = trades[trades["trade"] != 0]
+        mark_prices = state.mark_prices.reindex(trades.index).to_numpy()
+        sends = []
+        for market_index, target, trade, mark_price in zip(
+            trades.index, trades["target"], trades["trade"], mark_prices
+        ):
+            symbol = MARKET_INDEX_TO_SYMBOL[market_index]
+            if target == 0:
+                sends.append(self.client.close_position(market=symbol))
+            else:
+                sends.append(
+                    self.client.open_position(
+                        market=symbol,
+                        direction="long" if trade > 0 else "short",
+                        quote_amount=int(abs(trade) * mark_price * QUOTE_PRECISION),
+                    )
+                )
+        with instrumentation.collector.measure(instrumentation.NETWORK, "drift.execute"):
+            return await asyncio.gather(*sends)
+
+
+class FtxVenue:
+    """FTX leg: reads all positions, open orders and tickers together and runs one Hedger per market."""
+
+    def __init__(
+        self,
+        exchange,
+        limits: Optional[pd.DataFrame] = None,
+        symbols: Mapping[int, str] = MARKET_INDEX_TO_PERP,
+        **hedger_kwargs,
+    ) -> None:
+        """
+        :param exchange: The asynchronous ccxt exchange, or a FakeExchange.
+        :param limits: Position limits and order spreads by market index, see create_limits; defaults to those of
+            drift/ftx.py, which only cover SOL.
+        :param symbols: The FTX symbol of every Drift market index.
+        :param hedger_kwargs: Passed on to every Hedger, e.g. poll_interval.
+        """
+        self.exchange = exchange
+        self.symbols = dict(symbols)
+        self.limits = create_limits(DEFAULT_LIMITS) if limits is None else limits
+        self.hedger_kwargs = hedger_kwargs
+        self.hedgers: Dict[int, Hedger] = {}
+        self._positions = []
+        self._open_orders = []
+
+    def get_hedger(self, market_index: int) -> Hedger:
+        if market_index not in self.hedgers:
+            market_limits = self.limits.loc[market_index]
+            self.hedgers[market_index] = Hedger(
+                self.exchange,
+                symbol=self.symbols[market_index],
+                max_long=market_limits["max_long"],
+                max_short=market_limits["max_short"],
+                min_trade=market_limits["min_trade"],
+                passive_spread=market_limits["passive_spread"],
+                reprice_threshold=market_limits["reprice_threshold"],
+                **self.hedger_kwargs,
+            )
+        return self.hedgers[market_index]
+
+    async def read_state(self) -> VenueState:
+        with instrumentation.collector.measure(instrumentation.NETWORK, "ftx.read_state"):
+            self._positions, self._open_orders, tickers = await asyncio.gather(
+                self.exchange.fetch_positions(),
+                self.exchange.fetch_open_orders(),
+                self.exchange.fetch_tickers(list(self.symbols.values())),
+            )
+        positions = {}
+        mark_prices = {}
+        for market_index, symbol in self.symbols.items():
+            position = get_position(self._positions, symbol)
+            if position != 0:
+                positions[market_index] = position
+            ticker = tickers.get(symbol)
+            mark_price = (
+                float(ticker["last"])
+                if ticker is not None and ticker.get("last") is not None
+                else get_mark_price(self._positions, symbol)
+            )
+            if mark_price is not None:
+                mark_prices[market_index] = mark_price
+        return VenueState(
+            positions=pd.Series(positions, dtype=float),
+            mark_prices=pd.Series(mark_prices, dtype=float),
+        )
+
+    async def execute(self, trades: pd.DataFrame, state: VenueState) -> None:
+        """Move the hedgers of the traded markets to their targets and let those with working orders follow up.
+
+        Hedgers reuse the positions, open orders and mark prices of the last read_state instead of fetching their own.
+        """
+        for market_index, target, trade in zip(trades.index, trades["target"], trades["trade"]):
+            if trade != 0 or market_index in self.hedgers:
+                self.get_hedger(market_index).set_target(target)
+        traded = set(trades.index[trades["trade"] != 0])
+        await asyncio.gather(
+            *(
+                hedger.reconcile(
+                    positions=self._positions,
+                    open_orders=self._open_orders,
+                    mark_price=state.mark_prices.get(market_index),
+                )
+                for market_index, hedger in self.hedgers.items()
+                if market_index in traded or hedger.order is not None
+            )
+        )
+
+    async def stop(self) -> None:
+        """Cancel the working orders of all hedgers."""
+        await asyncio.gather(*(hedger.stop() for hedger in self.hedgers.values()))
+
+
+class ReconcileCycle(NamedTuple):
+    """The positions, targets and trades of each venue in one cycle, see calculate_trades."""
+
+    drift_trades: pd.DataFrame
+    ftx_trades: pd.DataFrame
+
+
+class PositionReconciler:
+    """Takes the positions of all markets on Drift and FTX to their targets, both venues at the same time."""
+
+    def __init__(self, drift_venue: DriftVenue, ftx_venue: FtxVenue) -> None:
+        self.drift_venue = drift_venue
+        self.ftx_venue = ftx_venue
+        self.drift_state: Optional[VenueState] = None
+        self.ftx_state: Optional[VenueState] = None
+
+    async def reconcile(self, drift_targets: Targets, ftx_targets: Targets) -> ReconcileCycle:
+        """Run one cycle: read both venues, work out the trades of all markets and send both legs.
+
+        :param drift_targets: The target Drift positions by market index, in base asset.
+        :param ftx_targets: The target FTX positions by Drift market index, in base asset.
+        """
+        self.drift_state, self.ftx_state = await asyncio.gather(
+            self.drift_venue.read_state(), self.ftx_venue.read_state()
+        )
+        drift_trades = calculate_trades(
+            drift_targets, self.drift_state.positions, self.drift_venue.limits
+        )
+        ftx_trades = calculate_trades(ftx_targets, self.ftx_state.positions, self.ftx_venue.limits)
+        await asyncio.gather(
+            self.drift_venue.execute(drift_trades, self.drift_state),
+            self.ftx_venue.execute(ftx_trades, self.ftx_state),
+        )
+        return ReconcileCycle(drift_trades=drift_trades, ftx_trades=ftx_trades)
+
+
+class FakeDriftClient:
+    """In-memory stand-in for the parts of sdk.client.DriftClient used by DriftVenue.
+
+    Positions open and close at fixed mark prices, after the latency, like FakeExchange does for FTX.
+    """
+
+    def __init__(self, prices: Dict[int, float], latency: float = 0.0) -> None:
+        """
+        :param prices: The mark price of every market index.
+        :param latency: The duration of every call, in seconds.
+        """
+        self.prices = dict(prices)
+        self.latency = latency
+        self.positions: Dict[int, int] = {}
+        self.calls: Dict[str, int] = {}
+
+    async def _respond(self, method: str) -> None:
+        self.calls[method] = self.calls.get(method, 0) + 1
+        await asyncio.sleep(self.latency)
+
+    async def get_positions(self):
+        await self._respond("get_positions")
+        return SimpleNamespace(
+            positions=[
+                SimpleNamespace(market_index=market_index, base_asset_amount=base_asset_amount)
+                for market_index, base_asset_amount in self.positions.items()
+            ]
+        )
+
+    async def get_all_markets(self):
+        await self._respond("get_all_markets")
+        reserve = int(1000 * AMM_RESERVE_PRECISION)
+        markets = [
+            SimpleNamespace(
+                initialized=market_index in self.prices,
+                amm=SimpleNamespace(
+                    base_asset_reserve=reserve,
+                    quote_asset_reserve=reserve,
+                    peg_multiplier=int(round(self.prices.get(market_index, 0) * PEG_PRECISION)),
+                ),
+            )
+            for market_index in range(len(MARKET_INDEX_TO_SYMBOL))
+        ]
+        return SimpleNamespace(markets=markets)
+
+    async def open_position(self, market: str, direction: str, quote_amount: int):
+        await self._respond("open_position")
+        market_index = MARKET_INDEX_TO_SYMBOL.index(market)
+        base_asset_amount = int(
+            quote_amount / QUOTE_PRECISION / self.prices[market_index] * AMM_RESERVE_PRECISION
+        )
+        sign = 1 if direction == "long" else -1
+        self.positions[market_index] = self.positions.get(market_index, 0) + sign * base_asset_amount
+        return {"result": f"open {market} {direction} {quote_amount}"}
+
+    async def close_position(self, market: str):
+        await self._respond("close_position")
+        self.positions.pop(MARKET_INDEX_TO_SYMBOL.index(market), None)
+        return {"result": f"close {market}"}
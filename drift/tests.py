@@ -1,6 +1,7 @@
 from Trader import Trader 
 from Market import Market
 from Position import Position 
+from Funding import Funding
 
 
 # Create a market
@@ -64,6 +65,29 @@ print("Profit in %: ", 100*round(profit/0.1,1), "%")
 
 assert round(profit/0.1,2) == -0.1
 
+# With the mark above the oracle for a whole funding period, longs pay
+# shorts and the payments of equal and opposite positions cancel out
+
+market = Market(k0, initial_mark, index, marketID)
+funding = Funding(market)
+long_pos = market.openPosition(2, 10)
+short_pos = market.openPosition(3, -10)
+market.index = 0.99*market.getSpot()
+funding_rate = funding.update(3600)
+print("Funding rate: ", funding_rate)
+
+assert funding_rate > 0
+payments = funding.settlePositions([long_pos, short_pos])
+print("Funding payments: ", payments)
+
+assert payments[0] < 0 and payments[1] > 0
+assert round(payments.sum(), 6) == 0
+assert (funding.settlePositions([long_pos, short_pos]) == 0).all()
+
+# No funding update happens before the period has elapsed
+
+assert funding.update(3601) is None
+
 
 # Create a trader with some margin and a short position
 
@@ -1 +1,16 @@
-"""Python SDK for Drift protocol on Solana."""
+"""Python SDK for Drift protocol on Solana.
+
+Submodules are imported on first attribute access (PEP 562), so `import sdk` stays cheap."""
+import importlib
+from typing import Any
+
+
+def __getattr__(name: str) -> Any:
+    try:
+        module = importlib.import_module(f'{__name__}.{name}')
+    except ModuleNotFoundError as e:
+        if e.name != f'{__name__}.{name}':
+            raise
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}') from None
+    globals()[name] = module
+    return module
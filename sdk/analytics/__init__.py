@@ -0,0 +1 @@
+"""Incremental analytics over the drift history records, live or from the archive."""
@@ -0,0 +1,161 @@
+"""Curve history analytics: repeg and k-change series, adjustment cost against fees, and price impact on the tape.
+
+Each curve record is one repeg or k adjustment of a market's AMM. The series put the peg, sqrt_k and mark price
+before and after every change next to the running adjustment cost paid by the clearing house and the fees it had
+collected. The impact measures join the changes onto the trade tape with binary searches and prefix sums per market,
+so months of archived records are processed in a few vectorized passes. Records come from the Parquet archive or,
+for the buffer on chain at snapshot time, straight from the memory map of a snapshot.
+"""
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from sdk.constants import (
+    QUOTE_PRECISION, MARK_PRICE_PRECISION, PEG_PRECISION, AMM_RESERVE_PRECISION, PRICE_TO_PEG_PRECISION_RATIO
+)
+from sdk.utils import position_direction
+
+DEFAULT_IMPACT_WINDOWS = (60, 300, 3600)
+LONG = position_direction('long')
+
+
+def _column(df: pd.DataFrame, name: str, precision: float = 1) -> np.ndarray:
+    """Get an integer column of archived records as floats in human units."""
+    return df[name].to_numpy(dtype=float) / precision
+
+
+def read_curve_history(source, start: Optional[int] = None, end: Optional[int] = None) -> pd.DataFrame:
+    """Read curve records, oldest first, from a HistoryArchive or from the curve history buffer of a SnapshotReader.
+
+    :param source: The sdk.archive.parquet.HistoryArchive or sdk.archive.snapshot.SnapshotReader to read.
+    :param start: Only read records at or after this unix timestamp.
+    :param end: Only read records before this unix timestamp."""
+    if hasattr(source, 'history_columns'):
+        df = pd.DataFrame(source.history_columns('curve'))
+        if start is not None:
+            df = df[df['ts'] >= start]
+        if end is not None:
+            df = df[df['ts'] < end]
+        return df.reset_index(drop=True)
+    return source.read(history_type='curve', start=start, end=end)
+
+
+def calculate_curve_series(curves: pd.DataFrame) -> pd.DataFrame:
+    """Turn curve records into per-change series in human units.
+
+    peg_change and k_change are relative (k = sqrt_k ** 2), mark prices follow from the reserves and the peg, and
+    cost_to_fees is the adjustment cost the market has paid so far over the fees it had collected.
+
+    :param curves: Curve records with the columns of the archive (HistoryArchive.read('curve')), oldest first."""
+    peg_before = _column(curves, 'peg_multiplier_before', PEG_PRECISION)
+    peg_after = _column(curves, 'peg_multiplier_after', PEG_PRECISION)
+    sqrt_k_before = _column(curves, 'sqrt_k_before', AMM_RESERVE_PRECISION)
+    sqrt_k_after = _column(curves, 'sqrt_k_after', AMM_RESERVE_PRECISION)
+    price_ratio = PRICE_TO_PEG_PRECISION_RATIO * PEG_PRECISION / MARK_PRICE_PRECISION
+    mark_price_before = (
+        _column(curves, 'quote_asset_reserve_before') * peg_before / _column(curves, 'base_asset_reserve_before')
+    ) * price_ratio
+    mark_price_after = (
+        _column(curves, 'quote_asset_reserve_after') * peg_after / _column(curves, 'base_asset_reserve_after')
+    ) * price_ratio
+    series = pd.DataFrame({
+        'ts': curves['ts'].to_numpy(dtype=np.int64),
+        'record_id': curves['record_id'].to_numpy(dtype=np.int64),
+        'market_index': curves['market_index'].to_numpy(dtype=np.int64),
+        'repeg': peg_after != peg_before,
+        'k_change': sqrt_k_after != sqrt_k_before,
+        'peg_before': peg_before,
+        'peg_after': peg_after,
+        'peg_change': peg_after / peg_before - 1,
+        'sqrt_k_before': sqrt_k_before,
+        'sqrt_k_after': sqrt_k_after,
+        'k_change_pct': (sqrt_k_after / sqrt_k_before) ** 2 - 1,
+        'mark_price_before': mark_price_before,
+        'mark_price_after': mark_price_after,
+        'open_interest': _column(curves, 'open_interest', AMM_RESERVE_PRECISION),
+        'base_asset_amount': _column(curves, 'base_asset_amount', AMM_RESERVE_PRECISION),
+        'adjustment_cost': _column(curves, 'adjustment_cost', QUOTE_PRECISION),
+        'total_fee': _column(curves, 'total_fee', QUOTE_PRECISION),
+        'total_fee_minus_distributions': _column(curves, 'total_fee_minus_distributions', QUOTE_PRECISION)
+    })
+    series['cumulative_adjustment_cost'] = series.groupby('market_index')['adjustment_cost'].cumsum()
+    series['cost_to_fees'] = series['cumulative_adjustment_cost'] / series['total_fee'].where(series['total_fee'] > 0)
+    return series
+
+
+def calculate_curve_impact(
+        series: pd.DataFrame, trades: pd.DataFrame, windows: Iterable[int] = DEFAULT_IMPACT_WINDOWS
+) -> pd.DataFrame:
+    """Measure the trade tape around every curve change.
+
+    For each window w: price_change_{w}s is the mark price w seconds after the change (after the last trade by then,
+    or the post-change mark when nothing traded) relative to the mark before the change; quote_volume_{w}s and
+    signed_volume_{w}s are the volumes traded within w seconds after the change, and signed_volume_before_{w}s the
+    signed volume within w seconds before it, all in the market of the change.
+
+    :param series: Curve change series, see calculate_curve_series.
+    :param trades: Trade records with the columns of the archive (HistoryArchive.read('trade')), oldest first.
+    :param windows: The windows, in seconds.
+    :return: The series with the impact columns added."""
+    windows = tuple(windows)
+    columns = {
+        column: np.full(len(series), np.nan) for w in windows for column in (
+            f'price_change_{w}s', f'quote_volume_{w}s', f'signed_volume_{w}s', f'signed_volume_before_{w}s'
+        )
+    }
+    change_ts = series['ts'].to_numpy(dtype=np.int64)
+    change_mark_price_before = series['mark_price_before'].to_numpy()
+    change_mark_price_after = series['mark_price_after'].to_numpy()
+    trade_markets = trades['market_index'].to_numpy(dtype=np.int64)
+    for market_index, rows in series.groupby('market_index').indices.items():
+        market_trades = trades[trade_markets == market_index]
+        trade_ts = market_trades['ts'].to_numpy(dtype=np.int64)
+        base_asset_amount = _column(market_trades, 'base_asset_amount', AMM_RESERVE_PRECISION)
+        quote_asset_amount = _column(market_trades, 'quote_asset_amount', QUOTE_PRECISION)
+        signed_volume = np.where(market_trades['direction'].to_numpy() == LONG, base_asset_amount, -base_asset_amount)
+        # shifted by one, like the prefix sums, so that index i holds the trade before the i-th
+        mark_price_after = np.concatenate([[np.nan], _column(market_trades, 'mark_price_after', MARK_PRICE_PRECISION)])
+        # prefix sums with a leading zero, so that a window sum is the difference of two lookups
+        cumulative_quote = np.concatenate([[0.0], np.cumsum(quote_asset_amount)])
+        cumulative_signed = np.concatenate([[0.0], np.cumsum(signed_volume)])
+        # the first trade after each change, the trades of the same second having preceded it
+        first_after = np.searchsorted(trade_ts, change_ts[rows], side='right')
+        for w in windows:
+            end = np.searchsorted(trade_ts, change_ts[rows] + w, side='right')
+            start = np.searchsorted(trade_ts, change_ts[rows] - w, side='left')
+            mark_price = np.where(end > first_after, mark_price_after[end], change_mark_price_after[rows])
+            columns[f'price_change_{w}s'][rows] = mark_price / change_mark_price_before[rows] - 1
+            columns[f'quote_volume_{w}s'][rows] = cumulative_quote[end] - cumulative_quote[first_after]
+            columns[f'signed_volume_{w}s'][rows] = cumulative_signed[end] - cumulative_signed[first_after]
+            columns[f'signed_volume_before_{w}s'][rows] = cumulative_signed[first_after] - cumulative_signed[start]
+    impact = series.assign(**columns)
+    return impact
+
+
+def analyze_curve_history(
+        source, trades: Optional[pd.DataFrame] = None, start: Optional[int] = None, end: Optional[int] = None,
+        windows: Iterable[int] = DEFAULT_IMPACT_WINDOWS
+) -> pd.DataFrame:
+    """Read the curve history and build its series, with the impact on the trade tape when trades are available.
+
+    :param source: The sdk.archive.parquet.HistoryArchive or sdk.archive.snapshot.SnapshotReader to read.
+    :param trades: The trades to measure the impact on. Defaults to the trades of the archive over the same period,
+        extended by the longest window; snapshots hold no trades beyond their buffer, so pass them explicitly.
+    :param start: Only read curve records at or after this unix timestamp.
+    :param end: Only read curve records before this unix timestamp.
+    :param windows: The impact windows, in seconds."""
+    windows = tuple(windows)
+    series = calculate_curve_series(read_curve_history(source, start=start, end=end))
+    if trades is None and hasattr(source, 'history_columns'):
+        trades = pd.DataFrame(source.history_columns('trade'))
+    elif trades is None:
+        longest = max(windows, default=0)
+        trades = source.read(
+            history_type='trade',
+            start=None if start is None else start - longest,
+            end=None if end is None else end + longest,
+            columns=['ts', 'record_id', 'direction', 'market_index', 'base_asset_amount', 'quote_asset_amount',
+                     'mark_price_after']
+        )
+    return calculate_curve_impact(series, trades, windows)
@@ -0,0 +1,405 @@
+"""Funding-rate analytics: rolling annualized funding, mark/oracle TWAP reconstruction and next-rate prediction.
+
+Every funding-rate record is reduced to the fraction of the oracle price paid over its funding period (positive when
+longs pay shorts) and appended to growable per-market columns along with a running sum, so a new record costs O(1)
+and the funding over any trailing window is the difference of two prefix sums found by binary search. Prices and
+rates in the columns are floats in quote per base; the TWAPs kept for prediction are exact integers.
+"""
+from typing import Dict, Iterable, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from sdk.constants import MARK_PRICE_PRECISION, FUNDING_PAYMENT_PRECISION
+from sdk.math.amm import calculate_mark_price
+from sdk.math.funding import ONE_HOUR, calculate_new_twap, calculate_funding_rate
+from sdk.state.history.funding_rate import FundingRateRecord
+from sdk.state.history.trade import TradeRecord
+
+ONE_DAY = 24 * ONE_HOUR
+ONE_YEAR = 365 * ONE_DAY
+DEFAULT_WINDOW = ONE_DAY
+INITIAL_CAPACITY = 1024
+FUNDING_RATE_PRECISION = MARK_PRICE_PRECISION * FUNDING_PAYMENT_PRECISION
+
+
+class MarketTwaps(NamedTuple):
+    """The mark and oracle price TWAPs of a market as of a timestamp, in MARK_PRICE_PRECISION."""
+    ts: int
+    mark_price_twap: int
+    oracle_price_twap: int
+
+
+class FundingRatePrediction(NamedTuple):
+    """The funding rate the next funding update would set if the mark and oracle prices stayed where they are."""
+    market_index: int
+    ts: int
+    mark_price_twap: int
+    oracle_price_twap: int
+    funding_rate: int
+    period_rate: float
+    annualized_funding: float
+
+
+class FundingSeries:
+    """The funding-rate records of one market as growable columns, oldest first."""
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY) -> None:
+        self.length = 0
+        self._ts = np.zeros(capacity, dtype=np.int64)
+        self._funding_rate = np.zeros(capacity)
+        self._mark_price_twap = np.zeros(capacity)
+        self._oracle_price_twap = np.zeros(capacity)
+        self._period_rate = np.zeros(capacity)
+        # prefix sums of the period rates, with a leading zero
+        self._cumulative_period_rate = np.zeros(capacity + 1)
+
+    def _reserve(self, length: int) -> None:
+        """Grow the columns, doubling their capacity, to hold at least length records."""
+        capacity = len(self._ts)
+        if length <= capacity:
+            return
+        while capacity < length:
+            capacity *= 2
+        for name in ('_ts', '_funding_rate', '_mark_price_twap', '_oracle_price_twap', '_period_rate'):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self.length] = column[:self.length]
+            setattr(self, name, grown)
+        grown = np.zeros(capacity + 1)
+        grown[:self.length + 1] = self._cumulative_period_rate[:self.length + 1]
+        self._cumulative_period_rate = grown
+
+    def extend(
+            self, ts: np.ndarray, funding_rate: np.ndarray, mark_price_twap: np.ndarray, oracle_price_twap: np.ndarray
+    ) -> None:
+        """Append records, oldest first.
+
+        :param ts: The unix timestamps of the funding updates.
+        :param funding_rate: The funding rates per period, in quote per base.
+        :param mark_price_twap: The mark price TWAPs, in quote per base.
+        :param oracle_price_twap: The oracle price TWAPs, in quote per base."""
+        start, end = self.length, self.length + len(ts)
+        self._reserve(end)
+        period_rate = np.divide(
+            funding_rate, oracle_price_twap, out=np.zeros(len(ts)), where=oracle_price_twap > 0
+        )
+        self._ts[start:end] = ts
+        self._funding_rate[start:end] = funding_rate
+        self._mark_price_twap[start:end] = mark_price_twap
+        self._oracle_price_twap[start:end] = oracle_price_twap
+        self._period_rate[start:end] = period_rate
+        self._cumulative_period_rate[start + 1:end + 1] = self._cumulative_period_rate[start] + np.cumsum(period_rate)
+        self.length = end
+
+    @property
+    def ts(self) -> np.ndarray:
+        return self._ts[:self.length]
+
+    @property
+    def funding_rate(self) -> np.ndarray:
+        return self._funding_rate[:self.length]
+
+    @property
+    def mark_price_twap(self) -> np.ndarray:
+        return self._mark_price_twap[:self.length]
+
+    @property
+    def oracle_price_twap(self) -> np.ndarray:
+        return self._oracle_price_twap[:self.length]
+
+    @property
+    def period_rate(self) -> np.ndarray:
+        return self._period_rate[:self.length]
+
+    def window_rate(self, ts: np.ndarray, window: int) -> np.ndarray:
+        """Get the summed period rates of the records in (ts - window, ts], NaN where the window reaches back past
+        the first record."""
+        cumulative_period_rate = self._cumulative_period_rate[:self.length + 1]
+        end = np.searchsorted(self.ts, ts, side='right')
+        start = np.searchsorted(self.ts, ts - window, side='right')
+        window_rate = cumulative_period_rate[end] - cumulative_period_rate[start]
+        return np.where(ts - window < self.ts[0], np.nan, window_rate)
+
+
+def predict_funding_rate(
+        market_index: int, amm, oracle_price: int, now: int, oracle_price_twap: Optional[int] = None,
+        oracle_price_twap_ts: Optional[int] = None
+) -> FundingRatePrediction:
+    """Predict the funding rate of the next funding update of a market from its AMM.
+
+    Both TWAPs are rolled forward to the time of the update assuming the current mark and oracle prices hold until
+    then, with the same integer math as the clearing house.
+
+    :param market_index: The index of the market.
+    :param amm: The DriftAmm of the market.
+    :param oracle_price: The current oracle price, in MARK_PRICE_PRECISION.
+    :param now: The current unix timestamp.
+    :param oracle_price_twap: The latest oracle price TWAP, in MARK_PRICE_PRECISION. Defaults to the one stored in
+        the AMM (last_oracle_mark_spread_twap in this layout, last_oracle_price_twap in the program IDL).
+    :param oracle_price_twap_ts: The unix timestamp of that TWAP. Defaults to the last mark TWAP update, which the
+        clearing house makes on the same trades."""
+    if oracle_price_twap is None:
+        oracle_price_twap = amm.last_oracle_mark_spread_twap
+    if oracle_price_twap_ts is None:
+        oracle_price_twap_ts = amm.last_mark_price_twap_ts
+    funding_period = amm.funding_period
+    ts = max(now, amm.last_funding_rate_ts + funding_period)
+    mark_price = calculate_mark_price(amm.base_asset_reserve, amm.quote_asset_reserve, amm.peg_multiplier)
+    mark_price_twap = calculate_new_twap(
+        last_twap=amm.last_mark_price_twap,
+        last_twap_ts=amm.last_mark_price_twap_ts,
+        price=mark_price,
+        now=ts,
+        funding_period=funding_period
+    )
+    oracle_price_twap = calculate_new_twap(
+        last_twap=oracle_price_twap,
+        last_twap_ts=oracle_price_twap_ts,
+        price=oracle_price,
+        now=ts,
+        funding_period=funding_period
+    )
+    funding_rate = calculate_funding_rate(
+        mark_price_twap=mark_price_twap,
+        oracle_price_twap=oracle_price_twap,
+        funding_period=funding_period
+    )
+    period_rate = funding_rate / FUNDING_PAYMENT_PRECISION / oracle_price_twap if oracle_price_twap > 0 else 0.0
+    funding_rate_prediction = FundingRatePrediction(
+        market_index=market_index,
+        ts=ts,
+        mark_price_twap=mark_price_twap,
+        oracle_price_twap=oracle_price_twap,
+        funding_rate=funding_rate,
+        period_rate=period_rate,
+        annualized_funding=period_rate * ONE_YEAR / max(funding_period, 1)
+    )
+    return funding_rate_prediction
+
+
+class FundingRateAnalytics:
+    """Funding-rate history of every market, updated incrementally from new records.
+
+    Feed it the records of each poll of the funding-rate history with update (already seen record ids are skipped),
+    backfill it from archived records with update_frame or from_archive, and optionally feed it trades with
+    update_trades to follow the TWAPs between funding updates."""
+
+    def __init__(self, funding_period: int = ONE_HOUR) -> None:
+        """:param funding_period: The funding period used to roll the TWAPs over trades, in seconds."""
+        self.funding_period = funding_period
+        self.series: Dict[int, FundingSeries] = {}
+        self.twaps: Dict[int, MarketTwaps] = {}
+        self.last_record_id = -1
+        self.last_trade_record_id = -1
+
+    @classmethod
+    def from_archive(cls, archive, start=None, end=None, funding_period: int = ONE_HOUR):
+        """Backfill the analytics from the funding-rate records of a HistoryArchive.
+
+        :param archive: The sdk.archive.parquet.HistoryArchive to read.
+        :param start: Only read records at or after this time (unix seconds or datetime).
+        :param end: Only read records before this time (unix seconds or datetime)."""
+        analytics = cls(funding_period=funding_period)
+        df = archive.read(history_type='funding_rate', start=start, end=end)
+        analytics.update_frame(df)
+        return analytics
+
+    def _get_series(self, market_index: int) -> FundingSeries:
+        if market_index not in self.series:
+            raise Exception(f'No funding-rate records for market {market_index}.')
+        return self.series[market_index]
+
+    def _set_twaps(self, market_index: int, market_twaps: MarketTwaps) -> None:
+        """Replace the TWAPs of a market unless the ones kept are more recent."""
+        current = self.twaps.get(market_index)
+        if current is None or market_twaps.ts >= current.ts:
+            self.twaps[market_index] = market_twaps
+
+    """UPDATES"""
+
+    def update(self, records: Iterable[FundingRateRecord]) -> int:
+        """Add the funding-rate records not seen yet, e.g. history.ordered_records() of a FundingRateHistory.
+
+        :return: The number of records added."""
+        records = sorted(
+            (record for record in records if record.record_id > self.last_record_id),
+            key=lambda record: record.record_id
+        )
+        if not records:
+            return 0
+        df = pd.DataFrame({
+            'record_id': [record.record_id for record in records],
+            'ts': [record.ts for record in records],
+            'market_index': [record.market_index for record in records],
+            'funding_rate': [record.funding_rate for record in records],
+            'oracle_price_twap': [record.oracle_price_twap for record in records],
+            'mark_price_twap': [record.mark_price_twap for record in records]
+        })
+        return self.update_frame(df)
+
+    def update_frame(self, df: pd.DataFrame) -> int:
+        """Add the funding-rate records of a frame not seen yet, vectorized over each market.
+
+        :param df: Records with the columns of the archive (HistoryArchive.read('funding_rate')), oldest first.
+        :return: The number of records added."""
+        df = df[df['record_id'] > self.last_record_id]
+        if df.empty:
+            return 0
+        for market_index, market_df in df.groupby('market_index', sort=False):
+            market_index = int(market_index)
+            series = self.series.setdefault(market_index, FundingSeries())
+            series.extend(
+                ts=market_df['ts'].to_numpy(dtype=np.int64),
+                funding_rate=market_df['funding_rate'].to_numpy(dtype=float) / FUNDING_RATE_PRECISION,
+                mark_price_twap=market_df['mark_price_twap'].to_numpy(dtype=float) / MARK_PRICE_PRECISION,
+                oracle_price_twap=market_df['oracle_price_twap'].to_numpy(dtype=float) / MARK_PRICE_PRECISION
+            )
+            last = market_df.iloc[-1]
+            self._set_twaps(market_index, MarketTwaps(
+                ts=int(last['ts']),
+                mark_price_twap=int(last['mark_price_twap']),
+                oracle_price_twap=int(last['oracle_price_twap'])
+            ))
+        self.last_record_id = int(df['record_id'].max())
+        return len(df)
+
+    def update_trades(self, records: Iterable[TradeRecord]) -> int:
+        """Roll the TWAPs of the markets forward over the trades not seen yet, as the clearing house does.
+
+        The TWAPs of a market start at its first funding-rate record or trade.
+
+        :return: The number of trades applied."""
+        applied = 0
+        for record in sorted(records, key=lambda trade_record: trade_record.record_id):
+            if record.record_id <= self.last_trade_record_id:
+                continue
+            current = self.twaps.get(record.market_index)
+            if current is None:
+                market_twaps = MarketTwaps(
+                    ts=record.ts,
+                    mark_price_twap=record.mark_price_before,
+                    oracle_price_twap=record.oracle_price
+                )
+            elif record.ts < current.ts:
+                # already covered by a later funding update
+                market_twaps = current
+            else:
+                market_twaps = MarketTwaps(
+                    ts=record.ts,
+                    mark_price_twap=calculate_new_twap(
+                        current.mark_price_twap, current.ts, record.mark_price_before, record.ts, self.funding_period
+                    ),
+                    oracle_price_twap=calculate_new_twap(
+                        current.oracle_price_twap, current.ts, record.oracle_price, record.ts, self.funding_period
+                    )
+                )
+            self.twaps[record.market_index] = market_twaps
+            self.last_trade_record_id = record.record_id
+            applied += 1
+        return applied
+
+    """QUERIES"""
+
+    def annualized_funding(self, market_index: int, window: int = DEFAULT_WINDOW) -> pd.Series:
+        """Get the funding paid over a trailing window at every funding update of a market, annualized.
+
+        A value of 0.1 means longs paid shorts 10% of the oracle price per year at the pace of the window. The
+        first updates, whose window reaches back past the first record, are NaN.
+
+        :param market_index: The index of the market.
+        :param window: The trailing window, in seconds."""
+        series = self._get_series(market_index)
+        annualized_funding = series.window_rate(series.ts, window) * (ONE_YEAR / window)
+        return pd.Series(annualized_funding, index=pd.Index(series.ts, name='ts'), name='annualized_funding')
+
+    def latest_annualized_funding(self, window: int = DEFAULT_WINDOW) -> Dict[int, float]:
+        """Get the annualized funding over the window ending at the last update of every market."""
+        latest = {}
+        for market_index, series in self.series.items():
+            window_rate = series.window_rate(series.ts[-1:], window)
+            latest[market_index] = float(window_rate[0] * (ONE_YEAR / window))
+        return latest
+
+    def spread_twaps(self, market_index: int) -> pd.DataFrame:
+        """Get the mark and oracle TWAPs of a market at every funding update, and the spread between them.
+
+        The spread is in quote per base and, as spread_twap_pct, relative to the oracle TWAP."""
+        series = self._get_series(market_index)
+        spread_twap = series.mark_price_twap - series.oracle_price_twap
+        df = pd.DataFrame({
+            'mark_price_twap': series.mark_price_twap,
+            'oracle_price_twap': series.oracle_price_twap,
+            'spread_twap': spread_twap,
+            'spread_twap_pct': np.divide(
+                spread_twap, series.oracle_price_twap, out=np.full(series.length, np.nan),
+                where=series.oracle_price_twap > 0
+            ),
+            'funding_rate': series.funding_rate,
+            'period_rate': series.period_rate
+        }, index=pd.Index(series.ts, name='ts'))
+        return df
+
+    def reconstruct_twaps(self, market_index: int, trades: pd.DataFrame) -> pd.DataFrame:
+        """Reconstruct the mark and oracle TWAPs of a market after each of its trades.
+
+        The TWAPs restart from every funding-rate record, which carries the on-chain values, and are rolled over the
+        trades in between, so the spread can be followed within funding periods.
+
+        :param market_index: The index of the market.
+        :param trades: Trade records with the columns of the archive (HistoryArchive.read('trade')), oldest first.
+        :return: The TWAPs in quote per base, indexed by the trade timestamps."""
+        series = self._get_series(market_index)
+        trades = trades[trades['market_index'] == market_index]
+        trade_ts = trades['ts'].to_numpy(dtype=np.int64)
+        mark_prices = trades['mark_price_before'].to_numpy(dtype=float) / MARK_PRICE_PRECISION
+        oracle_prices = trades['oracle_price'].to_numpy(dtype=float) / MARK_PRICE_PRECISION
+        # the funding update at or before each trade, -1 before the first one
+        funding_rows = np.searchsorted(series.ts, trade_ts, side='right') - 1
+        mark_price_twap = np.full(len(trade_ts), np.nan)
+        oracle_price_twap = np.full(len(trade_ts), np.nan)
+        funding_period = self.funding_period
+        row, twap_ts, mark_twap, oracle_twap = -1, 0, np.nan, np.nan
+        for i, (ts, funding_row) in enumerate(zip(trade_ts.tolist(), funding_rows.tolist())):
+            if funding_row != row:
+                row = funding_row
+                twap_ts = int(series.ts[row])
+                mark_twap = float(series.mark_price_twap[row])
+                oracle_twap = float(series.oracle_price_twap[row])
+            if row >= 0:
+                since_last = max(ts - twap_ts, 1)
+                from_start = max(funding_period - since_last, 0)
+                weight = since_last / (since_last + from_start)
+                mark_twap += (mark_prices[i] - mark_twap) * weight
+                oracle_twap += (oracle_prices[i] - oracle_twap) * weight
+                twap_ts = ts
+            mark_price_twap[i] = mark_twap
+            oracle_price_twap[i] = oracle_twap
+        df = pd.DataFrame({
+            'mark_price_twap': mark_price_twap,
+            'oracle_price_twap': oracle_price_twap,
+            'spread_twap': mark_price_twap - oracle_price_twap
+        }, index=pd.Index(trade_ts, name='ts'))
+        return df
+
+    def predict(self, market_index: int, amm, oracle_price: int, now: int) -> FundingRatePrediction:
+        """Predict the next funding rate of a market, see predict_funding_rate.
+
+        The oracle TWAP followed from the records is used when it is more recent than the last mark TWAP update of
+        the AMM."""
+        market_twaps = self.twaps.get(market_index)
+        if market_twaps is not None and market_twaps.ts >= amm.last_mark_price_twap_ts:
+            return predict_funding_rate(
+                market_index=market_index,
+                amm=amm,
+                oracle_price=oracle_price,
+                now=now,
+                oracle_price_twap=market_twaps.oracle_price_twap,
+                oracle_price_twap_ts=market_twaps.ts
+            )
+        return predict_funding_rate(
+            market_index=market_index,
+            amm=amm,
+            oracle_price=oracle_price,
+            now=now
+        )
@@ -0,0 +1,175 @@
+"""Liquidation risk analytics: cascades, liquidated volume per market move and insurance-fund inflows.
+
+A liquidation record carries no market, the trades that closed the positions do: the clearing house writes one trade
+record with liquidation set per closed position, at the timestamp of the liquidation record of the same user. The
+two histories are joined on (user, ts) and every step works on whole columns, so the archived history is processed
+in one pass. Amounts are floats in quote asset, prices in quote per base and margin ratios as fractions.
+"""
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from sdk.constants import QUOTE_PRECISION, MARK_PRICE_PRECISION, AMM_RESERVE_PRECISION, MARGIN_PRECISION
+
+DEFAULT_CASCADE_GAP = 60
+DEFAULT_INFLOW_PERIOD = 3600
+LIQUIDATION_PRECISIONS = {
+    'base_asset_value': QUOTE_PRECISION,
+    'base_asset_value_closed': QUOTE_PRECISION,
+    'liquidation_fee': QUOTE_PRECISION,
+    'fee_to_liquidator': QUOTE_PRECISION,
+    'fee_to_insurance_fund': QUOTE_PRECISION,
+    'total_collateral': QUOTE_PRECISION,
+    'collateral': QUOTE_PRECISION,
+    'unrealized_pnl': QUOTE_PRECISION,
+    'margin_ratio': MARGIN_PRECISION
+}
+TRADE_PRECISIONS = {
+    'base_asset_amount': AMM_RESERVE_PRECISION,
+    'quote_asset_amount': QUOTE_PRECISION,
+    'mark_price_before': MARK_PRICE_PRECISION,
+    'mark_price_after': MARK_PRICE_PRECISION
+}
+
+
+class LiquidationReport(NamedTuple):
+    """The liquidations, their trades, the cascades they form and the insurance-fund inflows."""
+    liquidations: pd.DataFrame
+    liquidation_trades: pd.DataFrame
+    cascades: pd.DataFrame
+    cascade_markets: pd.DataFrame
+    insurance_fund_inflow: pd.Series
+
+
+def _to_floats(df: pd.DataFrame, precisions: dict) -> pd.DataFrame:
+    """Convert the integer amounts of archived records to floats in human units."""
+    df = df.copy()
+    for column, precision in precisions.items():
+        if column in df.columns:
+            df[column] = df[column].to_numpy(dtype=float) / precision
+    return df
+
+
+def join_liquidation_trades(liquidations: pd.DataFrame, trades: pd.DataFrame) -> pd.DataFrame:
+    """Get the trades that closed liquidated positions, with the record id (and cascade, if labelled) of their
+    liquidation. Trades without a liquidation record among the ones given get NaN.
+
+    :param liquidations: Liquidation records with the columns of the archive (HistoryArchive.read('liquidation')).
+    :param trades: Trade records with the columns of the archive; only the ones with liquidation set are used."""
+    liquidation_trades = _to_floats(trades[trades['liquidation']], TRADE_PRECISIONS)
+    key_columns = ['user', 'ts', 'record_id'] + (['cascade'] if 'cascade' in liquidations.columns else [])
+    keys = liquidations[key_columns].rename(columns={'record_id': 'liquidation_record_id'})
+    # a user can only be liquidated once per timestamp, so the keys are unique
+    keys = keys.drop_duplicates(subset=['user', 'ts'], keep='last')
+    liquidation_trades = liquidation_trades.merge(keys, on=['user', 'ts'], how='left', validate='many_to_one')
+    return liquidation_trades.sort_values('record_id', ignore_index=True)
+
+
+def label_cascades(ts: np.ndarray, max_gap: int = DEFAULT_CASCADE_GAP) -> np.ndarray:
+    """Number bursts of events, a new burst starting after a quiet gap longer than max_gap seconds.
+
+    :param ts: The event timestamps, ascending.
+    :return: The burst of every event, from 0."""
+    if len(ts) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate([[0], np.cumsum(np.diff(ts) > max_gap)])
+
+
+def summarize_cascades(liquidations: pd.DataFrame) -> pd.DataFrame:
+    """Aggregate liquidations, labelled with their cascade, into one row per cascade."""
+    cascades = liquidations.groupby('cascade', sort=True).agg(
+        start=('ts', 'min'),
+        end=('ts', 'max'),
+        liquidations=('record_id', 'size'),
+        partial_liquidations=('partial', 'sum'),
+        users=('user', 'nunique'),
+        base_asset_value_closed=('base_asset_value_closed', 'sum'),
+        fee_to_liquidator=('fee_to_liquidator', 'sum'),
+        fee_to_insurance_fund=('fee_to_insurance_fund', 'sum'),
+        min_margin_ratio=('margin_ratio', 'min')
+    )
+    cascades['duration'] = cascades['end'] - cascades['start']
+    return cascades
+
+
+def summarize_cascade_markets(liquidation_trades: pd.DataFrame) -> pd.DataFrame:
+    """Aggregate liquidation trades, labelled with their cascade, per cascade and market.
+
+    The market move is the mark price change from before the first to after the last liquidation trade of the
+    cascade, and volume_per_move the quote volume liquidated per 1% of that move."""
+    cascade_markets = liquidation_trades.groupby(['cascade', 'market_index'], sort=True).agg(
+        trades=('record_id', 'size'),
+        base_asset_amount=('base_asset_amount', 'sum'),
+        quote_asset_amount=('quote_asset_amount', 'sum'),
+        mark_price_before=('mark_price_before', 'first'),
+        mark_price_after=('mark_price_after', 'last')
+    )
+    market_move = cascade_markets['mark_price_after'] / cascade_markets['mark_price_before'] - 1
+    cascade_markets['market_move'] = market_move
+    cascade_markets['volume_per_move'] = cascade_markets['quote_asset_amount'] / (market_move.abs() * 100).where(
+        market_move != 0
+    )
+    return cascade_markets
+
+
+def calculate_insurance_fund_inflow(liquidations: pd.DataFrame, period: int = DEFAULT_INFLOW_PERIOD) -> pd.Series:
+    """Get the liquidation fees paid to the insurance fund per period, including the periods without any.
+
+    :param liquidations: Liquidation records in human units, see analyze_liquidations.
+    :param period: The length of the periods, in seconds.
+    :return: The inflows in quote asset, indexed by period start."""
+    if liquidations.empty:
+        return pd.Series([], dtype=float, index=pd.Index([], name='ts'), name='fee_to_insurance_fund')
+    ts = liquidations['ts'].to_numpy(dtype=np.int64)
+    first = ts.min() // period
+    buckets = ts // period - first
+    inflow = np.bincount(buckets, weights=liquidations['fee_to_insurance_fund'].to_numpy())
+    index = pd.Index((first + np.arange(len(inflow))) * period, name='ts')
+    return pd.Series(inflow, index=index, name='fee_to_insurance_fund')
+
+
+def analyze_liquidations(
+        liquidations: pd.DataFrame, trades: pd.DataFrame, max_gap: int = DEFAULT_CASCADE_GAP,
+        inflow_period: int = DEFAULT_INFLOW_PERIOD
+) -> LiquidationReport:
+    """Run the liquidation analytics over archived liquidation and trade records.
+
+    :param liquidations: Liquidation records with the columns of the archive (HistoryArchive.read('liquidation')).
+    :param trades: Trade records with the columns of the archive (HistoryArchive.read('trade')).
+    :param max_gap: The longest quiet gap within a cascade, in seconds.
+    :param inflow_period: The length of the insurance-fund inflow periods, in seconds."""
+    liquidations = _to_floats(liquidations, LIQUIDATION_PRECISIONS).sort_values('record_id', ignore_index=True)
+    liquidations['cascade'] = label_cascades(liquidations['ts'].to_numpy(dtype=np.int64), max_gap)
+    liquidation_trades = join_liquidation_trades(liquidations, trades)
+    liquidation_report = LiquidationReport(
+        liquidations=liquidations,
+        liquidation_trades=liquidation_trades,
+        cascades=summarize_cascades(liquidations),
+        cascade_markets=summarize_cascade_markets(liquidation_trades.dropna(subset=['cascade'])),
+        insurance_fund_inflow=calculate_insurance_fund_inflow(liquidations, inflow_period)
+    )
+    return liquidation_report
+
+
+def analyze_archived_liquidations(
+        archive, start=None, end=None, max_gap: int = DEFAULT_CASCADE_GAP, inflow_period: int = DEFAULT_INFLOW_PERIOD
+) -> LiquidationReport:
+    """Run the liquidation analytics over a slice of a HistoryArchive, reading only the liquidation trades' columns.
+
+    :param archive: The sdk.archive.parquet.HistoryArchive to read.
+    :param start: Only read records at or after this time (unix seconds or datetime).
+    :param end: Only read records before this time (unix seconds or datetime)."""
+    liquidations = archive.read(history_type='liquidation', start=start, end=end)
+    trades = archive.read(
+        history_type='trade',
+        start=start,
+        end=end,
+        columns=['ts', 'record_id', 'user', 'direction', 'liquidation', 'market_index'] + list(TRADE_PRECISIONS)
+    )
+    return analyze_liquidations(
+        liquidations=liquidations,
+        trades=trades,
+        max_gap=max_gap,
+        inflow_period=inflow_period
+    )
@@ -0,0 +1,206 @@
+"""Per-user PnL attribution from the deposit, trade, funding-payment and liquidation histories.
+
+Drift.user_summary can only take collateral minus cumulative deposits. Here the PnL is split by source instead:
+
+* trading: the cash flows of the trades (sales minus purchases) plus the open base asset valued at the mark price,
+  so realized and unrealized PnL together without having to replay average entry prices;
+* funding: the funding payments settled into the collateral, positive when received;
+* fees: the trading fees paid;
+* liquidation: the liquidation fees charged on liquidation (to the liquidator and the insurance fund).
+
+All of these are sums, so each history is reduced with a vectorized group-by and new records are simply added to
+the running totals, whether they come from the archive or from polls of the history buffers. Amounts are floats in
+quote asset and base asset amounts in base asset.
+"""
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from sdk.constants import QUOTE_PRECISION, MARK_PRICE_PRECISION, AMM_RESERVE_PRECISION
+from sdk.state.core import ElementCore
+from sdk.utils import position_direction
+
+ATTRIBUTED_HISTORY_TYPES = ('deposit', 'trade', 'funding_payment', 'liquidation')
+USER_COLUMNS = ['deposits', 'withdrawals', 'trading_cash_flow', 'funding', 'fees', 'liquidation_fees']
+POSITION_COLUMNS = ['base_asset_amount', 'trading_cash_flow']
+LONG = position_direction('long')
+DEPOSIT = 0
+
+
+def _column(df: pd.DataFrame, name: str, precision: float = 1) -> np.ndarray:
+    """Get an integer column of archived records as floats in human units."""
+    return df[name].to_numpy(dtype=float) / precision
+
+
+def records_to_frame(records: Iterable[ElementCore]) -> pd.DataFrame:
+    """Turn history records into a frame with the columns of the archive, public keys as base58 strings."""
+    records = list(records)
+    if not records:
+        return pd.DataFrame()
+    field_names = [subcon.name for subcon in type(records[0]).layout.subcons]
+    columns = {}
+    for field_name in field_names:
+        values = [getattr(record, field_name) for record in records]
+        if hasattr(values[0], 'to_base58'):
+            values = [value.__str__() for value in values]
+        columns[field_name] = values
+    return pd.DataFrame(columns)
+
+
+class PnlAttribution:
+    """Running PnL attribution of every user, grouped by user account and by authority.
+
+    Feed it each history type with update_frame (archived records) or update (records of a poll); record ids
+    already seen are skipped per history type."""
+
+    def __init__(self) -> None:
+        self.users = pd.DataFrame(columns=USER_COLUMNS, dtype=float, index=pd.Index([], name='user'))
+        self.positions = pd.DataFrame(
+            columns=POSITION_COLUMNS, dtype=float,
+            index=pd.MultiIndex.from_arrays([[], []], names=['user', 'market_index'])
+        )
+        # authorities of the user accounts, funding payments only name the user account
+        self.authorities: Dict[str, str] = {}
+        # mark price after the latest trade of every market
+        self.mark_prices: Dict[int, float] = {}
+        self.last_record_ids = {history_type: -1 for history_type in ATTRIBUTED_HISTORY_TYPES}
+
+    @classmethod
+    def from_archive(cls, archive, start=None, end=None):
+        """Attribute the PnL of the records of a HistoryArchive.
+
+        :param archive: The sdk.archive.parquet.HistoryArchive to read.
+        :param start: Only read records at or after this time (unix seconds or datetime).
+        :param end: Only read records before this time (unix seconds or datetime)."""
+        pnl_attribution = cls()
+        for history_type in ATTRIBUTED_HISTORY_TYPES:
+            df = archive.read(history_type=history_type, start=start, end=end)
+            pnl_attribution.update_frame(history_type, df)
+        return pnl_attribution
+
+    def _add_users(self, user_sums: pd.DataFrame) -> None:
+        self.users = self.users.add(user_sums.reindex(columns=USER_COLUMNS), fill_value=0).fillna(0.0)
+
+    def _add_authorities(self, df: pd.DataFrame) -> None:
+        pairs = df[['user', 'user_authority']].drop_duplicates(subset='user', keep='last')
+        self.authorities.update(zip(pairs['user'], pairs['user_authority']))
+
+    """UPDATES"""
+
+    def update(self, history_type: str, records: Iterable[ElementCore]) -> int:
+        """Add the records of one history type not seen yet, e.g. history.ordered_records() of a poll.
+
+        :return: The number of records added."""
+        last_record_id = self.last_record_ids[history_type]
+        records = [record for record in records if record.record_id > last_record_id]
+        return self.update_frame(history_type, records_to_frame(records))
+
+    def update_frame(self, history_type: str, df: pd.DataFrame) -> int:
+        """Add the records of one history type not seen yet.
+
+        :param history_type: One of ATTRIBUTED_HISTORY_TYPES.
+        :param df: Records with the columns of the archive (HistoryArchive.read(history_type)).
+        :return: The number of records added."""
+        if history_type not in self.last_record_ids:
+            raise Exception(f'Cannot attribute PnL from the {history_type} history.')
+        if df.empty:
+            return 0
+        df = df[df['record_id'] > self.last_record_ids[history_type]]
+        if df.empty:
+            return 0
+        df = df.sort_values('record_id')
+        if history_type == 'deposit':
+            self._update_deposits(df)
+        elif history_type == 'trade':
+            self._update_trades(df)
+        elif history_type == 'funding_payment':
+            self._update_funding_payments(df)
+        else:
+            self._update_liquidations(df)
+        self.last_record_ids[history_type] = int(df['record_id'].max())
+        return len(df)
+
+    def _update_deposits(self, df: pd.DataFrame) -> None:
+        amount = _column(df, 'amount', QUOTE_PRECISION)
+        deposit = df['direction'].to_numpy() == DEPOSIT
+        flows = pd.DataFrame({
+            'user': df['user'].to_numpy(),
+            'deposits': np.where(deposit, amount, 0.0),
+            'withdrawals': np.where(deposit, 0.0, amount)
+        })
+        self._add_users(flows.groupby('user').sum())
+        self._add_authorities(df)
+
+    def _update_trades(self, df: pd.DataFrame) -> None:
+        long = df['direction'].to_numpy() == LONG
+        base_asset_amount = _column(df, 'base_asset_amount', AMM_RESERVE_PRECISION)
+        quote_asset_amount = _column(df, 'quote_asset_amount', QUOTE_PRECISION)
+        flows = pd.DataFrame({
+            'user': df['user'].to_numpy(),
+            'market_index': df['market_index'].to_numpy(dtype=np.int64),
+            'base_asset_amount': np.where(long, base_asset_amount, -base_asset_amount),
+            'trading_cash_flow': np.where(long, -quote_asset_amount, quote_asset_amount),
+            'fees': _column(df, 'fee', QUOTE_PRECISION)
+        })
+        position_sums = flows.groupby(['user', 'market_index'])[POSITION_COLUMNS].sum()
+        self.positions = self.positions.add(position_sums, fill_value=0).fillna(0.0)
+        self._add_users(flows.groupby('user')[['trading_cash_flow', 'fees']].sum())
+        self._add_authorities(df)
+        last_trades = df.drop_duplicates(subset='market_index', keep='last')
+        self.mark_prices.update(zip(
+            last_trades['market_index'].to_numpy(dtype=np.int64).tolist(),
+            _column(last_trades, 'mark_price_after', MARK_PRICE_PRECISION).tolist()
+        ))
+
+    def _update_funding_payments(self, df: pd.DataFrame) -> None:
+        payments = pd.DataFrame({
+            'user': df['user'].to_numpy(),
+            'funding': _column(df, 'funding_payment', QUOTE_PRECISION)
+        })
+        self._add_users(payments.groupby('user').sum())
+
+    def _update_liquidations(self, df: pd.DataFrame) -> None:
+        fees = pd.DataFrame({
+            'user': df['user'].to_numpy(),
+            'liquidation_fees': _column(df, 'liquidation_fee', QUOTE_PRECISION)
+        })
+        self._add_users(fees.groupby('user').sum())
+        self._add_authorities(df)
+
+    """ATTRIBUTION"""
+
+    def user_pnl(self, mark_prices: Optional[Dict[int, float]] = None) -> pd.DataFrame:
+        """Get the PnL of every user account split by source.
+
+        :param mark_prices: The prices to value open positions at, by market index, in quote per base. Defaults to
+            the mark price after the latest trade of each market.
+        :return: One row per user account with its authority, net deposits, trading, funding, fee and liquidation
+            PnL, their total, and the value of its open positions."""
+        prices = dict(self.mark_prices)
+        prices.update(mark_prices or {})
+        market_index = self.positions.index.get_level_values('market_index')
+        position_value = self.positions['base_asset_amount'].to_numpy() * market_index.map(prices).to_numpy(
+            dtype=float, na_value=np.nan
+        )
+        position_value = pd.Series(position_value, index=self.positions.index).groupby(level='user').sum()
+        users = self.users.reindex(self.users.index.union(position_value.index), fill_value=0.0)
+        position_value = position_value.reindex(users.index, fill_value=0.0)
+        user_pnl = pd.DataFrame({
+            'authority': users.index.map(lambda user: self.authorities.get(user, user)),
+            'net_deposits': users['deposits'] - users['withdrawals'],
+            'trading_pnl': users['trading_cash_flow'] + position_value,
+            'funding_pnl': users['funding'],
+            'fee_pnl': 0.0 - users['fees'],
+            'liquidation_pnl': 0.0 - users['liquidation_fees'],
+            'position_value': position_value
+        }, index=users.index)
+        user_pnl['total_pnl'] = user_pnl[['trading_pnl', 'funding_pnl', 'fee_pnl', 'liquidation_pnl']].sum(axis=1)
+        return user_pnl
+
+    def authority_pnl(self, mark_prices: Optional[Dict[int, float]] = None) -> pd.DataFrame:
+        """Get the PnL split by source summed over the user accounts of every authority, see user_pnl."""
+        user_pnl = self.user_pnl(mark_prices=mark_prices)
+        authority_pnl = user_pnl.groupby('authority').sum(numeric_only=True)
+        authority_pnl['user_accounts'] = user_pnl.groupby('authority').size()
+        return authority_pnl
@@ -0,0 +1,185 @@
+"""OHLCV bars of the trade tape, per market and at several resolutions at once.
+
+A bar opens at the mark price before its first trade, closes at the mark price after its last one and spans every
+mark price in between; volumes are in base asset, quote volumes in quote asset and signed volumes count longs as
+positive. Bars only exist for intervals that saw trades. Each trade is folded into the open bar of every resolution
+in O(1), and archived trades are aggregated per bar with a vectorized group-by before being folded in the same way.
+"""
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from sdk.constants import MARK_PRICE_PRECISION, AMM_RESERVE_PRECISION, QUOTE_PRECISION
+from sdk.state.history.trade import TradeRecord
+from sdk.utils import position_direction
+
+ONE_SECOND = 1
+ONE_MINUTE = 60
+ONE_HOUR = 3600
+DEFAULT_RESOLUTIONS = (ONE_SECOND, ONE_MINUTE, ONE_HOUR)
+BAR_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'quote_volume', 'signed_volume', 'trades']
+LONG = position_direction('long')
+
+# positions in a bar row, after its start timestamp
+OPEN, HIGH, LOW, CLOSE, VOLUME, QUOTE_VOLUME, SIGNED_VOLUME, TRADES = range(1, 9)
+
+
+def _merge_bar(bar: list, row: tuple) -> None:
+    """Fold a later bar, or a single trade, of the same interval into a bar."""
+    if row[HIGH] > bar[HIGH]:
+        bar[HIGH] = row[HIGH]
+    if row[LOW] < bar[LOW]:
+        bar[LOW] = row[LOW]
+    bar[CLOSE] = row[CLOSE]
+    bar[VOLUME] += row[VOLUME]
+    bar[QUOTE_VOLUME] += row[QUOTE_VOLUME]
+    bar[SIGNED_VOLUME] += row[SIGNED_VOLUME]
+    bar[TRADES] += row[TRADES]
+
+
+def aggregate_trades(df: pd.DataFrame, resolution: int) -> pd.DataFrame:
+    """Aggregate trades into bars of one resolution, vectorized.
+
+    :param df: Trade records with the columns of the archive (HistoryArchive.read('trade')), oldest first.
+    :param resolution: The length of the bars, in seconds.
+    :return: The bars in human units, indexed by market index and bar start."""
+    mark_price_before = df['mark_price_before'].to_numpy(dtype=float) / MARK_PRICE_PRECISION
+    mark_price_after = df['mark_price_after'].to_numpy(dtype=float) / MARK_PRICE_PRECISION
+    base_asset_amount = df['base_asset_amount'].to_numpy(dtype=float) / AMM_RESERVE_PRECISION
+    ts = df['ts'].to_numpy(dtype=np.int64)
+    trades = pd.DataFrame({
+        'market_index': df['market_index'].to_numpy(dtype=np.int64),
+        'ts': ts // resolution * resolution,
+        'open': mark_price_before,
+        'high': np.maximum(mark_price_before, mark_price_after),
+        'low': np.minimum(mark_price_before, mark_price_after),
+        'close': mark_price_after,
+        'volume': base_asset_amount,
+        'quote_volume': df['quote_asset_amount'].to_numpy(dtype=float) / QUOTE_PRECISION,
+        'signed_volume': np.where(df['direction'].to_numpy() == LONG, base_asset_amount, -base_asset_amount)
+    })
+    bars = trades.groupby(['market_index', 'ts'], sort=True).agg(
+        open=('open', 'first'),
+        high=('high', 'max'),
+        low=('low', 'min'),
+        close=('close', 'last'),
+        volume=('volume', 'sum'),
+        quote_volume=('quote_volume', 'sum'),
+        signed_volume=('signed_volume', 'sum'),
+        trades=('open', 'size')
+    )
+    return bars
+
+
+class TradeTape:
+    """OHLCV, VWAP and signed-volume bars of every market at several resolutions, updated as trades arrive.
+
+    Feed it the records of each poll of the trade history with update (already seen record ids are skipped) and
+    backfill it from archived trades with update_frame or from_archive."""
+
+    def __init__(self, resolutions: Iterable[int] = DEFAULT_RESOLUTIONS) -> None:
+        """:param resolutions: The lengths of the bars, in seconds."""
+        self.resolutions = tuple(resolutions)
+        # closed bars and the open bar per (market index, resolution), as [start, open, high, low, ...] rows
+        self.closed_bars: Dict[Tuple[int, int], List[list]] = {}
+        self.open_bars: Dict[Tuple[int, int], list] = {}
+        self.last_record_id = -1
+
+    @classmethod
+    def from_archive(cls, archive, start=None, end=None, resolutions: Iterable[int] = DEFAULT_RESOLUTIONS):
+        """Backfill a tape from the trades of a HistoryArchive.
+
+        :param archive: The sdk.archive.parquet.HistoryArchive to read.
+        :param start: Only read trades at or after this time (unix seconds or datetime).
+        :param end: Only read trades before this time (unix seconds or datetime)."""
+        trade_tape = cls(resolutions=resolutions)
+        df = archive.read(history_type='trade', start=start, end=end)
+        trade_tape.update_frame(df)
+        return trade_tape
+
+    def _add(self, market_index: int, resolution: int, row: tuple) -> None:
+        """Fold a trade or a bar into the open bar of its interval, closing the open bar when the interval moved on.
+
+        Rows of an interval before the open bar's are folded into it too, as the tape only moves forward."""
+        key = (market_index, resolution)
+        bar = self.open_bars.get(key)
+        if bar is None:
+            self.open_bars[key] = list(row)
+        elif row[0] > bar[0]:
+            self.closed_bars.setdefault(key, []).append(bar)
+            self.open_bars[key] = list(row)
+        else:
+            _merge_bar(bar, row)
+
+    """UPDATES"""
+
+    def update(self, records: Iterable[TradeRecord]) -> int:
+        """Add the trades not seen yet, e.g. history.ordered_records() of a TradeHistory.
+
+        :return: The number of trades added."""
+        records = sorted(
+            (record for record in records if record.record_id > self.last_record_id),
+            key=lambda record: record.record_id
+        )
+        for record in records:
+            mark_price_before = record.mark_price_before / MARK_PRICE_PRECISION
+            mark_price_after = record.mark_price_after / MARK_PRICE_PRECISION
+            volume = record.base_asset_amount / AMM_RESERVE_PRECISION
+            for resolution in self.resolutions:
+                self._add(record.market_index, resolution, (
+                    record.ts // resolution * resolution,
+                    mark_price_before,
+                    max(mark_price_before, mark_price_after),
+                    min(mark_price_before, mark_price_after),
+                    mark_price_after,
+                    volume,
+                    record.quote_asset_amount / QUOTE_PRECISION,
+                    volume if record.direction == LONG else -volume,
+                    1
+                ))
+        if records:
+            self.last_record_id = records[-1].record_id
+        return len(records)
+
+    def update_frame(self, df: pd.DataFrame) -> int:
+        """Add the trades of a frame not seen yet, aggregating them into bars with a vectorized group-by.
+
+        :param df: Trade records with the columns of the archive (HistoryArchive.read('trade')), oldest first.
+        :return: The number of trades added."""
+        df = df[df['record_id'] > self.last_record_id]
+        if df.empty:
+            return 0
+        for resolution in self.resolutions:
+            bars = aggregate_trades(df, resolution)
+            for (market_index, start), row in zip(bars.index, bars.itertuples(index=False, name=None)):
+                self._add(int(market_index), resolution, (int(start),) + row)
+        self.last_record_id = int(df['record_id'].max())
+        return len(df)
+
+    """QUERIES"""
+
+    def bars(self, market_index: int, resolution: int, include_open: bool = True) -> pd.DataFrame:
+        """Get the bars of a market at a resolution, oldest first, with their VWAP.
+
+        :param market_index: The index of the market.
+        :param resolution: One of the resolutions of the tape, in seconds.
+        :param include_open: Include the bar still open to new trades."""
+        if resolution not in self.resolutions:
+            raise Exception(f'The trade tape has no {resolution}s bars.')
+        key = (market_index, resolution)
+        rows = list(self.closed_bars.get(key, []))
+        if include_open and key in self.open_bars:
+            rows.append(self.open_bars[key])
+        df = pd.DataFrame(rows, columns=['ts'] + BAR_COLUMNS).set_index('ts')
+        df['vwap'] = df['quote_volume'] / df['volume'].where(df['volume'] > 0)
+        return df
+
+    def last_bar(self, market_index: int, resolution: int) -> dict:
+        """Get the open bar of a market at a resolution, with its VWAP, or an empty dict before its first trade."""
+        bar = self.open_bars.get((market_index, resolution))
+        if bar is None:
+            return {}
+        last_bar = dict(zip(['ts'] + BAR_COLUMNS, bar))
+        last_bar['vwap'] = bar[QUOTE_VOLUME] / bar[VOLUME] if bar[VOLUME] > 0 else float('nan')
+        return last_bar
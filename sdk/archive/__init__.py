@@ -0,0 +1 @@
+"""On-disk archives of drift protocol accounts."""
@@ -0,0 +1,194 @@
+"""Append-only Parquet archive of the drift history buffers.
+
+The ring buffers on chain only keep the last 1024 records of each history type. The archive keeps every record it
+has seen, partitioned by history type and day (``<root>/<history type>/date=YYYY-MM-DD/*.parquet``), with one typed
+column per record field. Int128 fields are stored as decimal128(38, 0), public keys as base58 strings.
+"""
+import os
+import operator
+import datetime
+from functools import reduce
+from typing import Dict, List, Optional, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from construct import Int8ul, Int64ul, Int64sl, Flag, BytesInteger
+from solana.publickey import PublicKey
+from solana.rpc.async_api import AsyncClient as SolanaClient
+
+from sdk.constants import CLEARING_HOUSE_ADDRESSES
+from sdk.layouts import Base58EncodingLayout
+from sdk.calls.asynchronous import load_account_bytes
+from sdk.state.history.core import HistoryCore
+from sdk.state.history.all import *
+
+Timestamp = Union[int, datetime.datetime]
+
+HISTORY_TYPES = {
+    'curve': CurveHistory,
+    'deposit': DepositHistory,
+    'funding_payment': FundingPaymentHistory,
+    'funding_rate': FundingRateHistory,
+    'liquidation': LiquidationHistory,
+    'trade': TradeHistory
+}
+
+INT128_TYPE = pa.decimal128(38, 0)
+PARTITION_COLUMN = 'date'
+
+
+def _arrow_type(subcon) -> pa.DataType:
+    """Get the arrow type of a record field from its construct layout."""
+    if isinstance(subcon, BytesInteger):
+        return INT128_TYPE
+    if isinstance(subcon, Base58EncodingLayout):
+        return pa.string()
+    field_types = {
+        id(Int64sl): pa.int64(),
+        id(Int64ul): pa.uint64(),
+        id(Int8ul): pa.uint8(),
+        id(Flag): pa.bool_()
+    }
+    if id(subcon) not in field_types:
+        raise Exception(f'Cannot archive field of type {subcon}.')
+    return field_types[id(subcon)]
+
+
+def get_history_schema(history_type: str) -> pa.Schema:
+    """Get the arrow schema of the records of a history type."""
+    history_class = HISTORY_TYPES[history_type]
+    record_layout = history_class.layout.records.subcon.subcon
+    schema = pa.schema([
+        pa.field(subcon.name, _arrow_type(subcon.subcon)) for subcon in record_layout.subcons
+    ])
+    return schema
+
+
+def _to_unix_timestamp(ts: Timestamp) -> int:
+    """Get a unix timestamp from seconds or a (UTC if naive) datetime."""
+    if isinstance(ts, datetime.datetime):
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=datetime.timezone.utc)
+        return int(ts.timestamp())
+    return int(ts)
+
+
+def _to_date(ts: int) -> str:
+    """Get the UTC day of a unix timestamp, as used in partition names."""
+    return datetime.datetime.fromtimestamp(ts, tz=datetime.timezone.utc).strftime('%Y-%m-%d')
+
+
+class HistoryArchive:
+    """Append-only Parquet archive of every history type, deduplicated on record_id."""
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        # highest record_id archived per history type, loaded lazily from disk
+        self.last_record_ids: Dict[str, int] = {}
+
+    def _history_path(self, history_type: str) -> str:
+        return os.path.join(self.root, history_type)
+
+    def _dataset(self, history_type: str) -> Optional[ds.Dataset]:
+        path = self._history_path(history_type)
+        if not os.path.isdir(path):
+            return None
+        schema = get_history_schema(history_type).append(pa.field(PARTITION_COLUMN, pa.string()))
+        return ds.dataset(path, format='parquet', partitioning='hive', schema=schema)
+
+    def last_record_id(self, history_type: str) -> int:
+        """Get the highest record_id archived for a history type, or -1 if there is none."""
+        if history_type not in self.last_record_ids:
+            dataset = self._dataset(history_type)
+            last_record_id = -1
+            if dataset is not None:
+                record_ids = dataset.to_table(columns=['record_id']).column('record_id')
+                if len(record_ids):
+                    last_record_id = int(pc.max(record_ids).as_py())
+            self.last_record_ids[history_type] = last_record_id
+        return self.last_record_ids[history_type]
+
+    def append(self, history_type: str, history: HistoryCore) -> int:
+        """Archive the records of a history buffer that are not archived yet.
+
+        :param history_type: One of HISTORY_TYPES.
+        :param history: The parsed history buffer account.
+        :return: The number of records written."""
+        last_record_id = self.last_record_id(history_type)
+        records = [record for record in history.ordered_records() if record.record_id > last_record_id]
+        if not records:
+            return 0
+        schema = get_history_schema(history_type)
+        records_by_date: Dict[str, List] = {}
+        for record in records:
+            records_by_date.setdefault(_to_date(record.ts), []).append(record)
+        for date, date_records in records_by_date.items():
+            columns = {}
+            for field in schema:
+                values = [getattr(record, field.name) for record in date_records]
+                if field.type == pa.string():
+                    values = [value.__str__() for value in values]
+                columns[field.name] = pa.array(values, type=field.type)
+            table = pa.table(columns, schema=schema)
+            partition_path = os.path.join(self._history_path(history_type), f'{PARTITION_COLUMN}={date}')
+            os.makedirs(partition_path, exist_ok=True)
+            file_name = f'part-{date_records[0].record_id}-{date_records[-1].record_id}.parquet'
+            pq.write_table(table, os.path.join(partition_path, file_name))
+        self.last_record_ids[history_type] = max(record.record_id for record in records)
+        return len(records)
+
+    def read(
+            self, history_type: str, market_index: Optional[int] = None, start: Optional[Timestamp] = None,
+            end: Optional[Timestamp] = None, columns: Optional[List[str]] = None
+    ) -> pd.DataFrame:
+        """Read a slice of a history type, pushing the filters down to the partitions and row groups.
+
+        :param history_type: One of HISTORY_TYPES.
+        :param market_index: Only read records of this market (history types with a market_index only).
+        :param start: Only read records at or after this time (unix seconds or datetime).
+        :param end: Only read records before this time (unix seconds or datetime).
+        :param columns: Only read these columns."""
+        schema = get_history_schema(history_type)
+        dataset = self._dataset(history_type)
+        if dataset is None:
+            return schema.empty_table().to_pandas()
+        conditions = []
+        if market_index is not None:
+            if 'market_index' not in schema.names:
+                raise Exception(f'The {history_type} history has no market index.')
+            conditions.append(ds.field('market_index') == market_index)
+        if start is not None:
+            start = _to_unix_timestamp(start)
+            conditions.append(ds.field(PARTITION_COLUMN) >= _to_date(start))
+            conditions.append(ds.field('ts') >= start)
+        if end is not None:
+            end = _to_unix_timestamp(end)
+            conditions.append(ds.field(PARTITION_COLUMN) <= _to_date(end))
+            conditions.append(ds.field('ts') < end)
+        expression = reduce(operator.and_, conditions) if conditions else None
+        table = dataset.to_table(columns=columns or schema.names, filter=expression)
+        df = table.to_pandas()
+        if 'record_id' in df.columns:
+            df = df.sort_values('record_id', ignore_index=True)
+        return df
+
+
+async def archive_history(client: SolanaClient, archive: HistoryArchive) -> Dict[str, int]:
+    """Fetch every history buffer and archive the new records.
+
+    :param client: Solana client object.
+    :param archive: The archive to append to.
+    :return: The number of records written per history type."""
+    written = {}
+    for history_type, history_class in HISTORY_TYPES.items():
+        address: PublicKey = getattr(CLEARING_HOUSE_ADDRESSES.history, history_type)
+        bytes_data = await load_account_bytes(
+            client=client,
+            address=address
+        )
+        history = history_class.parse(bytes_data=bytes_data)
+        written[history_type] = archive.append(history_type=history_type, history=history)
+    return written
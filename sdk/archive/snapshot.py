@@ -0,0 +1,194 @@
+"""Memory-mapped snapshots of the raw account data of the whole protocol.
+
+A snapshot file holds a header, a JSON index and the account bytes back to back::
+
+    b'DRIFTSNP' | version (u32 le) | index length (u32 le) | index (utf-8 JSON) | account data ...
+
+The index maps every account public key to its kind (the name of the class in SNAPSHOT_ACCOUNT_KINDS), offset and
+length in the data section, and records the slot at which the snapshot was taken. The reader memory-maps the file
+and only decodes an account, through the existing layouts, the first time it is asked for.
+"""
+import os
+import mmap
+import json
+import time
+import struct
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+from solana.publickey import PublicKey
+from solana.rpc.async_api import AsyncClient as SolanaClient
+
+from sdk.constants import CLEARING_HOUSE_ADDRESSES
+from sdk.calls.asynchronous import load_account_bytes, load_program_accounts_bytes
+from sdk.state.core import ElementCore
+from sdk.state.all import *
+
+SNAPSHOT_MAGIC = b'DRIFTSNP'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct('<8sII')
+
+SNAPSHOT_ACCOUNT_KINDS = {
+    account_class.__name__: account_class for account_class in [
+        ClearingHouseState, DriftMarkets, UserAccount, UserPositions, CurveHistory, DepositHistory,
+        FundingPaymentHistory, FundingRateHistory, LiquidationHistory, TradeHistory
+    ]
+}
+
+HISTORY_ADDRESS_KINDS = {
+    'curve': 'CurveHistory',
+    'deposit': 'DepositHistory',
+    'funding_payment': 'FundingPaymentHistory',
+    'funding_rate': 'FundingRateHistory',
+    'liquidation': 'LiquidationHistory',
+    'trade': 'TradeHistory'
+}
+
+
+class SnapshotAccount(NamedTuple):
+    """Raw data of one account going into a snapshot."""
+    pubkey: Union[PublicKey, str]
+    kind: str
+    data: bytes
+
+
+def write_snapshot(path: str, accounts: List[SnapshotAccount], slot: Optional[int] = None) -> None:
+    """Write raw account data to a snapshot file, replacing any previous snapshot atomically.
+
+    :param path: The snapshot file.
+    :param accounts: The accounts to store.
+    :param slot: The slot at which the data was read, used for delta fetches."""
+    index_accounts = {}
+    offset = 0
+    for account in accounts:
+        if account.kind not in SNAPSHOT_ACCOUNT_KINDS:
+            raise Exception(f'Unknown account kind: {account.kind}.')
+        index_accounts[account.pubkey.__str__()] = [account.kind, offset, len(account.data)]
+        offset += len(account.data)
+    index = {
+        'slot': slot,
+        'created': int(time.time()),
+        'accounts': index_accounts
+    }
+    index_bytes = json.dumps(index).encode('utf-8')
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(index_bytes)))
+        f.write(index_bytes)
+        for account in accounts:
+            f.write(account.data)
+    os.replace(tmp_path, path)
+
+
+class SnapshotReader:
+    """Lazily decoding reader of a memory-mapped snapshot file."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, index_length = SNAPSHOT_HEADER.unpack_from(self._mmap, 0)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            self.close()
+            raise Exception('Invalid snapshot file.')
+        index_start = SNAPSHOT_HEADER.size
+        index = json.loads(self._mmap[index_start:index_start + index_length].decode('utf-8'))
+        self.slot: Optional[int] = index['slot']
+        self.created: int = index['created']
+        self._accounts: Dict[str, Tuple[str, int, int]] = index['accounts']
+        self._data_start = index_start + index_length
+        self._decoded: Dict[str, ElementCore] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Release the memory map and the file.
+
+        Views returned by raw(), and columns decoded from them, share the memory map: while any of them is alive the
+        map stays open, and it is unmapped once the last of them is released."""
+        self._decoded.clear()
+        self._file.close()
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+
+    def __len__(self) -> int:
+        return len(self._accounts)
+
+    def __contains__(self, pubkey: Union[PublicKey, str]) -> bool:
+        return pubkey.__str__() in self._accounts
+
+    def kind(self, pubkey: Union[PublicKey, str]) -> str:
+        """Get the kind of an account in the snapshot."""
+        return self._accounts[pubkey.__str__()][0]
+
+    def pubkeys(self, kind: Optional[str] = None) -> List[str]:
+        """Get the public keys in the snapshot, optionally only those of one kind."""
+        return [pubkey for pubkey, (account_kind, _, _) in self._accounts.items() if kind in (None, account_kind)]
+
+    def raw(self, pubkey: Union[PublicKey, str]) -> memoryview:
+        """Get the raw data of an account without copying it out of the memory map, see close."""
+        _, offset, length = self._accounts[pubkey.__str__()]
+        start = self._data_start + offset
+        return memoryview(self._mmap)[start:start + length]
+
+    def get(self, pubkey: Union[PublicKey, str]) -> ElementCore:
+        """Get an account, decoding it on first access."""
+        key = pubkey.__str__()
+        if key not in self._decoded:
+            account_class = SNAPSHOT_ACCOUNT_KINDS[self.kind(key)]
+            self._decoded[key] = account_class.parse(bytes_data=self.raw(key))
+        return self._decoded[key]
+
+    def items(self, kind: Optional[str] = None) -> Iterator[Tuple[str, ElementCore]]:
+        """Iterate over the accounts, optionally only those of one kind, decoding them as they are reached."""
+        for pubkey in self.pubkeys(kind=kind):
+            yield pubkey, self.get(pubkey)
+
+    def history_columns(self, history_type: str) -> Dict[str, np.ndarray]:
+        """Decode the records of a history buffer straight from the memory map into columns, oldest first.
+
+        :param history_type: One of HISTORY_ADDRESS_KINDS, e.g. 'curve'."""
+        kind = HISTORY_ADDRESS_KINDS[history_type]
+        pubkeys = self.pubkeys(kind=kind)
+        if not pubkeys:
+            raise Exception(f'No {kind} account in the snapshot.')
+        return SNAPSHOT_ACCOUNT_KINDS[kind].decode_columns(bytes_data=self.raw(pubkeys[0]))
+
+
+async def take_snapshot(client: SolanaClient, path: str) -> int:
+    """Fetch the clearing house, the markets, all user accounts and positions and the history buffers into a
+    snapshot file.
+
+    :param client: Solana client object.
+    :param path: The snapshot file.
+    :return: The number of accounts written."""
+    slot_resp = await client.get_slot()
+    slot = slot_resp.get('result')
+    accounts = []
+    addresses = [
+        (CLEARING_HOUSE_ADDRESSES.state, 'ClearingHouseState'),
+        (CLEARING_HOUSE_ADDRESSES.markets, 'DriftMarkets')
+    ] + [
+        (getattr(CLEARING_HOUSE_ADDRESSES.history, history_type), kind)
+        for history_type, kind in HISTORY_ADDRESS_KINDS.items()
+    ]
+    for address, kind in addresses:
+        bytes_data = await load_account_bytes(
+            client=client,
+            address=address
+        )
+        accounts.append(SnapshotAccount(pubkey=address, kind=kind, data=bytes_data))
+    for account_name, kind in [('User', 'UserAccount'), ('UserPositions', 'UserPositions')]:
+        program_accounts = await load_program_accounts_bytes(
+            client=client,
+            account_name=account_name
+        )
+        accounts += [SnapshotAccount(pubkey=pubkey, kind=kind, data=data) for pubkey, data in program_accounts]
+    write_snapshot(path=path, accounts=accounts, slot=slot)
+    return len(accounts)
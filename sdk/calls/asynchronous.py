@@ -1,27 +1,85 @@
 """Asynchronous functions to call Drift protocol related data from the blockchain."""
-import base64
 import json
 import asyncio
+from typing import List, Tuple
 
+import base58
 from solana.rpc.async_api import AsyncClient as SolanaClient
+from solana.rpc.types import MemcmpOpts
 from solana.publickey import PublicKey
 from sdk.state.all import *
 from sdk.constants import *
+from sdk.utils import get_account_discriminator
+from sdk import instrumentation
+from sdk.calls.core import (
+    BASE64, BASE64_ZSTD, get_account_encoding, is_unsupported_encoding_error, reject_zstd, decode_encoded_account_data
+)
 
 
-async def load_account_bytes(client: SolanaClient, address: PublicKey) -> bytes:
+async def load_account_bytes(client: SolanaClient, address: PublicKey, compress: bool = True) -> bytes:
     """Call an address and return the account data as bytes.
 
     :param client: The Solana client object.
-    :param address: The public-key address of the account."""
-    resp = await client.get_account_info(pubkey=address)
-    if ('result' not in resp) or ('value' not in resp['result']):
-        raise Exception('Cannot load bytes.')
-    data = resp['result']['value']['data'][0]
-    bytes_data = base64.decodebytes(data.encode('ascii'))
+    :param address: The public-key address of the account.
+    :param compress: Fetch the data zstd compressed, if the node supports it."""
+    collector = instrumentation.collector
+    encoding = get_account_encoding(client=client, compress=compress)
+    with collector.measure(instrumentation.NETWORK, 'load_account_bytes'):
+        resp = await client.get_account_info(pubkey=address, encoding=encoding)
+        if encoding == BASE64_ZSTD and is_unsupported_encoding_error(resp=resp):
+            # the node does not serve compressed account data, other errors are raised below
+            reject_zstd(client=client)
+            resp = await client.get_account_info(pubkey=address, encoding=BASE64)
+        if ('result' not in resp) or ('value' not in resp['result']):
+            raise Exception('Cannot load bytes.')
+    with collector.measure(instrumentation.DECODE, 'load_account_bytes'):
+        bytes_data = decode_encoded_account_data(data=resp['result']['value']['data'], operation='load_account_bytes')
+    collector.record_size('load_account_bytes', len(bytes_data))
     return bytes_data
 
 
+async def load_program_accounts_bytes(
+        client: SolanaClient, account_name: str, program_id: PublicKey = CLEARING_HOUSE_ADDRESSES.program,
+        compress: bool = True
+) -> List[Tuple[PublicKey, bytes]]:
+    """Call every account of one type owned by a program and return the data of each as bytes.
+
+    :param client: The Solana client object.
+    :param account_name: The anchor name of the account type, e.g. 'User' or 'UserPositions'.
+    :param program_id: The program owning the accounts.
+    :param compress: Fetch the data zstd compressed, if the node supports it."""
+    discriminator = get_account_discriminator(account_name=account_name)
+    memcmp_opts = [MemcmpOpts(offset=0, bytes=base58.b58encode(discriminator).decode('ascii'))]
+    collector = instrumentation.collector
+    encoding = get_account_encoding(client=client, compress=compress)
+    with collector.measure(instrumentation.NETWORK, 'load_program_accounts_bytes'):
+        resp = await client.get_program_accounts(
+            pubkey=program_id,
+            encoding=encoding,
+            memcmp_opts=memcmp_opts
+        )
+        if encoding == BASE64_ZSTD and is_unsupported_encoding_error(resp=resp):
+            # the node does not serve compressed account data, other errors are raised below
+            reject_zstd(client=client)
+            resp = await client.get_program_accounts(
+                pubkey=program_id,
+                encoding=BASE64,
+                memcmp_opts=memcmp_opts
+            )
+        if 'result' not in resp:
+            raise Exception('Cannot load bytes.')
+    with collector.measure(instrumentation.DECODE, 'load_program_accounts_bytes'):
+        accounts = [
+            (
+                PublicKey(account['pubkey']),
+                decode_encoded_account_data(data=account['account']['data'], operation='load_program_accounts_bytes')
+            )
+            for account in resp['result']
+        ]
+    collector.record_size('load_program_accounts_bytes', sum(len(bytes_data) for _, bytes_data in accounts))
+    return accounts
+
+
 async def call_clearing_house(client: SolanaClient, address: PublicKey) -> ClearingHouseState:
     """Get the Drift protocol clearing house state.
 
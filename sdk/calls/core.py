@@ -0,0 +1,68 @@
+"""Core functionality shared by the synchronous and asynchronous calls."""
+import binascii
+import weakref
+from typing import List
+
+import zstandard
+
+from sdk import instrumentation
+
+BASE64 = 'base64'
+BASE64_ZSTD = 'base64+zstd'
+# JSON-RPC error code of requests with parameters the node does not accept
+INVALID_PARAMS_ERROR_CODE = -32602
+
+# clients whose node rejected base64+zstd, so that they are not asked again
+_ZSTD_REJECTED = weakref.WeakSet()
+
+
+def decode_account_data(data: str) -> bytes:
+    """Decode the base64 data of an account as returned by the RPC.
+
+    binascii decodes the str directly, without first encoding it to ascii bytes as base64.decodebytes needs; the
+    result can be sliced without copying through a memoryview, which ElementCore.parse accepts.
+
+    :param data: The base64 encoded account data."""
+    return binascii.a2b_base64(data)
+
+
+def get_account_encoding(client, compress: bool = True) -> str:
+    """Get the encoding to request account data in from a client's node.
+
+    :param client: The Solana client object.
+    :param compress: Ask for zstd compressed data, unless the node rejected it before."""
+    if compress and client not in _ZSTD_REJECTED:
+        return BASE64_ZSTD
+    return BASE64
+
+
+def is_unsupported_encoding_error(resp: dict) -> bool:
+    """Whether an RPC response rejects the requested encoding, rather than failing for another, possibly
+    transient, reason. Nodes without zstd support answer with invalid params naming the encoding, e.g.
+    "unknown variant `base64+zstd`"."""
+    error = resp.get('error')
+    if not isinstance(error, dict) or error.get('code') != INVALID_PARAMS_ERROR_CODE:
+        return False
+    message = str(error.get('message', '')).lower()
+    return 'zstd' in message or 'encoding' in message or 'unknown variant' in message
+
+
+def reject_zstd(client) -> None:
+    """Stop asking a client's node for zstd compressed data."""
+    _ZSTD_REJECTED.add(client)
+
+
+def decode_encoded_account_data(data: List[str], operation: str) -> bytes:
+    """Decode account data as returned by the RPC, [data, encoding], decompressing zstd data.
+
+    :param data: The encoded data and its encoding.
+    :param operation: The name of the call, for the instrumentation."""
+    encoded_data, encoding = data[0], data[1]
+    bytes_data = decode_account_data(data=encoded_data)
+    if encoding == BASE64_ZSTD:
+        compressed_size = len(bytes_data)
+        # the frames written by the node do not always carry the content size, which decompressobj does not need
+        bytes_data = zstandard.ZstdDecompressor().decompressobj().decompress(bytes_data)
+        instrumentation.collector.record_compression(operation, compressed_size, len(bytes_data))
+    return bytes_data
+
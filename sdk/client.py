@@ -136,10 +136,9 @@ class DriftClient:
             self, market: str, direction: Literal['long', 'short'], quote_amount: int
     ) -> RPCResponse:
         """Open a position."""
-        if market in MARKET_NAME_TO_INDEX:
-            market_index = MARKET_NAME_TO_INDEX.index(market)
-        else:
-            raise Exception(f'Invalid market. Current supported markets are: \n{MARKET_NAME_TO_INDEX}')
+        market_index = get_market_index(
+            symbol=market
+        )
         int_direction = position_direction(
             direction=direction
         )
@@ -161,10 +160,9 @@ class DriftClient:
         """Completely close a position.
 
         :param market: The market in which the position is held."""
-        if market in MARKET_NAME_TO_INDEX:
-            market_index = MARKET_NAME_TO_INDEX.index(market)
-        else:
-            raise Exception(f'Invalid market. Current supported markets are: \n{MARKET_NAME_TO_INDEX}')
+        market_index = get_market_index(
+            symbol=market
+        )
         close_position_response = await send_close_position(
             client=self.connector,
             wallet=self.wallet,
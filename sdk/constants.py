@@ -1,10 +1,8 @@
 """Constants relating to the drift-protocol."""
 from typing import NamedTuple, Union
 
-from solana.rpc.types import TxOpts
 from solana.publickey import PublicKey
-
-from solana.rpc.api import Commitment
+from solana.rpc.commitment import Commitment
 
 
 Number = Union[int, float]
@@ -99,7 +97,6 @@ CURRENT_MARKETS = [
 NUMBER_OF_CURRENT_MARKETS = len(CURRENT_MARKETS)
 MARKET_INDEX_TO_SYMBOL = [market.name for market in CURRENT_MARKETS]
 MARKET_SYMBOL_TO_INDEX = {symbol: index for (index, symbol) in enumerate(MARKET_INDEX_TO_SYMBOL)}
-print(MARKET_SYMBOL_TO_INDEX)
 
 USDC_MINT = PublicKey('EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v')
 
@@ -142,6 +139,18 @@ TRADE_SIDE = TradeSide(
 )
 
 
+class SwapDirection(NamedTuple):
+    """Direction in which an asset is swapped into the AMM."""
+    add: int
+    remove: int
+
+
+SWAP_DIRECTION = SwapDirection(
+    add=0,
+    remove=1
+)
+
+
 class InstructionTag(NamedTuple):
     """Instructino tag."""
     initialize: int
@@ -177,6 +186,7 @@ PRICE_TO_PEG_PRECISION_RATIO = int(MARK_PRICE_PRECISION / PEG_PRECISION)
 PRICE_TO_PEG_QUOTE_PRECISION_RATIO = int(MARK_PRICE_PRECISION / QUOTE_PRECISION)
 AMM_TO_QUOTE_PRECISION_RATIO = int(AMM_RESERVE_PRECISION / QUOTE_PRECISION)
 PRICE_TO_QUOTE_PRECISION_RATIO = int(MARK_PRICE_PRECISION / QUOTE_PRECISION)
+AMM_TIMES_PEG_TO_QUOTE_PRECISION_RATIO = int(AMM_RESERVE_PRECISION * PEG_PRECISION / QUOTE_PRECISION)
 QUOTE_TO_BASE_AMT_FUNDING_PRECISION = \
     int(AMM_RESERVE_PRECISION * MARK_PRICE_PRECISION * FUNDING_PAYMENT_PRECISION) / QUOTE_PRECISION
 
@@ -228,3 +238,6 @@ PROCESSED = Commitment('processed')
 CONFIRMED = Commitment('confirmed')
 FINALIZED = Commitment('finalized')
 
+# the largest serialized transaction a validator accepts
+MAX_TRANSACTION_SIZE = 1232
+MAX_SETTLE_FUNDING_PAYMENTS_PER_TRANSACTION = 10
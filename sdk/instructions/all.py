@@ -1,27 +1,43 @@
-"""Easy importing."""
-from sdk.instructions.close_position import ClosePositionInstruction
-from sdk.instructions.delete_user import DeleteUserInstruction
-from sdk.instructions.deposit_collateral import DepositCollateralInstruction
-from sdk.instructions.initialize import InitializeInstruction
-from sdk.instructions.initialize_history import InitializeHistoryInstruction
-from sdk.instructions.initialize_market import InitializeMarketInstruction
-from sdk.instructions.initialize_user import InitializeUserInstruction
-from sdk.instructions.liquidate import LiquidateInstruction
-from sdk.instructions.move_amm_price import MoveAmmPriceInstruction
-from sdk.instructions.open_position import OpenPositionInstruction
-from sdk.instructions.repeg_amm_curve import RepegAmmCurveInstruction
-from sdk.instructions.settle_funding_payment import SettleFundingPaymentInstruction
-from sdk.instructions.updates import (
-    UpdateKInstruction, UpdateFeeInstruction, UpdateAdminInstruction, UpdateDiscountMintInstruction,
-    UpdateExchangePausedInstruction, UpdateFundingPausedInstruction, UpdateFundingRateInstruction,
-    UpdateMarginRatioInstruction, UpdateMarketOracleInstruction, UpdateMaxDepositInstruction,
-    UpdateFullLiquidationPenaltyPercentageInstruction, UpdateMarketMinimumTradeSizeInstruction,
-    UpdateOracleGuardRailsInstruction, UpdatePartialLiquidationClosePercentageInstruction,
-    UpdatePartialLiquidationPenaltyPercentageInstruction, UpdateWhiteListMintInstruction,
-    UpdateFullLiquidationLiquidatorShareDenominatorInstruction,
-    UpdatePartialLiquidationLiquidatorShareDenominatorInstruction, DisableAdminControlsPricesInstruction
-)
-from sdk.instructions.withdraw_collateral import WithdrawCollateralInstruction
-from sdk.instructions.withdraw_fees import WithdrawFeesInstruction
-from sdk.instructions.withdraw_from_insurance_vault import WithdrawFromInsuranceVaultInstruction
-from sdk.instructions.withdraw_from_insurance_vault_to_market import WithdrawFromInsuranceVaultToMarketInstruction
+"""Easy importing, each instruction class is imported on first use."""
+from sdk.lazy import lazy_attributes
+
+_ATTRIBUTE_MODULES = {
+    'ClosePositionInstruction': 'sdk.instructions.close_position',
+    'DeleteUserInstruction': 'sdk.instructions.delete_user',
+    'DepositCollateralInstruction': 'sdk.instructions.deposit_collateral',
+    'InitializeInstruction': 'sdk.instructions.initialize',
+    'InitializeHistoryInstruction': 'sdk.instructions.initialize_history',
+    'InitializeMarketInstruction': 'sdk.instructions.initialize_market',
+    'InitializeUserInstruction': 'sdk.instructions.initialize_user',
+    'LiquidateInstruction': 'sdk.instructions.liquidate',
+    'MoveAmmPriceInstruction': 'sdk.instructions.move_amm_price',
+    'OpenPositionInstruction': 'sdk.instructions.open_position',
+    'RepegAmmCurveInstruction': 'sdk.instructions.repeg_amm_curve',
+    'SettleFundingPaymentInstruction': 'sdk.instructions.settle_funding_payment',
+    'UpdateKInstruction': 'sdk.instructions.updates',
+    'UpdateFeeInstruction': 'sdk.instructions.updates',
+    'UpdateAdminInstruction': 'sdk.instructions.updates',
+    'UpdateDiscountMintInstruction': 'sdk.instructions.updates',
+    'UpdateExchangePausedInstruction': 'sdk.instructions.updates',
+    'UpdateFundingPausedInstruction': 'sdk.instructions.updates',
+    'UpdateFundingRateInstruction': 'sdk.instructions.updates',
+    'UpdateMarginRatioInstruction': 'sdk.instructions.updates',
+    'UpdateMarketOracleInstruction': 'sdk.instructions.updates',
+    'UpdateMaxDepositInstruction': 'sdk.instructions.updates',
+    'UpdateFullLiquidationPenaltyPercentageInstruction': 'sdk.instructions.updates',
+    'UpdateMarketMinimumTradeSizeInstruction': 'sdk.instructions.updates',
+    'UpdateOracleGuardRailsInstruction': 'sdk.instructions.updates',
+    'UpdatePartialLiquidationClosePercentageInstruction': 'sdk.instructions.updates',
+    'UpdatePartialLiquidationPenaltyPercentageInstruction': 'sdk.instructions.updates',
+    'UpdateWhiteListMintInstruction': 'sdk.instructions.updates',
+    'UpdateFullLiquidationLiquidatorShareDenominatorInstruction': 'sdk.instructions.updates',
+    'UpdatePartialLiquidationLiquidatorShareDenominatorInstruction': 'sdk.instructions.updates',
+    'DisableAdminControlsPricesInstruction': 'sdk.instructions.updates',
+    'WithdrawCollateralInstruction': 'sdk.instructions.withdraw_collateral',
+    'WithdrawFeesInstruction': 'sdk.instructions.withdraw_fees',
+    'WithdrawFromInsuranceVaultInstruction': 'sdk.instructions.withdraw_from_insurance_vault',
+    'WithdrawFromInsuranceVaultToMarketInstruction': 'sdk.instructions.withdraw_from_insurance_vault_to_market'
+}
+
+__all__ = list(_ATTRIBUTE_MODULES)
+__getattr__, __dir__ = lazy_attributes(globals(), _ATTRIBUTE_MODULES)
@@ -60,6 +60,11 @@ class LiquidateInstruction(InstructionCore):
                 is_writable=True,
                 is_signer=False
             ),
+            AccountMeta(
+                pubkey=insurance_vault_authority,
+                is_writable=False,
+                is_signer=False
+            ),
             AccountMeta(
                 pubkey=token_program,
                 is_writable=False,
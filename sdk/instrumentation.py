@@ -0,0 +1,237 @@
+"""Timings, payload sizes and error counts of the SDK hot paths.
+
+The calls, sends and account parsing report to the collector set with `set_collector`. The default collector ignores
+everything, so instrumentation costs one method call per phase unless a collecting one is set::
+
+    from sdk import instrumentation
+    collector = instrumentation.HistogramCollector()
+    instrumentation.set_collector(collector)
+    ...
+    print(collector.to_prometheus())
+"""
+import time
+import bisect
+import threading
+from contextlib import nullcontext
+from typing import ContextManager, Dict, List, Sequence, Tuple
+
+NETWORK = 'network'
+DECODE = 'decode'
+PARSE = 'parse'
+MATERIALIZE = 'materialize'
+# from spotting an opportunity, e.g. a liquidatable user, to handing its transaction to the node
+DETECT_TO_SEND = 'detect_to_send'
+# from a new hedge target to the hedged position reaching it
+HEDGE_LATENCY = 'hedge_latency'
+# a hedger reconcile cycle, counted when it raises
+HEDGE = 'hedge'
+# time a coroutine held the event loop between awaits
+BLOCKED = 'blocked'
+
+DEFAULT_TIMING_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+DEFAULT_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+_NULL_CONTEXT = nullcontext()
+
+
+class Collector:
+    """Receives the measurements of the SDK; this base collector ignores them."""
+    enabled = False
+
+    def measure(self, phase: str, operation: str) -> ContextManager:
+        """Time a block as one phase of an operation, counting an error if it raises."""
+        return _NULL_CONTEXT
+
+    def record_timing(self, phase: str, operation: str, seconds: float) -> None:
+        """Record the duration of one phase of an operation."""
+        pass
+
+    def record_size(self, operation: str, size: int) -> None:
+        """Record the size in bytes of a payload received or sent by an operation."""
+        pass
+
+    def record_error(self, phase: str, operation: str) -> None:
+        """Count an error in one phase of an operation."""
+        pass
+
+    def record_compression(self, operation: str, compressed_size: int, size: int) -> None:
+        """Record the size of a payload received compressed and its size once decompressed."""
+        pass
+
+
+class _Measurement:
+    """Context manager timing a phase for a collector."""
+
+    def __init__(self, collector: Collector, phase: str, operation: str) -> None:
+        self.collector = collector
+        self.phase = phase
+        self.operation = operation
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        self.collector.record_timing(self.phase, self.operation, time.perf_counter() - self.start)
+        if exc_type is not None:
+            self.collector.record_error(self.phase, self.operation)
+        return False
+
+
+class Histogram:
+    """Fixed-bucket histogram."""
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = tuple(buckets)
+        # the last count is for values above every bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self) -> List[Tuple[str, int]]:
+        """Get the count of values at or below each bucket bound, ending with +Inf."""
+        cumulative_counts = []
+        total = 0
+        for bound, count in zip(list(self.buckets) + [float('inf')], self.counts):
+            total += count
+            cumulative_counts.append(('+Inf' if bound == float('inf') else repr(bound), total))
+        return cumulative_counts
+
+
+def _labels(**labels: str) -> str:
+    return ','.join(f'{name}="{value}"' for name, value in labels.items())
+
+
+class HistogramCollector(Collector):
+    """Collector keeping a histogram per phase and operation, exportable as Prometheus text."""
+    enabled = True
+
+    def __init__(
+            self, timing_buckets: Sequence[float] = DEFAULT_TIMING_BUCKETS,
+            size_buckets: Sequence[float] = DEFAULT_SIZE_BUCKETS, prefix: str = 'drift_sdk'
+    ) -> None:
+        self.timing_buckets = timing_buckets
+        self.size_buckets = size_buckets
+        self.prefix = prefix
+        self.timings: Dict[Tuple[str, str], Histogram] = {}
+        self.sizes: Dict[str, Histogram] = {}
+        self.errors: Dict[Tuple[str, str], int] = {}
+        # operation -> [compressed bytes, decompressed bytes]
+        self.compression: Dict[str, List[int]] = {}
+        # the synchronous client reports from several threads
+        self._lock = threading.Lock()
+
+    def measure(self, phase: str, operation: str) -> ContextManager:
+        return _Measurement(self, phase, operation)
+
+    def record_timing(self, phase: str, operation: str, seconds: float) -> None:
+        with self._lock:
+            key = (phase, operation)
+            if key not in self.timings:
+                self.timings[key] = Histogram(self.timing_buckets)
+            self.timings[key].observe(seconds)
+
+    def record_size(self, operation: str, size: int) -> None:
+        with self._lock:
+            if operation not in self.sizes:
+                self.sizes[operation] = Histogram(self.size_buckets)
+            self.sizes[operation].observe(size)
+
+    def record_error(self, phase: str, operation: str) -> None:
+        with self._lock:
+            key = (phase, operation)
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+    def record_compression(self, operation: str, compressed_size: int, size: int) -> None:
+        with self._lock:
+            totals = self.compression.setdefault(operation, [0, 0])
+            totals[0] += compressed_size
+            totals[1] += size
+
+    def reset(self) -> None:
+        """Forget every measurement."""
+        with self._lock:
+            self.timings.clear()
+            self.sizes.clear()
+            self.errors.clear()
+            self.compression.clear()
+
+    def to_prometheus(self) -> str:
+        """Export the measurements in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            timing_name = f'{self.prefix}_phase_seconds'
+            lines += [
+                f'# HELP {timing_name} Time spent in each phase of an SDK operation.',
+                f'# TYPE {timing_name} histogram'
+            ]
+            for (phase, operation), histogram in sorted(self.timings.items()):
+                lines += self._histogram_lines(timing_name, histogram, phase=phase, operation=operation)
+            size_name = f'{self.prefix}_payload_bytes'
+            lines += [
+                f'# HELP {size_name} Size of the payloads received or sent by an SDK operation.',
+                f'# TYPE {size_name} histogram'
+            ]
+            for operation, histogram in sorted(self.sizes.items()):
+                lines += self._histogram_lines(size_name, histogram, operation=operation)
+            error_name = f'{self.prefix}_errors_total'
+            lines += [
+                f'# HELP {error_name} Errors raised in each phase of an SDK operation.',
+                f'# TYPE {error_name} counter'
+            ]
+            for (phase, operation), count in sorted(self.errors.items()):
+                lines.append(f'{error_name}{{{_labels(phase=phase, operation=operation)}}} {count}')
+            compressed_name = f'{self.prefix}_compressed_bytes_total'
+            saved_name = f'{self.prefix}_compression_saved_bytes_total'
+            lines += [
+                f'# HELP {compressed_name} Bytes of account data received zstd compressed.',
+                f'# TYPE {compressed_name} counter'
+            ]
+            lines += [
+                f'{compressed_name}{{{_labels(operation=operation)}}} {compressed_size}'
+                for operation, (compressed_size, _) in sorted(self.compression.items())
+            ]
+            lines += [
+                f'# HELP {saved_name} Bytes of account data not transferred thanks to zstd compression.',
+                f'# TYPE {saved_name} counter'
+            ]
+            lines += [
+                f'{saved_name}{{{_labels(operation=operation)}}} {size - compressed_size}'
+                for operation, (compressed_size, size) in sorted(self.compression.items())
+            ]
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _histogram_lines(name: str, histogram: Histogram, **labels: str) -> List[str]:
+        label_text = _labels(**labels)
+        lines = [
+            f'{name}_bucket{{{label_text},le="{bound}"}} {count}' for bound, count in histogram.cumulative_counts()
+        ]
+        lines += [
+            f'{name}_sum{{{label_text}}} {histogram.sum!r}',
+            f'{name}_count{{{label_text}}} {histogram.count}'
+        ]
+        return lines
+
+
+NO_OP_COLLECTOR = Collector()
+collector: Collector = NO_OP_COLLECTOR
+
+
+def set_collector(new_collector: Collector) -> Collector:
+    """Send the measurements of the SDK to a collector.
+
+    :param new_collector: The collector, NO_OP_COLLECTOR to stop collecting.
+    :return: The previous collector."""
+    global collector
+    previous_collector = collector
+    collector = new_collector
+    return previous_collector
@@ -0,0 +1,408 @@
+"""Keeper finding liquidatable users and sending their liquidations.
+
+The keeper holds every user-account and positions account in columns (see sdk.math.margin), recomputes the margin
+ratios of all users with exact AMM math on every markets update, and sends the liquidations of the users below the
+partial-liquidation ratio, highest expected reward first. Instructions are built once per user and transactions are
+signed with a cached blockhash, so that nothing but signing stands between detection and sending::
+
+    keeper = LiquidationKeeper(client=client, wallet=wallet, clearing_house=clearing_house)
+    keeper.set_users(users=users)
+    reconciler.subscribe(keeper.apply_change)
+    asyncio.create_task(keeper.keep_blockhash_fresh())
+    ...
+    candidates = keeper.update_markets(markets=markets)
+    attempts = await keeper.liquidate(candidates=candidates)
+"""
+import time
+import asyncio
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from solana.blockhash import Blockhash
+from solana.keypair import Keypair
+from solana.publickey import PublicKey
+from solana.rpc.async_api import AsyncClient as SolanaClient
+from solana.rpc.commitment import Commitment
+from solana.rpc.types import RPCResponse, TxOpts
+from solana.transaction import AccountMeta, Transaction, TransactionInstruction
+
+from sdk import instrumentation
+from sdk.constants import CLEARING_HOUSE_ADDRESSES, CONFIRMED, TOKEN_PROGRAM_ID
+from sdk.instructions.liquidate import LiquidateInstruction
+from sdk.math.amm import get_amm_arrays, to_exact_array
+from sdk.math.funding import get_funding_rate_arrays
+from sdk.math.margin import (
+    DEFAULT_SCREENING_TOLERANCE, MarginArrays, PositionColumns, empty_position_columns, set_position_row,
+    clear_position_row, select_rows, to_float_columns, calculate_margin, approximate_margin_ratio
+)
+from sdk.reconciler import AccountChange
+from sdk.state.clearing_house import ClearingHouseState
+from sdk.state.market import DriftMarkets
+from sdk.state.user import UserAccount, UserPositions
+from sdk.utils import get_user_account_address
+
+DEFAULT_MAX_IN_FLIGHT = 16
+DEFAULT_BLOCKHASH_MAX_AGE = 30.0
+DEFAULT_BLOCKHASH_REFRESH_INTERVAL = 10.0
+
+
+class LiquidationCandidate(NamedTuple):
+    """A user the clearing house would liquidate at the current markets.
+
+    The expected reward is the share of the liquidation fee paid to the liquidator, in QUOTE_PRECISION, estimated
+    from the total collateral as the clearing house computes it for a liquidation of the whole margin."""
+    user: PublicKey
+    user_positions: PublicKey
+    margin_ratio: int
+    total_collateral: int
+    expected_reward: int
+    full_liquidation: bool
+    detected_at: float
+
+
+class LiquidationAttempt(NamedTuple):
+    """The outcome of sending the liquidation of a candidate."""
+    candidate: LiquidationCandidate
+    response: Optional[RPCResponse]
+    error: Optional[Exception]
+    detect_to_send_ms: float
+
+
+class LiquidationKeeper:
+    """Finds the liquidatable users among all users and liquidates them with the user-account of a wallet."""
+
+    def __init__(
+            self, client: SolanaClient, wallet: Keypair, clearing_house: ClearingHouseState,
+            commitment: Commitment = CONFIRMED, skip_preflight: bool = True,
+            max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, blockhash_max_age: float = DEFAULT_BLOCKHASH_MAX_AGE,
+            screening_tolerance: float = DEFAULT_SCREENING_TOLERANCE
+    ) -> None:
+        """
+        :param client: The Solana client transactions are sent with.
+        :param wallet: The wallet signing the liquidations; its user-account receives the rewards.
+        :param clearing_house: The clearing house state, for the margin ratios and liquidation penalties.
+        :param commitment: The commitment of the blockhash and of the preflight checks.
+        :param skip_preflight: Send without simulating first, which saves a round of simulation per liquidation.
+        :param max_in_flight: The maximum number of liquidations awaiting the node at once.
+        :param blockhash_max_age: Seconds after which the cached blockhash is refreshed before sending.
+        :param screening_tolerance: How far above the partial-liquidation ratio, relatively, the approximate margin
+        ratio of a user may be for its exact margin to be computed."""
+        self.client = client
+        self.wallet = wallet
+        self.clearing_house = clearing_house
+        self.commitment = commitment
+        self.opts = TxOpts(
+            skip_preflight=skip_preflight,
+            preflight_commitment=commitment
+        )
+        self.max_in_flight = max_in_flight
+        self.blockhash_max_age = blockhash_max_age
+        # deriving the public key of a keypair is not free, it is done once
+        self.authority = wallet.public_key
+        self.liquidator = get_user_account_address(
+            authority=self.authority
+        )
+        self.users: List[PublicKey] = []
+        self.user_positions: List[PublicKey] = []
+        self.collateral: np.ndarray = to_exact_array([])
+        self.positions: PositionColumns = empty_position_columns(number_of_users=0)
+        # float64 copies of the collateral and positions, kept in step with them for the screening
+        self._float_collateral = np.zeros(0)
+        self._float_positions = to_float_columns(position_columns=self.positions)
+        self.screening_tolerance = screening_tolerance
+        self.approximate_margin_ratio: Optional[np.ndarray] = None
+        # the rows of the users whose exact margin is known, in the order of self.margin
+        self.screened_rows = np.zeros(0, dtype=np.int64)
+        self.margin: Optional[MarginArrays] = None
+        # rows by the bytes of the user address, which unlike the address itself is hashable
+        self._rows: Dict[bytes, int] = {}
+        self._instructions: Dict[int, TransactionInstruction] = {}
+        self._template, self._user_key_index, self._user_positions_key_index = self._get_template_instruction()
+        self._in_flight = set()
+        self._blockhash: Optional[Blockhash] = None
+        self._blockhash_time = 0.0
+
+    """USERS"""
+
+    def set_users(self, users: Iterable[Tuple[PublicKey, UserAccount, UserPositions]]) -> None:
+        """Replace the users followed by the keeper.
+
+        :param users: The address, user-account and positions account of every user."""
+        users = list(users)
+        self.users = [address for address, _, _ in users]
+        self.user_positions = [user_account.positions_account for _, user_account, _ in users]
+        self.collateral = to_exact_array(user_account.collateral for _, user_account, _ in users)
+        self.positions = empty_position_columns(number_of_users=len(users))
+        for row, (_, _, positions) in enumerate(users):
+            set_position_row(position_columns=self.positions, row=row, user_positions=positions)
+        self._float_collateral = self.collateral.astype(np.float64)
+        self._float_positions = to_float_columns(position_columns=self.positions)
+        self._rows = {bytes(address): row for row, address in enumerate(self.users)}
+        self._instructions = {}
+        self.approximate_margin_ratio = None
+        self.screened_rows = np.zeros(0, dtype=np.int64)
+        self.margin = None
+
+    def update_user(
+            self, user: PublicKey, user_account: Optional[UserAccount] = None,
+            user_positions: Optional[UserPositions] = None
+    ) -> None:
+        """Update the collateral or the positions of a user, adding it if it is new.
+
+        :param user: The address of the user-account.
+        :param user_account: Its new user-account, if it changed; required for a new user.
+        :param user_positions: Its new positions account, if it changed; required for a new user."""
+        row = self._rows.get(bytes(user))
+        if row is None:
+            if user_account is None or user_positions is None:
+                raise Exception('A new user needs both its user-account and its positions.')
+            row = self._add_row(user=user, positions_address=user_account.positions_account)
+        if user_account is not None:
+            self._set_collateral(row=row, collateral=user_account.collateral)
+        if user_positions is not None:
+            self._set_positions(row=row, user_positions=user_positions)
+
+    def apply_change(self, change: AccountChange) -> None:
+        """Follow the changes of an AccountReconciler, see AccountReconciler.subscribe.
+
+        Accounts created after set_users get a row when their first change arrives; the user-account and the
+        positions account of a new user may come in either order. Closed accounts keep their row, emptied, so that
+        they are never liquidation candidates."""
+        if change.account_name == 'User':
+            user = PublicKey(change.pubkey)
+            row = self._rows.get(bytes(user))
+            if row is None:
+                if change.current is None:
+                    return
+                row = self._add_row(user=user, positions_address=change.current.positions_account)
+            if change.current is None:
+                self._set_collateral(row=row, collateral=0)
+                self._set_positions(row=row, user_positions=None)
+            else:
+                self._set_collateral(row=row, collateral=change.current.collateral)
+        elif change.account_name == 'UserPositions' and change.current is not None:
+            row = self._rows.get(bytes(change.current.user))
+            if row is None:
+                row = self._add_row(user=change.current.user, positions_address=PublicKey(change.pubkey))
+            self._set_positions(row=row, user_positions=change.current)
+
+    def _set_collateral(self, row: int, collateral: int) -> None:
+        self.collateral[row] = collateral
+        self._float_collateral[row] = collateral
+
+    def _set_positions(self, row: int, user_positions: Optional[UserPositions]) -> None:
+        """Overwrite the positions of a row, emptying them without a positions account."""
+        if user_positions is None:
+            clear_position_row(position_columns=self.positions, row=row)
+        else:
+            set_position_row(position_columns=self.positions, row=row, user_positions=user_positions)
+        for column, float_column in zip(self.positions[1:], self._float_positions[1:]):
+            float_column[row] = column[row].astype(np.float64)
+        self._float_positions.market_index[row] = self.positions.market_index[row]
+
+    def _add_row(self, user: PublicKey, positions_address: PublicKey) -> int:
+        row = len(self.users)
+        self.users.append(user)
+        self.user_positions.append(positions_address)
+        self.collateral = np.append(self.collateral, to_exact_array([0]))
+        self._float_collateral = np.append(self._float_collateral, 0.0)
+        new_row = empty_position_columns(number_of_users=1)
+        self.positions = PositionColumns(*[
+            np.concatenate([column, new_column]) for column, new_column in zip(self.positions, new_row)
+        ])
+        self._float_positions = PositionColumns(*[
+            np.concatenate([column, new_column])
+            for column, new_column in zip(self._float_positions, to_float_columns(position_columns=new_row))
+        ])
+        self._rows[bytes(user)] = row
+        return row
+
+    def _get_template_instruction(self) -> Tuple[TransactionInstruction, int, int]:
+        """Build the liquidate instruction once with placeholder users, and find where the user accounts go."""
+        user_placeholder = PublicKey(bytes([1]) * 32)
+        user_positions_placeholder = PublicKey(bytes([2]) * 32)
+        template = LiquidateInstruction().get_instruction(
+            state=CLEARING_HOUSE_ADDRESSES.state,
+            authority=self.authority,
+            liquidator=self.liquidator,
+            user=user_placeholder,
+            collateral_vault=CLEARING_HOUSE_ADDRESSES.collateral_vault,
+            collateral_vault_authority=CLEARING_HOUSE_ADDRESSES.collateral_vault_authority,
+            insurance_vault=CLEARING_HOUSE_ADDRESSES.insurance_vault,
+            insurance_vault_authority=CLEARING_HOUSE_ADDRESSES.insurance_vault_authority,
+            token_program=TOKEN_PROGRAM_ID,
+            markets=CLEARING_HOUSE_ADDRESSES.markets,
+            user_positions=user_positions_placeholder,
+            trade_history=CLEARING_HOUSE_ADDRESSES.history.trade,
+            liquidation_history=CLEARING_HOUSE_ADDRESSES.history.liquidation,
+            funding_payment_history=CLEARING_HOUSE_ADDRESSES.history.funding_payment,
+            program_id=CLEARING_HOUSE_ADDRESSES.program
+        )
+        pubkeys = [account_meta.pubkey for account_meta in template.keys]
+        return template, pubkeys.index(user_placeholder), pubkeys.index(user_positions_placeholder)
+
+    def get_liquidate_instruction(self, row: int) -> TransactionInstruction:
+        """Get the liquidate instruction of the user in a row, built from the cached account metas once per user."""
+        transaction_instruction = self._instructions.get(row)
+        if transaction_instruction is None:
+            account_keys = list(self._template.keys)
+            account_keys[self._user_key_index] = AccountMeta(
+                pubkey=self.users[row],
+                is_writable=True,
+                is_signer=False
+            )
+            account_keys[self._user_positions_key_index] = AccountMeta(
+                pubkey=self.user_positions[row],
+                is_writable=True,
+                is_signer=False
+            )
+            transaction_instruction = TransactionInstruction(
+                keys=account_keys,
+                program_id=self._template.program_id,
+                data=self._template.data
+            )
+            self._instructions[row] = transaction_instruction
+        return transaction_instruction
+
+    """DETECTION"""
+
+    def update_markets(self, markets: DriftMarkets) -> List[LiquidationCandidate]:
+        """Recompute the margin of every user at new markets, after its unsettled funding as the liquidation does.
+
+        The margin ratios of all users are approximated in float64 first, and only the users close enough to the
+        partial-liquidation ratio get their exact margin.
+
+        :return: The liquidation candidates, highest expected reward first."""
+        detected_at = time.perf_counter()
+        amm_arrays = get_amm_arrays(market.amm for market in markets.markets)
+        funding_rate_arrays = get_funding_rate_arrays(market.amm for market in markets.markets)
+        self.approximate_margin_ratio = approximate_margin_ratio(
+            collateral=self._float_collateral,
+            position_columns=self._float_positions,
+            amm_arrays=amm_arrays,
+            funding_rate_arrays=funding_rate_arrays
+        )
+        threshold = self.clearing_house.margin_ratio_partial * (1 + self.screening_tolerance)
+        self.screened_rows = np.nonzero(self.approximate_margin_ratio <= threshold)[0]
+        self.margin = calculate_margin(
+            collateral=self.collateral[self.screened_rows],
+            position_columns=select_rows(position_columns=self.positions, rows=self.screened_rows),
+            amm_arrays=amm_arrays,
+            funding_rate_arrays=funding_rate_arrays
+        )
+        instrumentation.collector.record_timing(
+            instrumentation.MATERIALIZE, 'liquidation_margin', time.perf_counter() - detected_at
+        )
+        return self.get_candidates(detected_at=detected_at)
+
+    def get_candidates(self, detected_at: Optional[float] = None) -> List[LiquidationCandidate]:
+        """Get the users at or below the partial-liquidation margin ratio, highest expected reward first.
+
+        :param detected_at: The time.perf_counter() the detection started at, now if not given."""
+        if self.margin is None:
+            raise Exception('No markets yet, see update_markets.')
+        if detected_at is None:
+            detected_at = time.perf_counter()
+        clearing_house = self.clearing_house
+        indices = np.nonzero(self.margin.margin_ratio <= clearing_house.margin_ratio_partial)[0]
+        rows = self.screened_rows[indices]
+        margin_ratio = self.margin.margin_ratio[indices]
+        total_collateral = self.margin.total_collateral[indices]
+        full_liquidation = margin_ratio <= clearing_house.margin_ratio_maintenance
+        full_penalty = clearing_house.full_liquidation_penalty_percentage
+        partial_penalty = clearing_house.partial_liquidation_penalty_percentage
+        full_reward = (
+            total_collateral * full_penalty.numerator // full_penalty.denominator
+            // clearing_house.full_liquidation_liquidator_share_denominator
+        )
+        partial_reward = (
+            total_collateral * partial_penalty.numerator // partial_penalty.denominator
+            // clearing_house.partial_liquidation_liquidator_share_denominator
+        )
+        expected_reward = np.where(full_liquidation, full_reward, partial_reward)
+        candidates = [
+            LiquidationCandidate(
+                user=self.users[row],
+                user_positions=self.user_positions[row],
+                margin_ratio=int(margin_ratio[index]),
+                total_collateral=int(total_collateral[index]),
+                expected_reward=int(expected_reward[index]),
+                full_liquidation=bool(full_liquidation[index]),
+                detected_at=detected_at
+            ) for index, row in enumerate(rows)
+        ]
+        candidates.sort(key=lambda candidate: candidate.expected_reward, reverse=True)
+        return candidates
+
+    """SENDING"""
+
+    async def refresh_blockhash(self) -> Blockhash:
+        """Fetch a recent blockhash for the next transactions."""
+        with instrumentation.collector.measure(instrumentation.NETWORK, 'get_recent_blockhash'):
+            response = await self.client.get_recent_blockhash(self.commitment)
+        self._blockhash = Blockhash(response['result']['value']['blockhash'])
+        self._blockhash_time = time.monotonic()
+        return self._blockhash
+
+    async def keep_blockhash_fresh(self, interval: float = DEFAULT_BLOCKHASH_REFRESH_INTERVAL) -> None:
+        """Refresh the blockhash forever, to run as a task next to the keeper so that sending never waits for it."""
+        while True:
+            try:
+                await self.refresh_blockhash()
+            except Exception:
+                # the cached blockhash stays valid for a while, the next refresh may succeed
+                pass
+            await asyncio.sleep(interval)
+
+    async def get_blockhash(self) -> Blockhash:
+        """Get the cached blockhash, refreshing it first if it is missing or too old."""
+        if self._blockhash is None or time.monotonic() - self._blockhash_time > self.blockhash_max_age:
+            await self.refresh_blockhash()
+        return self._blockhash
+
+    def sign_liquidation(self, user: PublicKey, blockhash: Blockhash) -> bytes:
+        """Get the signed and serialized liquidation transaction of a user."""
+        transaction = Transaction(
+            recent_blockhash=blockhash,
+            fee_payer=self.authority
+        )
+        transaction.add(self.get_liquidate_instruction(row=self._rows[bytes(user)]))
+        transaction.sign(self.wallet)
+        return transaction.serialize()
+
+    async def liquidate(self, candidates: List[LiquidationCandidate]) -> List[LiquidationAttempt]:
+        """Send the liquidations of candidates, in their order, with at most max_in_flight awaiting the node.
+
+        Each transaction is signed right before it is sent, so the first one leaves without waiting for the others
+        to be signed. Candidates whose previous liquidation is still in flight are skipped.
+
+        :return: The attempts, in the order of the candidates sent."""
+        blockhash = await self.get_blockhash()
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        candidates = [candidate for candidate in candidates if bytes(candidate.user) not in self._in_flight]
+        self._in_flight.update(bytes(candidate.user) for candidate in candidates)
+
+        async def send(candidate: LiquidationCandidate) -> LiquidationAttempt:
+            async with semaphore:
+                try:
+                    raw_transaction = self.sign_liquidation(
+                        user=candidate.user,
+                        blockhash=blockhash
+                    )
+                    detect_to_send = time.perf_counter() - candidate.detected_at
+                    instrumentation.collector.record_timing(
+                        instrumentation.DETECT_TO_SEND, 'liquidate', detect_to_send
+                    )
+                    with instrumentation.collector.measure(instrumentation.NETWORK, 'liquidate'):
+                        response = await self.client.send_raw_transaction(
+                            raw_transaction,
+                            opts=self.opts
+                        )
+                    return LiquidationAttempt(candidate, response, None, detect_to_send * 1000)
+                except Exception as e:
+                    return LiquidationAttempt(candidate, None, e, (time.perf_counter() - candidate.detected_at) * 1000)
+                finally:
+                    self._in_flight.discard(bytes(candidate.user))
+
+        attempts = await asyncio.gather(*[send(candidate) for candidate in candidates])
+        return list(attempts)
@@ -0,0 +1,23 @@
+"""Lazy importing of the attributes of a module (PEP 562)."""
+import importlib
+from typing import Any, Callable, Dict, List, Tuple
+
+
+def lazy_attributes(module_globals: dict, attribute_modules: Dict[str, str]) -> Tuple[Callable, Callable]:
+    """Get a module-level __getattr__ and __dir__ that import each attribute from its module on first access.
+
+    :param module_globals: The globals() of the lazy module; imported attributes are cached in it.
+    :param attribute_modules: The module to import each attribute from, by attribute name."""
+    module_name = module_globals['__name__']
+
+    def __getattr__(name: str) -> Any:
+        if name not in attribute_modules:
+            raise AttributeError(f'module {module_name!r} has no attribute {name!r}')
+        value = getattr(importlib.import_module(attribute_modules[name]), name)
+        module_globals[name] = value
+        return value
+
+    def __dir__() -> List[str]:
+        return sorted(set(module_globals) | set(attribute_modules))
+
+    return __getattr__, __dir__
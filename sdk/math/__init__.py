@@ -0,0 +1 @@
+"""Exact integer math mirroring the on-chain clearing house."""
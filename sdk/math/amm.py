@@ -0,0 +1,261 @@
+"""Integer-exact AMM math, mirroring the u128 arithmetic of the clearing house.
+
+Every function works on plain python integers (the scalar fast path) and, unchanged, on NumPy arrays of dtype
+object holding python integers, which keeps batch evaluation exact while still being vectorized. Reserves are in
+AMM_RESERVE_PRECISION, prices in MARK_PRICE_PRECISION, pegs in PEG_PRECISION and quote amounts in QUOTE_PRECISION.
+"""
+from typing import Iterable, NamedTuple, Tuple, Union
+
+import numpy as np
+
+from sdk.constants import (
+    SWAP_DIRECTION, MARK_PRICE_PRECISION, PRICE_TO_PEG_PRECISION_RATIO, AMM_TO_QUOTE_PRECISION_RATIO,
+    AMM_TIMES_PEG_TO_QUOTE_PRECISION_RATIO
+)
+
+Integer = Union[int, np.ndarray]
+
+MARK_PRICE_PRECISION_INT = int(MARK_PRICE_PRECISION)
+# the clearing house refuses to shrink sqrt_k by more than 2.5% in one update
+K_DECREASE_LIMIT_NUMERATOR = 975
+K_DECREASE_LIMIT_DENOMINATOR = 1000
+
+
+class AmmArrays(NamedTuple):
+    """The curve of many AMMs as exact object arrays."""
+    base_asset_reserve: np.ndarray
+    quote_asset_reserve: np.ndarray
+    sqrt_k: np.ndarray
+    peg_multiplier: np.ndarray
+
+
+def to_exact_array(values: Iterable[int]) -> np.ndarray:
+    """Wrap integers in an object array so that NumPy arithmetic stays exact."""
+    return np.array([int(value) for value in values], dtype=object)
+
+
+def get_amm_arrays(amms: Iterable) -> AmmArrays:
+    """Collect the curves of many drift AMMs into exact object arrays."""
+    amms = list(amms)
+    amm_arrays = AmmArrays(
+        base_asset_reserve=to_exact_array(amm.base_asset_reserve for amm in amms),
+        quote_asset_reserve=to_exact_array(amm.quote_asset_reserve for amm in amms),
+        sqrt_k=to_exact_array(amm.sqrt_k for amm in amms),
+        peg_multiplier=to_exact_array(amm.peg_multiplier for amm in amms)
+    )
+    return amm_arrays
+
+
+def _where(condition, if_true, if_false):
+    """Select between two values for scalars and arrays alike."""
+    if isinstance(condition, np.ndarray):
+        return np.where(condition, if_true, if_false)
+    return if_true if condition else if_false
+
+
+def _div_toward_zero(numerator: Integer, denominator: Integer) -> Integer:
+    """Signed division truncating toward zero, like the on-chain math on magnitudes."""
+    quotient = abs(numerator) // denominator
+    return _where(numerator < 0, -quotient, quotient)
+
+
+def calculate_mark_price(base_asset_reserve: Integer, quote_asset_reserve: Integer, peg_multiplier: Integer) -> Integer:
+    """Get the mark price of an AMM in MARK_PRICE_PRECISION."""
+    return quote_asset_reserve * peg_multiplier * PRICE_TO_PEG_PRECISION_RATIO // base_asset_reserve
+
+
+def asset_to_reserve_amount(quote_asset_amount: Integer, peg_multiplier: Integer) -> Integer:
+    """Convert a quote amount into quote-asset reserves."""
+    return quote_asset_amount * AMM_TIMES_PEG_TO_QUOTE_PRECISION_RATIO // peg_multiplier
+
+
+def reserve_to_asset_amount(quote_asset_reserve: Integer, peg_multiplier: Integer) -> Integer:
+    """Convert quote-asset reserves into a quote amount."""
+    return quote_asset_reserve * peg_multiplier // AMM_TIMES_PEG_TO_QUOTE_PRECISION_RATIO
+
+
+def calculate_swap_output(
+        swap_amount: Integer, input_asset_reserve: Integer, direction: Integer, sqrt_k: Integer
+) -> Tuple[Integer, Integer]:
+    """Swap an amount of one reserve against the constant-product curve.
+
+    :param swap_amount: The amount of the input asset added to or removed from the pool.
+    :param input_asset_reserve: The reserve of the input asset before the swap.
+    :param direction: SWAP_DIRECTION.add or SWAP_DIRECTION.remove.
+    :param sqrt_k: The square root of the invariant.
+    :return: The new output-asset reserve and the new input-asset reserve. For arrays, the rows of swaps that
+    would drain the input reserve are NaN, so that one impossible swap does not abort the others; a single such
+    swap raises."""
+    sign = _where(direction == SWAP_DIRECTION.add, 1, -1)
+    new_input_asset_reserve = input_asset_reserve + sign * swap_amount
+    if not isinstance(new_input_asset_reserve, np.ndarray):
+        if new_input_asset_reserve <= 0:
+            raise Exception('Trade size too large.')
+        return sqrt_k * sqrt_k // new_input_asset_reserve, new_input_asset_reserve
+    valid = (new_input_asset_reserve > 0).astype(bool)
+    if valid.all():
+        return sqrt_k * sqrt_k // new_input_asset_reserve, new_input_asset_reserve
+    new_output_asset_reserve = sqrt_k * sqrt_k // np.where(valid, new_input_asset_reserve, 1)
+    return np.where(valid, new_output_asset_reserve, np.nan), np.where(valid, new_input_asset_reserve, np.nan)
+
+
+def calculate_quote_asset_amount_swapped(
+        quote_asset_reserve_before: Integer, quote_asset_reserve_after: Integer, direction: Integer,
+        peg_multiplier: Integer
+) -> Integer:
+    """Get the quote amount exchanged when base asset is swapped into or out of the pool."""
+    quote_asset_reserve_change = _where(
+        direction == SWAP_DIRECTION.add,
+        quote_asset_reserve_before - quote_asset_reserve_after,
+        quote_asset_reserve_after - quote_asset_reserve_before
+    )
+    quote_asset_amount = reserve_to_asset_amount(quote_asset_reserve_change, peg_multiplier)
+    # when a user buys base asset, it is made slightly more expensive by one unit of quote asset
+    return quote_asset_amount + _where(direction == SWAP_DIRECTION.remove, 1, 0)
+
+
+def swap_quote_asset(
+        quote_asset_amount: Integer, direction: Integer, base_asset_reserve: Integer, quote_asset_reserve: Integer,
+        sqrt_k: Integer, peg_multiplier: Integer
+) -> Tuple[Integer, Integer, Integer]:
+    """Swap quote asset into (SWAP_DIRECTION.add) or out of (SWAP_DIRECTION.remove) the AMM.
+
+    :return: The base asset amount acquired (negative when the swap sells base), the new base-asset reserve and
+    the new quote-asset reserve."""
+    quote_asset_reserve_amount = asset_to_reserve_amount(quote_asset_amount, peg_multiplier)
+    new_base_asset_reserve, new_quote_asset_reserve = calculate_swap_output(
+        quote_asset_reserve_amount, quote_asset_reserve, direction, sqrt_k
+    )
+    base_asset_amount = base_asset_reserve - new_base_asset_reserve
+    return base_asset_amount, new_base_asset_reserve, new_quote_asset_reserve
+
+
+def swap_base_asset(
+        base_asset_amount: Integer, direction: Integer, base_asset_reserve: Integer, quote_asset_reserve: Integer,
+        sqrt_k: Integer, peg_multiplier: Integer
+) -> Tuple[Integer, Integer, Integer]:
+    """Swap base asset into (SWAP_DIRECTION.add) or out of (SWAP_DIRECTION.remove) the AMM.
+
+    :return: The quote asset amount exchanged, the new base-asset reserve and the new quote-asset reserve."""
+    new_quote_asset_reserve, new_base_asset_reserve = calculate_swap_output(
+        base_asset_amount, base_asset_reserve, direction, sqrt_k
+    )
+    quote_asset_amount = calculate_quote_asset_amount_swapped(
+        quote_asset_reserve, new_quote_asset_reserve, direction, peg_multiplier
+    )
+    return quote_asset_amount, new_base_asset_reserve, new_quote_asset_reserve
+
+
+def calculate_base_asset_value(
+        base_asset_amount: Integer, base_asset_reserve: Integer, quote_asset_reserve: Integer, sqrt_k: Integer,
+        peg_multiplier: Integer
+) -> Integer:
+    """Get the quote value of closing a (signed) base asset amount against the AMM."""
+    # closing a long adds base asset to the pool, closing a short removes it
+    direction = _where(base_asset_amount > 0, SWAP_DIRECTION.add, SWAP_DIRECTION.remove)
+    new_quote_asset_reserve, _ = calculate_swap_output(
+        abs(base_asset_amount), base_asset_reserve, direction, sqrt_k
+    )
+    base_asset_value = calculate_quote_asset_amount_swapped(
+        quote_asset_reserve, new_quote_asset_reserve, direction, peg_multiplier
+    )
+    return _where(base_asset_amount == 0, 0, base_asset_value)
+
+
+def calculate_pnl(base_asset_amount: Integer, base_asset_value: Integer, quote_asset_amount: Integer) -> Integer:
+    """Get the pnl of a position from its close-out value and entry notional."""
+    pnl = _where(base_asset_amount > 0, base_asset_value - quote_asset_amount, quote_asset_amount - base_asset_value)
+    return _where(base_asset_amount == 0, 0, pnl)
+
+
+def calculate_base_asset_value_and_pnl(
+        base_asset_amount: Integer, quote_asset_amount: Integer, base_asset_reserve: Integer,
+        quote_asset_reserve: Integer, sqrt_k: Integer, peg_multiplier: Integer
+) -> Tuple[Integer, Integer]:
+    """Get the close-out value and unrealized pnl of a position."""
+    base_asset_value = calculate_base_asset_value(
+        base_asset_amount, base_asset_reserve, quote_asset_reserve, sqrt_k, peg_multiplier
+    )
+    pnl = calculate_pnl(base_asset_amount, base_asset_value, quote_asset_amount)
+    return base_asset_value, pnl
+
+
+def calculate_entry_price(quote_asset_amount: Integer, base_asset_amount: Integer) -> Integer:
+    """Get the average fill price of a trade in MARK_PRICE_PRECISION."""
+    return quote_asset_amount * AMM_TO_QUOTE_PRECISION_RATIO * MARK_PRICE_PRECISION_INT // abs(base_asset_amount)
+
+
+def calculate_trade_slippage(
+        direction: Integer, quote_asset_amount: Integer, base_asset_reserve: Integer, quote_asset_reserve: Integer,
+        sqrt_k: Integer, peg_multiplier: Integer
+) -> Tuple[Integer, Integer, Integer, Integer]:
+    """Get the effect of a quote-denominated trade on the AMM.
+
+    :param direction: The position direction, 0 for long and 1 for short (see sdk.utils.position_direction).
+    Longs add quote asset to the pool, shorts remove it.
+    :return: The price impact (entry price relative to the mark price, in MARK_PRICE_PRECISION), the entry price,
+    the mark price after the trade and the signed base asset amount acquired."""
+    swap_direction = _where(direction == 0, SWAP_DIRECTION.add, SWAP_DIRECTION.remove)
+    mark_price = calculate_mark_price(base_asset_reserve, quote_asset_reserve, peg_multiplier)
+    base_asset_amount, new_base_asset_reserve, new_quote_asset_reserve = swap_quote_asset(
+        quote_asset_amount, swap_direction, base_asset_reserve, quote_asset_reserve, sqrt_k, peg_multiplier
+    )
+    new_mark_price = calculate_mark_price(new_base_asset_reserve, new_quote_asset_reserve, peg_multiplier)
+    filled_base_asset_amount = _where(base_asset_amount == 0, 1, base_asset_amount)
+    entry_price = _where(
+        base_asset_amount == 0, mark_price, calculate_entry_price(quote_asset_amount, filled_base_asset_amount)
+    )
+    price_impact = _div_toward_zero((entry_price - mark_price) * MARK_PRICE_PRECISION_INT, mark_price)
+    return price_impact, entry_price, new_mark_price, base_asset_amount
+
+
+def calculate_repeg_cost(
+        market_base_asset_amount: Integer, base_asset_reserve: Integer, quote_asset_reserve: Integer,
+        sqrt_k: Integer, peg_multiplier: Integer, new_peg_multiplier: Integer
+) -> Integer:
+    """Get the cost to the protocol of moving the peg, i.e. the change in value of the net user position.
+
+    A positive cost is paid out of the fee pool, a negative cost is added to it."""
+    current_net_market_value = calculate_base_asset_value(
+        market_base_asset_amount, base_asset_reserve, quote_asset_reserve, sqrt_k, peg_multiplier
+    )
+    _, cost = calculate_base_asset_value_and_pnl(
+        market_base_asset_amount, current_net_market_value, base_asset_reserve, quote_asset_reserve, sqrt_k,
+        new_peg_multiplier
+    )
+    return cost
+
+
+def calculate_adjust_k_reserves(
+        base_asset_reserve: Integer, quote_asset_reserve: Integer, sqrt_k: Integer, new_sqrt_k: Integer
+) -> Tuple[Integer, Integer]:
+    """Scale the reserves of an AMM to a new sqrt_k, keeping the mark price."""
+    sqrt_k_ratio = new_sqrt_k * MARK_PRICE_PRECISION_INT // sqrt_k
+    new_base_asset_reserve = base_asset_reserve * sqrt_k_ratio // MARK_PRICE_PRECISION_INT
+    new_quote_asset_reserve = quote_asset_reserve * sqrt_k_ratio // MARK_PRICE_PRECISION_INT
+    return new_base_asset_reserve, new_quote_asset_reserve
+
+
+def is_valid_k_adjustment(sqrt_k: Integer, new_sqrt_k: Integer) -> Union[bool, np.ndarray]:
+    """Whether the clearing house accepts the change in sqrt_k."""
+    sqrt_k_ratio = new_sqrt_k * MARK_PRICE_PRECISION_INT // sqrt_k
+    minimum_ratio = MARK_PRICE_PRECISION_INT * K_DECREASE_LIMIT_NUMERATOR // K_DECREASE_LIMIT_DENOMINATOR
+    return sqrt_k_ratio >= minimum_ratio
+
+
+def calculate_adjust_k_cost(
+        market_base_asset_amount: Integer, base_asset_reserve: Integer, quote_asset_reserve: Integer,
+        sqrt_k: Integer, peg_multiplier: Integer, new_sqrt_k: Integer
+) -> Integer:
+    """Get the cost to the protocol of changing sqrt_k (see calculate_repeg_cost for the sign)."""
+    current_net_market_value = calculate_base_asset_value(
+        market_base_asset_amount, base_asset_reserve, quote_asset_reserve, sqrt_k, peg_multiplier
+    )
+    new_base_asset_reserve, new_quote_asset_reserve = calculate_adjust_k_reserves(
+        base_asset_reserve, quote_asset_reserve, sqrt_k, new_sqrt_k
+    )
+    _, cost = calculate_base_asset_value_and_pnl(
+        market_base_asset_amount, current_net_market_value, new_base_asset_reserve, new_quote_asset_reserve,
+        new_sqrt_k, peg_multiplier
+    )
+    return cost
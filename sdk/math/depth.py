@@ -0,0 +1,147 @@
+"""Order-book style depth ladders synthesized from the drift AMM curves.
+
+A drift market has no resting orders, but its constant-product curve (base reserve * quote reserve = sqrt_k ** 2)
+fixes how much base asset must be bought or sold to move the mark price to any level. With the peg and k fixed, the
+mark price goes with 1 / base_reserve ** 2, so moving it by a factor r divides the base reserve by sqrt(r). The
+ladders hold, for every price level, the cumulative size between the mark and that level, before fees. Sizes are
+floats in base and quote asset and prices in quote per base.
+"""
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from sdk.constants import (
+    QUOTE_PRECISION, MARK_PRICE_PRECISION, AMM_RESERVE_PRECISION, AMM_TIMES_PEG_TO_QUOTE_PRECISION_RATIO
+)
+from sdk.math.amm import calculate_mark_price
+from sdk.math.slippage import get_amm_key
+
+# price levels 0.1% apart, out to 5% from the mark price
+DEFAULT_LEVELS = np.round(np.arange(1, 51) * 0.001, 6)
+
+
+class DepthLadder(NamedTuple):
+    """Cumulative depth of one market at price levels away from its mark price, nearest level first.
+
+    The sizes between consecutive levels are np.diff of the cumulative sizes, prepended with the first level."""
+    market_index: int
+    amm_key: Tuple[int, int, int, int]
+    mark_price: float
+    levels: np.ndarray
+    bid_prices: np.ndarray
+    ask_prices: np.ndarray
+    bid_base_asset_amount: np.ndarray
+    ask_base_asset_amount: np.ndarray
+    bid_quote_asset_amount: np.ndarray
+    ask_quote_asset_amount: np.ndarray
+
+
+def calculate_depth(
+        base_asset_reserve: np.ndarray, quote_asset_reserve: np.ndarray, sqrt_k: np.ndarray, peg_multiplier: np.ndarray,
+        levels: np.ndarray = DEFAULT_LEVELS
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Get the cumulative depth of many AMMs at many price levels in one broadcast.
+
+    Asks are what longs can buy before the mark price rises by a level, bids what shorts can sell before it falls by
+    one. Swaps follow the invariant sqrt_k ** 2, like the clearing house.
+
+    :param base_asset_reserve: The base asset reserves of the AMMs, in AMM_RESERVE_PRECISION.
+    :param quote_asset_reserve: Their quote asset reserves, in AMM_RESERVE_PRECISION.
+    :param sqrt_k: Their invariants' square roots, in AMM_RESERVE_PRECISION.
+    :param peg_multiplier: Their pegs, in PEG_PRECISION.
+    :param levels: The distances of the price levels from the mark price, as fractions below 1, e.g. 0.001.
+    :return: The bid and ask base asset amounts and the bid and ask quote asset amounts, shaped (AMMs, levels)."""
+    base_asset_reserve, quote_asset_reserve, sqrt_k, peg_multiplier = (
+        np.asarray(column, dtype=float)[:, np.newaxis]
+        for column in (base_asset_reserve, quote_asset_reserve, sqrt_k, peg_multiplier)
+    )
+    levels = np.asarray(levels, dtype=float)[np.newaxis, :]
+    # the base reserve at which the mark price, sqrt_k ** 2 * peg / base_reserve ** 2, is the mark times a ratio
+    base_reserve_at_mark = sqrt_k * np.sqrt(base_asset_reserve / quote_asset_reserve)
+    ask_base_asset_reserve = base_reserve_at_mark / np.sqrt(1 + levels)
+    bid_base_asset_reserve = base_reserve_at_mark / np.sqrt(1 - levels)
+    invariant = sqrt_k * sqrt_k
+    reserve_to_quote = peg_multiplier / AMM_TIMES_PEG_TO_QUOTE_PRECISION_RATIO / QUOTE_PRECISION
+    # longs take base out of the pool and put quote in, shorts the other way around
+    ask_base_asset_amount = (base_asset_reserve - ask_base_asset_reserve) / AMM_RESERVE_PRECISION
+    bid_base_asset_amount = (bid_base_asset_reserve - base_asset_reserve) / AMM_RESERVE_PRECISION
+    ask_quote_asset_amount = (invariant / ask_base_asset_reserve - quote_asset_reserve) * reserve_to_quote
+    bid_quote_asset_amount = (quote_asset_reserve - invariant / bid_base_asset_reserve) * reserve_to_quote
+    return bid_base_asset_amount, ask_base_asset_amount, bid_quote_asset_amount, ask_quote_asset_amount
+
+
+def calculate_depth_ladders(
+        markets: Iterable[Tuple[int, object]], levels: np.ndarray = DEFAULT_LEVELS
+) -> Dict[int, DepthLadder]:
+    """Build the depth ladders of many markets at once.
+
+    :param markets: (market index, DriftAmm) pairs.
+    :param levels: The distances of the price levels from the mark price, as fractions below 1."""
+    markets = list(markets)
+    if not markets:
+        return {}
+    levels = np.asarray(levels, dtype=float)
+    amm_keys = [get_amm_key(amm) for _, amm in markets]
+    base_asset_reserve, quote_asset_reserve, sqrt_k, peg_multiplier = zip(*amm_keys)
+    bid_base, ask_base, bid_quote, ask_quote = calculate_depth(
+        base_asset_reserve=base_asset_reserve,
+        quote_asset_reserve=quote_asset_reserve,
+        sqrt_k=sqrt_k,
+        peg_multiplier=peg_multiplier,
+        levels=levels
+    )
+    for depth in (bid_base, ask_base, bid_quote, ask_quote):
+        depth.flags.writeable = False
+    depth_ladders = {}
+    for row, ((market_index, _), amm_key) in enumerate(zip(markets, amm_keys)):
+        mark_price = calculate_mark_price(amm_key[0], amm_key[1], amm_key[3]) / MARK_PRICE_PRECISION
+        bid_prices = mark_price * (1 - levels)
+        ask_prices = mark_price * (1 + levels)
+        bid_prices.flags.writeable = ask_prices.flags.writeable = False
+        depth_ladders[market_index] = DepthLadder(
+            market_index=market_index,
+            amm_key=amm_key,
+            mark_price=mark_price,
+            levels=levels,
+            bid_prices=bid_prices,
+            ask_prices=ask_prices,
+            bid_base_asset_amount=bid_base[row],
+            ask_base_asset_amount=ask_base[row],
+            bid_quote_asset_amount=bid_quote[row],
+            ask_quote_asset_amount=ask_quote[row]
+        )
+    return depth_ladders
+
+
+class DepthLadders:
+    """Depth ladders of all drift markets, rebuilt only for the markets whose AMM curve changed.
+
+    Readers share the cached ladders, whose arrays are read-only."""
+
+    def __init__(self, levels: Iterable[float] = DEFAULT_LEVELS) -> None:
+        """:param levels: The distances of the price levels from the mark price, as fractions below 1."""
+        self.levels = np.asarray(list(levels), dtype=float)
+        if np.any(self.levels <= 0) or np.any(self.levels >= 1):
+            raise Exception('Depth levels must be between 0 and 1.')
+        self.levels.flags.writeable = False
+        self.ladders: Dict[int, DepthLadder] = {}
+
+    def update(self, drift_markets) -> Dict[int, bool]:
+        """Refresh the ladders from a DriftMarkets account, recomputing the changed markets in one call.
+
+        :return: For every initialized market index, whether its ladder was rebuilt."""
+        rebuilt = {}
+        changed = []
+        for market_index, market in enumerate(drift_markets.markets):
+            if not market.initialized or market.amm.base_asset_reserve == 0:
+                continue
+            ladder = self.ladders.get(market_index)
+            rebuilt[market_index] = ladder is None or ladder.amm_key != get_amm_key(market.amm)
+            if rebuilt[market_index]:
+                changed.append((market_index, market.amm))
+        self.ladders.update(calculate_depth_ladders(changed, self.levels))
+        return rebuilt
+
+    def get(self, market_index: int) -> Optional[DepthLadder]:
+        """Get the ladder of a market, if it has been built."""
+        return self.ladders.get(market_index)
@@ -0,0 +1,145 @@
+"""Integer-exact funding payments, mirroring the settlement of the clearing house.
+
+Like sdk.math.amm, every function works on python integers and, unchanged, on exact object arrays. Cumulative
+funding rates are in MARK_PRICE_PRECISION * FUNDING_PAYMENT_PRECISION and payments in QUOTE_PRECISION, positive
+when the user receives funding.
+"""
+from typing import Iterable, List, NamedTuple
+
+import numpy as np
+from solana.publickey import PublicKey
+
+from sdk.constants import (
+    QUOTE_PRECISION, MARK_PRICE_PRECISION, FUNDING_PAYMENT_PRECISION, AMM_TO_QUOTE_PRECISION_RATIO
+)
+from sdk.math.amm import Integer, to_exact_array, _where, _div_toward_zero
+
+# from funding rate delta times base asset amount to a payment in QUOTE_PRECISION
+FUNDING_RATE_TO_QUOTE_DIVISOR = \
+    int(MARK_PRICE_PRECISION) * int(FUNDING_PAYMENT_PRECISION) * AMM_TO_QUOTE_PRECISION_RATIO
+DEFAULT_MINIMUM_FUNDING_PAYMENT = int(QUOTE_PRECISION)
+FUNDING_PAYMENT_PRECISION_INT = int(FUNDING_PAYMENT_PRECISION)
+ONE_HOUR = 3600
+
+
+class UnsettledFunding(NamedTuple):
+    """The funding a user would receive (positive) or pay by settling, in QUOTE_PRECISION."""
+    user: PublicKey
+    user_positions: PublicKey
+    funding_payment: int
+    positions_to_settle: int
+
+
+class FundingRateArrays(NamedTuple):
+    """The cumulative funding rates of many AMMs as exact object arrays."""
+    cumulative_funding_rate_long: np.ndarray
+    cumulative_funding_rate_short: np.ndarray
+
+
+def get_funding_rate_arrays(amms: Iterable) -> FundingRateArrays:
+    """Collect the cumulative funding rates of many drift AMMs into exact object arrays."""
+    amms = list(amms)
+    funding_rate_arrays = FundingRateArrays(
+        cumulative_funding_rate_long=to_exact_array(amm.cumulative_funding_rate_long for amm in amms),
+        cumulative_funding_rate_short=to_exact_array(amm.cumulative_funding_rate_short for amm in amms)
+    )
+    return funding_rate_arrays
+
+
+def calculate_funding_payment(
+        base_asset_amount: Integer, last_cumulative_funding_rate: Integer, cumulative_funding_rate_long: Integer,
+        cumulative_funding_rate_short: Integer
+) -> Integer:
+    """Get the unsettled funding payment of a position, as settle_funding_payment would credit it to the collateral.
+
+    Longs are settled against the long cumulative rate and shorts against the short one; when the rate rose, longs
+    pay and shorts receive.
+
+    :param base_asset_amount: The signed base asset amount of the position.
+    :param last_cumulative_funding_rate: The cumulative rate at which the position was last settled.
+    :param cumulative_funding_rate_long: The current long cumulative rate of the market.
+    :param cumulative_funding_rate_short: The current short cumulative rate of the market."""
+    cumulative_funding_rate = _where(base_asset_amount > 0, cumulative_funding_rate_long, cumulative_funding_rate_short)
+    funding_rate_delta = cumulative_funding_rate - last_cumulative_funding_rate
+    # the clearing house divides magnitudes, so the payment is truncated toward zero
+    return _div_toward_zero(-funding_rate_delta * base_asset_amount, FUNDING_RATE_TO_QUOTE_DIVISOR)
+
+
+def calculate_new_twap(
+        last_twap: Integer, last_twap_ts: Integer, price: Integer, now: Integer, funding_period: Integer
+) -> Integer:
+    """Roll a mark or oracle price TWAP forward to now, as the clearing house does on every trade and funding update.
+
+    The price is weighted by the time since the last update and the previous TWAP by what remains of the funding
+    period, so a TWAP older than a whole period is replaced by the price.
+
+    :param last_twap: The TWAP at the last update, in MARK_PRICE_PRECISION.
+    :param last_twap_ts: The unix timestamp of the last update.
+    :param price: The price that stood since the last update, in MARK_PRICE_PRECISION.
+    :param now: The unix timestamp to roll the TWAP to.
+    :param funding_period: The funding period of the AMM, in seconds."""
+    since_last = _where(now - last_twap_ts > 1, now - last_twap_ts, 1)
+    from_start = _where(funding_period > since_last, funding_period - since_last, 0)
+    return (price * since_last + last_twap * from_start) // (since_last + from_start)
+
+
+def calculate_funding_rate(mark_price_twap: Integer, oracle_price_twap: Integer, funding_period: Integer) -> Integer:
+    """Get the funding rate of one funding period from the TWAPs, in MARK_PRICE_PRECISION * FUNDING_PAYMENT_PRECISION.
+
+    The mark-oracle spread is paid over a day, so an hourly period pays 1/24 of it; positive rates are paid by longs.
+
+    :param mark_price_twap: The mark price TWAP, in MARK_PRICE_PRECISION.
+    :param oracle_price_twap: The oracle price TWAP, in MARK_PRICE_PRECISION.
+    :param funding_period: The funding period of the AMM, in seconds."""
+    period_adjustment = 24 * ONE_HOUR // _where(funding_period > ONE_HOUR, funding_period, ONE_HOUR)
+    price_spread = mark_price_twap - oracle_price_twap
+    return _div_toward_zero(price_spread * FUNDING_PAYMENT_PRECISION_INT, period_adjustment)
+
+
+def calculate_position_funding(position_columns, funding_rate_arrays: FundingRateArrays) -> np.ndarray:
+    """Get the unsettled funding payment of every position slot of many users, zero for empty slots.
+
+    :param position_columns: The PositionColumns of the users, see sdk.math.margin.
+    :param funding_rate_arrays: The cumulative funding rates of every market, by market index.
+    :return: The payments, shaped like the columns."""
+    shape = position_columns.base_asset_amount.shape
+    open_slots = np.nonzero(position_columns.base_asset_amount != 0)
+    market_index = position_columns.market_index[open_slots]
+    funding_payment = np.zeros(shape, dtype=position_columns.base_asset_amount.dtype)
+    funding_payment[open_slots] = calculate_funding_payment(
+        base_asset_amount=position_columns.base_asset_amount[open_slots],
+        last_cumulative_funding_rate=position_columns.last_cumulative_funding_rate[open_slots],
+        cumulative_funding_rate_long=funding_rate_arrays.cumulative_funding_rate_long[market_index],
+        cumulative_funding_rate_short=funding_rate_arrays.cumulative_funding_rate_short[market_index]
+    )
+    return funding_payment
+
+
+def get_unsettled_funding(
+        users: List[PublicKey], user_positions: List[PublicKey], position_columns,
+        funding_rate_arrays: FundingRateArrays, minimum_funding_payment: int = DEFAULT_MINIMUM_FUNDING_PAYMENT
+) -> List[UnsettledFunding]:
+    """Get the users whose settlement would move their collateral by at least a minimum, largest first.
+
+    :param users: The user-account addresses, one per row of the columns.
+    :param user_positions: Their positions account addresses.
+    :param position_columns: Their PositionColumns, see sdk.math.margin.
+    :param funding_rate_arrays: The cumulative funding rates of every market, by market index.
+    :param minimum_funding_payment: The smallest payment, received or paid, worth a settlement."""
+    position_funding = calculate_position_funding(
+        position_columns=position_columns,
+        funding_rate_arrays=funding_rate_arrays
+    )
+    funding_payment = position_funding.sum(axis=1)
+    positions_to_settle = np.count_nonzero(position_funding != 0, axis=1)
+    rows = np.nonzero(abs(funding_payment) >= minimum_funding_payment)[0]
+    unsettled_funding = [
+        UnsettledFunding(
+            user=users[row],
+            user_positions=user_positions[row],
+            funding_payment=int(funding_payment[row]),
+            positions_to_settle=int(positions_to_settle[row])
+        ) for row in rows
+    ]
+    unsettled_funding.sort(key=lambda unsettled: abs(unsettled.funding_payment), reverse=True)
+    return unsettled_funding
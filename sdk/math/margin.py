@@ -0,0 +1,331 @@
+"""Integer-exact margin math of many users at once, mirroring the clearing house.
+
+Positions are held in columns of shape (number of users, POSITIONS_PER_USER): one row per user and one column per
+position slot of its UserPositions account. Amounts are exact object arrays (see sdk.math.amm); collateral and
+values are in QUOTE_PRECISION and margin ratios in MARGIN_PRECISION.
+"""
+from typing import Iterable, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from sdk.constants import MARGIN_PRECISION
+from sdk.math.amm import AmmArrays, get_amm_arrays, calculate_base_asset_value_and_pnl
+from sdk.math.funding import FundingRateArrays, get_funding_rate_arrays, calculate_position_funding
+
+POSITIONS_PER_USER = 5
+MARGIN_PRECISION_INT = int(MARGIN_PRECISION)
+# the margin ratio of a user without positions, u128::MAX on-chain
+MAXIMUM_MARGIN_RATIO = 2 ** 128 - 1
+# how far from a margin ratio threshold, relatively, a float64 margin ratio must be to be trusted
+DEFAULT_SCREENING_TOLERANCE = 0.01
+
+
+class PositionColumns(NamedTuple):
+    """The position slots of many users, one row per user."""
+    market_index: np.ndarray
+    base_asset_amount: np.ndarray
+    quote_asset_amount: np.ndarray
+    last_cumulative_funding_rate: np.ndarray
+
+
+class MarginArrays(NamedTuple):
+    """The margin of many users, one entry per user, as exact object arrays."""
+    base_asset_value: np.ndarray
+    unrealized_pnl: np.ndarray
+    funding_payment: np.ndarray
+    total_collateral: np.ndarray
+    margin_ratio: np.ndarray
+
+
+def empty_position_columns(number_of_users: int) -> PositionColumns:
+    """Get position columns of users without any position."""
+    shape = (number_of_users, POSITIONS_PER_USER)
+    position_columns = PositionColumns(
+        market_index=np.zeros(shape, dtype=np.int64),
+        base_asset_amount=np.zeros(shape, dtype=object),
+        quote_asset_amount=np.zeros(shape, dtype=object),
+        last_cumulative_funding_rate=np.zeros(shape, dtype=object)
+    )
+    return position_columns
+
+
+def set_position_row(position_columns: PositionColumns, row: int, user_positions) -> None:
+    """Overwrite the positions of one user in place.
+
+    :param position_columns: The columns to update.
+    :param row: The row of the user.
+    :param user_positions: Its UserPositions account."""
+    for slot, position in enumerate(user_positions.positions):
+        position_columns.market_index[row, slot] = position.market_index
+        position_columns.base_asset_amount[row, slot] = position.base_asset_amount
+        position_columns.quote_asset_amount[row, slot] = position.quote_asset_amount
+        position_columns.last_cumulative_funding_rate[row, slot] = position.last_cumulative_funding_rate
+
+
+def clear_position_row(position_columns: PositionColumns, row: int) -> None:
+    """Empty every position slot of one user in place."""
+    position_columns.market_index[row] = 0
+    position_columns.base_asset_amount[row] = 0
+    position_columns.quote_asset_amount[row] = 0
+    position_columns.last_cumulative_funding_rate[row] = 0
+
+
+def get_position_columns(user_positions: Iterable) -> PositionColumns:
+    """Collect the positions of many UserPositions accounts into columns, in the order given."""
+    user_positions = list(user_positions)
+    position_columns = empty_position_columns(number_of_users=len(user_positions))
+    for row, positions in enumerate(user_positions):
+        set_position_row(position_columns=position_columns, row=row, user_positions=positions)
+    return position_columns
+
+
+def calculate_position_values(
+        position_columns: PositionColumns, amm_arrays: AmmArrays
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Get the close-out value against the AMM and the unrealized pnl of every position slot.
+
+    Only the open slots are evaluated; empty slots are worth zero.
+
+    :return: The base asset values and the pnls, both shaped like the columns."""
+    shape = position_columns.base_asset_amount.shape
+    open_slots = np.nonzero(position_columns.base_asset_amount != 0)
+    market_index = position_columns.market_index[open_slots]
+    open_base_asset_value, open_pnl = calculate_base_asset_value_and_pnl(
+        base_asset_amount=position_columns.base_asset_amount[open_slots],
+        quote_asset_amount=position_columns.quote_asset_amount[open_slots],
+        base_asset_reserve=amm_arrays.base_asset_reserve[market_index],
+        quote_asset_reserve=amm_arrays.quote_asset_reserve[market_index],
+        sqrt_k=amm_arrays.sqrt_k[market_index],
+        peg_multiplier=amm_arrays.peg_multiplier[market_index]
+    )
+    base_asset_value = np.zeros(shape, dtype=position_columns.base_asset_amount.dtype)
+    pnl = np.zeros(shape, dtype=position_columns.base_asset_amount.dtype)
+    base_asset_value[open_slots] = open_base_asset_value
+    pnl[open_slots] = open_pnl
+    return base_asset_value, pnl
+
+
+def calculate_total_collateral(collateral: np.ndarray, unrealized_pnl: np.ndarray) -> np.ndarray:
+    """Get the collateral of users after their pnl (or funding), which the clearing house floors at zero."""
+    total_collateral = collateral + unrealized_pnl
+    return np.where(total_collateral < 0, 0, total_collateral)
+
+
+def calculate_margin_ratio(total_collateral: np.ndarray, base_asset_value: np.ndarray) -> np.ndarray:
+    """Get the margin ratios of users, MAXIMUM_MARGIN_RATIO for those without positions."""
+    has_positions = base_asset_value != 0
+    margin_ratio = total_collateral * MARGIN_PRECISION_INT // np.where(has_positions, base_asset_value, 1)
+    return np.where(has_positions, margin_ratio, MAXIMUM_MARGIN_RATIO)
+
+
+def select_rows(position_columns: PositionColumns, rows: np.ndarray) -> PositionColumns:
+    """Get the positions of some users only."""
+    return PositionColumns(*[column[rows] for column in position_columns])
+
+
+def calculate_margin(
+        collateral: np.ndarray, position_columns: PositionColumns, amm_arrays: AmmArrays,
+        funding_rate_arrays: Optional[FundingRateArrays] = None
+) -> MarginArrays:
+    """Get the margin of many users from their collateral and positions.
+
+    The clearing house settles the funding of a user before checking its margin, so with funding rates the unsettled
+    funding is added to the collateral first, floored at zero like any collateral update.
+
+    :param collateral: The collateral of every user, as an exact object array.
+    :param position_columns: Their positions, one row per user.
+    :param amm_arrays: The AMMs of every market, by market index (see sdk.math.amm.get_amm_arrays).
+    :param funding_rate_arrays: The cumulative funding rates of every market, by market index (see
+    sdk.math.funding.get_funding_rate_arrays); funding is ignored without them."""
+    if funding_rate_arrays is None:
+        funding_payment = np.zeros(len(collateral), dtype=position_columns.base_asset_amount.dtype)
+    else:
+        funding_payment = calculate_position_funding(
+            position_columns=position_columns,
+            funding_rate_arrays=funding_rate_arrays
+        ).sum(axis=1)
+        collateral = calculate_total_collateral(
+            collateral=collateral,
+            unrealized_pnl=funding_payment
+        )
+    position_base_asset_value, position_pnl = calculate_position_values(
+        position_columns=position_columns,
+        amm_arrays=amm_arrays
+    )
+    base_asset_value = position_base_asset_value.sum(axis=1)
+    unrealized_pnl = position_pnl.sum(axis=1)
+    total_collateral = calculate_total_collateral(
+        collateral=collateral,
+        unrealized_pnl=unrealized_pnl
+    )
+    margin_arrays = MarginArrays(
+        base_asset_value=base_asset_value,
+        unrealized_pnl=unrealized_pnl,
+        funding_payment=funding_payment,
+        total_collateral=total_collateral,
+        margin_ratio=calculate_margin_ratio(
+            total_collateral=total_collateral,
+            base_asset_value=base_asset_value
+        )
+    )
+    return margin_arrays
+
+
+def to_float_columns(position_columns: PositionColumns) -> PositionColumns:
+    """Get a float64 copy of position columns, for approximate_margin_ratio."""
+    float_position_columns = PositionColumns(
+        position_columns.market_index.copy(),
+        *[column.astype(np.float64) for column in position_columns[1:]]
+    )
+    return float_position_columns
+
+
+def approximate_margin_ratio(
+        collateral: np.ndarray, position_columns: PositionColumns, amm_arrays: AmmArrays,
+        funding_rate_arrays: Optional[FundingRateArrays] = None
+) -> np.ndarray:
+    """Get the margin ratios of many users in float64, as in calculate_margin.
+
+    The rounding errors are orders of magnitude below the margin thresholds that matter, while the evaluation is
+    many times faster than the exact one; it screens which users need their exact margin.
+
+    :param collateral: The collateral of every user, as a float64 array.
+    :param position_columns: Their positions as float64 columns, see to_float_columns.
+    :param amm_arrays: The AMMs of every market, by market index.
+    :param funding_rate_arrays: The cumulative funding rates of every market, by market index."""
+    margin_arrays = calculate_margin(
+        collateral=collateral,
+        position_columns=position_columns,
+        amm_arrays=AmmArrays(*[np.asarray(array, dtype=np.float64) for array in amm_arrays]),
+        funding_rate_arrays=None if funding_rate_arrays is None else FundingRateArrays(
+            *[np.asarray(array, dtype=np.float64) for array in funding_rate_arrays]
+        )
+    )
+    return margin_arrays.margin_ratio
+
+
+class UserMargin(NamedTuple):
+    """The margin of many users at the risk parameters of the clearing house, one entry per user.
+
+    Amounts are in QUOTE_PRECISION and ratios in MARGIN_PRECISION. The free collateral is the total collateral above
+    the initial margin requirement, and the liquidation buffers are the losses after which the users reach the
+    partial and full liquidation ratios; all three are negative once past them."""
+    base_asset_value: np.ndarray
+    unrealized_pnl: np.ndarray
+    funding_payment: np.ndarray
+    total_collateral: np.ndarray
+    margin_ratio: np.ndarray
+    free_collateral: np.ndarray
+    partial_liquidation_buffer: np.ndarray
+    full_liquidation_buffer: np.ndarray
+    partially_liquidatable: np.ndarray
+    fully_liquidatable: np.ndarray
+
+
+class MarginEngine:
+    """Margin of many users at the risk parameters of a ClearingHouseState.
+
+    The engine evaluates position columns (see get_position_columns) against the current markets, including the
+    unrealized pnl at the close-out value of every position and its unsettled funding."""
+
+    def __init__(self, clearing_house) -> None:
+        """
+        :param clearing_house: The ClearingHouseState holding the margin ratios."""
+        self.margin_ratio_initial = clearing_house.margin_ratio_initial
+        self.margin_ratio_partial = clearing_house.margin_ratio_partial
+        self.margin_ratio_maintenance = clearing_house.margin_ratio_maintenance
+
+    @staticmethod
+    def get_margin_requirement(base_asset_value: np.ndarray, margin_ratio: int) -> np.ndarray:
+        """Get the total collateral that positions worth base_asset_value need to stay above a margin ratio."""
+        return base_asset_value * margin_ratio // MARGIN_PRECISION_INT
+
+    def calculate(
+            self, collateral: np.ndarray, position_columns: PositionColumns, markets, exact: bool = False,
+            screening_tolerance: float = DEFAULT_SCREENING_TOLERANCE
+    ) -> UserMargin:
+        """Get the margin of many users at the current markets.
+
+        By default every user is computed in float64, and the users whose margin ratio lies within the screening
+        tolerance of the initial, partial or maintenance margin ratio are computed again with the integer math of
+        the clearing house. The flags and buffer signs therefore match the clearing house for every user, while the
+        amounts of the others are off by rounding errors only; the result holds float64 arrays.
+
+        :param collateral: The collateral of every user, as an exact object array.
+        :param position_columns: Their positions, one row per user.
+        :param markets: The DriftMarkets.
+        :param exact: Use the integer math of the clearing house for every user, several times slower; the result
+        holds exact object arrays.
+        :param screening_tolerance: How far from a threshold, relatively, the float64 margin ratio of a user must be
+        for it to be kept."""
+        amm_arrays = get_amm_arrays(market.amm for market in markets.markets)
+        funding_rate_arrays = get_funding_rate_arrays(market.amm for market in markets.markets)
+        if exact:
+            margin_arrays = calculate_margin(
+                collateral=collateral,
+                position_columns=position_columns,
+                amm_arrays=amm_arrays,
+                funding_rate_arrays=funding_rate_arrays
+            )
+        else:
+            margin_arrays = self._calculate_screened(
+                collateral=collateral,
+                position_columns=position_columns,
+                amm_arrays=amm_arrays,
+                funding_rate_arrays=funding_rate_arrays,
+                screening_tolerance=screening_tolerance
+            )
+        base_asset_value = margin_arrays.base_asset_value
+        total_collateral = margin_arrays.total_collateral
+        user_margin = UserMargin(
+            base_asset_value=base_asset_value,
+            unrealized_pnl=margin_arrays.unrealized_pnl,
+            funding_payment=margin_arrays.funding_payment,
+            total_collateral=total_collateral,
+            margin_ratio=margin_arrays.margin_ratio,
+            free_collateral=total_collateral - self.get_margin_requirement(
+                base_asset_value=base_asset_value,
+                margin_ratio=self.margin_ratio_initial
+            ),
+            partial_liquidation_buffer=total_collateral - self.get_margin_requirement(
+                base_asset_value=base_asset_value,
+                margin_ratio=self.margin_ratio_partial
+            ),
+            full_liquidation_buffer=total_collateral - self.get_margin_requirement(
+                base_asset_value=base_asset_value,
+                margin_ratio=self.margin_ratio_maintenance
+            ),
+            partially_liquidatable=np.asarray(margin_arrays.margin_ratio <= self.margin_ratio_partial, dtype=bool),
+            fully_liquidatable=np.asarray(margin_arrays.margin_ratio <= self.margin_ratio_maintenance, dtype=bool)
+        )
+        return user_margin
+
+    def _calculate_screened(
+            self, collateral: np.ndarray, position_columns: PositionColumns, amm_arrays: AmmArrays,
+            funding_rate_arrays: FundingRateArrays, screening_tolerance: float
+    ) -> MarginArrays:
+        """Compute in float64 and overwrite the users close to a margin ratio threshold with their exact margin."""
+        margin_arrays = calculate_margin(
+            collateral=np.asarray(collateral, dtype=np.float64),
+            position_columns=to_float_columns(position_columns=position_columns),
+            amm_arrays=AmmArrays(*[np.asarray(array, dtype=np.float64) for array in amm_arrays]),
+            funding_rate_arrays=FundingRateArrays(
+                *[np.asarray(array, dtype=np.float64) for array in funding_rate_arrays]
+            )
+        )
+        margin_ratio = margin_arrays.margin_ratio
+        near_threshold = np.zeros(len(margin_ratio), dtype=bool)
+        for threshold in (self.margin_ratio_initial, self.margin_ratio_partial, self.margin_ratio_maintenance):
+            near_threshold |= np.abs(margin_ratio - threshold) <= threshold * screening_tolerance
+        rows = np.nonzero(near_threshold)[0]
+        if len(rows) == 0:
+            return margin_arrays
+        exact_margin_arrays = calculate_margin(
+            collateral=collateral[rows],
+            position_columns=select_rows(position_columns=position_columns, rows=rows),
+            amm_arrays=amm_arrays,
+            funding_rate_arrays=funding_rate_arrays
+        )
+        for array, exact_array in zip(margin_arrays, exact_margin_arrays):
+            array[rows] = exact_array.astype(np.float64)
+        return margin_arrays
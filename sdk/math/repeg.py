@@ -0,0 +1,111 @@
+"""What-if calculations for repegging an AMM and adjusting its sqrt_k."""
+from typing import Iterable, NamedTuple, Optional
+
+import numpy as np
+
+from sdk.math.amm import (
+    to_exact_array, calculate_mark_price, calculate_repeg_cost, calculate_adjust_k_cost, calculate_adjust_k_reserves,
+    is_valid_k_adjustment
+)
+
+
+class CurveAdjustments(NamedTuple):
+    """The outcome of a grid of candidate curve adjustments of one market, one entry per candidate.
+
+    Costs and fee pools are in QUOTE_PRECISION, prices in MARK_PRICE_PRECISION, all as exact object arrays."""
+    candidates: np.ndarray
+    adjustment_cost: np.ndarray
+    new_mark_price: np.ndarray
+    total_fee_minus_distributions: np.ndarray
+    is_valid: np.ndarray
+
+
+def _per_candidate(values, candidates: np.ndarray) -> np.ndarray:
+    """Give every candidate its own entry, also when the math returned one scalar for all of them, e.g. for a
+    market without open interest."""
+    return np.broadcast_to(np.asarray(values, dtype=object), candidates.shape).copy()
+
+
+def _total_fee_minus_distributions_after(market, adjustment_cost: np.ndarray) -> np.ndarray:
+    """A positive adjustment cost is paid out of the fee pool, a negative one is added to it."""
+    return market.amm.total_fee_minus_distributions - adjustment_cost
+
+
+def calculate_repeg_adjustments(market, new_peg_candidates: Iterable[int]) -> CurveAdjustments:
+    """Evaluate repegging a market to each of many candidate pegs (PEG_PRECISION).
+
+    A candidate is valid when it changes the peg and the fee pool can pay for it, as the clearing house requires
+    for a RepegAmmCurveInstruction.
+
+    :param market: The DriftMarket to repeg.
+    :param new_peg_candidates: The candidate peg multipliers."""
+    amm = market.amm
+    candidates = to_exact_array(new_peg_candidates)
+    adjustment_cost = _per_candidate(calculate_repeg_cost(
+        market_base_asset_amount=market.base_asset_amount,
+        base_asset_reserve=amm.base_asset_reserve,
+        quote_asset_reserve=amm.quote_asset_reserve,
+        sqrt_k=amm.sqrt_k,
+        peg_multiplier=amm.peg_multiplier,
+        new_peg_multiplier=candidates
+    ), candidates)
+    total_fee_minus_distributions = _total_fee_minus_distributions_after(market, adjustment_cost)
+    is_valid = (candidates > 0) & (candidates != amm.peg_multiplier) & (total_fee_minus_distributions >= 0)
+    curve_adjustments = CurveAdjustments(
+        candidates=candidates,
+        adjustment_cost=adjustment_cost,
+        new_mark_price=calculate_mark_price(amm.base_asset_reserve, amm.quote_asset_reserve, candidates),
+        total_fee_minus_distributions=total_fee_minus_distributions,
+        is_valid=is_valid.astype(bool)
+    )
+    return curve_adjustments
+
+
+def calculate_k_adjustments(market, new_sqrt_k_candidates: Iterable[int]) -> CurveAdjustments:
+    """Evaluate changing the sqrt_k of a market to each of many candidates (AMM_RESERVE_PRECISION).
+
+    A candidate is valid when it does not shrink sqrt_k by more than the clearing house allows in one update and
+    the fee pool can pay for it.
+
+    :param market: The DriftMarket to update.
+    :param new_sqrt_k_candidates: The candidate values of sqrt_k."""
+    amm = market.amm
+    candidates = to_exact_array(new_sqrt_k_candidates)
+    adjustment_cost = _per_candidate(calculate_adjust_k_cost(
+        market_base_asset_amount=market.base_asset_amount,
+        base_asset_reserve=amm.base_asset_reserve,
+        quote_asset_reserve=amm.quote_asset_reserve,
+        sqrt_k=amm.sqrt_k,
+        peg_multiplier=amm.peg_multiplier,
+        new_sqrt_k=candidates
+    ), candidates)
+    new_base_asset_reserve, new_quote_asset_reserve = calculate_adjust_k_reserves(
+        amm.base_asset_reserve, amm.quote_asset_reserve, amm.sqrt_k, candidates
+    )
+    total_fee_minus_distributions = _total_fee_minus_distributions_after(market, adjustment_cost)
+    is_valid = is_valid_k_adjustment(amm.sqrt_k, candidates) & (total_fee_minus_distributions >= 0)
+    curve_adjustments = CurveAdjustments(
+        candidates=candidates,
+        adjustment_cost=adjustment_cost,
+        new_mark_price=calculate_mark_price(new_base_asset_reserve, new_quote_asset_reserve, amm.peg_multiplier),
+        total_fee_minus_distributions=total_fee_minus_distributions,
+        is_valid=is_valid.astype(bool)
+    )
+    return curve_adjustments
+
+
+def find_optimal_repeg(market, new_peg_candidates: Iterable[int], target_price: int) -> Optional[int]:
+    """Pick the valid candidate peg that brings the mark price closest to a target, e.g. the oracle price.
+
+    Ties are broken by the lower adjustment cost. Returns None if no candidate is valid.
+
+    :param market: The DriftMarket to repeg.
+    :param new_peg_candidates: The candidate peg multipliers (PEG_PRECISION).
+    :param target_price: The target mark price (MARK_PRICE_PRECISION)."""
+    adjustments = calculate_repeg_adjustments(market=market, new_peg_candidates=new_peg_candidates)
+    valid = np.flatnonzero(adjustments.is_valid)
+    if len(valid) == 0:
+        return None
+    distance = abs(adjustments.new_mark_price[valid] - target_price)
+    order = np.lexsort((adjustments.adjustment_cost[valid].astype(float), distance.astype(float)))
+    return int(adjustments.candidates[valid[order[0]]])
@@ -0,0 +1,164 @@
+"""Precomputed trade-size to fill-price tables for the drift AMMs."""
+from typing import Dict, Literal, Optional, Tuple
+
+import numpy as np
+
+from sdk.constants import QUOTE_PRECISION, MARK_PRICE_PRECISION
+from sdk.math.amm import to_exact_array, calculate_mark_price, calculate_trade_slippage, reserve_to_asset_amount
+from sdk.utils import position_direction
+
+DEFAULT_MIN_QUOTE_SIZE = 1
+DEFAULT_MAX_QUOTE_SIZE = 10_000_000
+DEFAULT_NUMBER_OF_SIZES = 256
+# shorts remove quote asset from the pool, so their sizes stop short of draining it
+MAX_SHORT_SHARE_OF_QUOTE_RESERVE = 0.99
+
+
+def get_amm_key(amm) -> Tuple[int, int, int, int]:
+    """The AMM fields a slippage table depends on."""
+    return amm.base_asset_reserve, amm.quote_asset_reserve, amm.sqrt_k, amm.peg_multiplier
+
+
+class SlippageTable:
+    """Fill prices of one AMM over a geometric grid of quote trade sizes.
+
+    Sizes are in quote asset (e.g. USDC) and prices are floats in quote per base. Lookups interpolate linearly
+    between grid points with a binary search, so they cost O(log n); fill prices of sizes beyond the grid are
+    computed exactly rather than clamped to its last point."""
+
+    def __init__(
+            self, amm_key: Tuple[int, int, int, int], mark_price: float, long_quote_sizes: np.ndarray,
+            long_fill_prices: np.ndarray, short_quote_sizes: np.ndarray, short_fill_prices: np.ndarray
+    ) -> None:
+        self.amm_key = amm_key
+        self.mark_price = mark_price
+        self.long_quote_sizes = long_quote_sizes
+        self.long_fill_prices = long_fill_prices
+        self.short_quote_sizes = short_quote_sizes
+        self.short_fill_prices = short_fill_prices
+        # short fill prices fall with size, keep them ascending for the inverse lookup
+        self._short_fill_prices_ascending = short_fill_prices[::-1]
+        self._short_quote_sizes_by_price = short_quote_sizes[::-1]
+
+    @classmethod
+    def from_amm(
+            cls, amm, min_quote_size: float = DEFAULT_MIN_QUOTE_SIZE, max_quote_size: float = DEFAULT_MAX_QUOTE_SIZE,
+            number_of_sizes: int = DEFAULT_NUMBER_OF_SIZES
+    ):
+        """Build the table of a drift AMM with the exact on-chain swap math.
+
+        :param amm: The DriftAmm of the market.
+        :param min_quote_size: The smallest trade size in the grid, in quote asset.
+        :param max_quote_size: The largest trade size in the grid, in quote asset.
+        :param number_of_sizes: The number of grid points besides the zero-size trade."""
+        base_asset_reserve, quote_asset_reserve, sqrt_k, peg_multiplier = get_amm_key(amm)
+        mark_price = calculate_mark_price(base_asset_reserve, quote_asset_reserve, peg_multiplier)
+        grid = np.concatenate([[0], np.geomspace(min_quote_size, max_quote_size, number_of_sizes)])
+        quote_reserve_value = reserve_to_asset_amount(quote_asset_reserve, peg_multiplier) / QUOTE_PRECISION
+        short_grid = grid[grid < quote_reserve_value * MAX_SHORT_SHARE_OF_QUOTE_RESERVE]
+
+        def fill_prices(direction: int, quote_sizes: np.ndarray) -> np.ndarray:
+            # the zero-size trade fills at the mark price, only the sizes after it are swapped
+            quote_asset_amounts = to_exact_array(np.round(quote_sizes[1:] * QUOTE_PRECISION))
+            _, entry_prices, _, _ = calculate_trade_slippage(
+                direction=np.full(len(quote_asset_amounts), direction),
+                quote_asset_amount=quote_asset_amounts,
+                base_asset_reserve=base_asset_reserve,
+                quote_asset_reserve=quote_asset_reserve,
+                sqrt_k=sqrt_k,
+                peg_multiplier=peg_multiplier
+            )
+            return np.concatenate([[mark_price], entry_prices]).astype(float) / MARK_PRICE_PRECISION
+
+        slippage_table = cls(
+            amm_key=get_amm_key(amm),
+            mark_price=mark_price / MARK_PRICE_PRECISION,
+            long_quote_sizes=grid,
+            long_fill_prices=fill_prices(position_direction('long'), grid),
+            short_quote_sizes=short_grid,
+            short_fill_prices=fill_prices(position_direction('short'), short_grid)
+        )
+        return slippage_table
+
+    def fill_price(self, quote_size: float, direction: Literal['long', 'short']) -> float:
+        """Get the average fill price of a trade of a given quote size.
+
+        Sizes beyond the largest of the table are priced with the exact swap math instead, which costs as much as a
+        swap and raises when the trade is too large for the pool."""
+        if direction == 'long':
+            quote_sizes, fill_prices = self.long_quote_sizes, self.long_fill_prices
+        else:
+            quote_sizes, fill_prices = self.short_quote_sizes, self.short_fill_prices
+        if quote_size > quote_sizes[-1]:
+            return self._calculate_fill_price(quote_size, direction)
+        return float(np.interp(quote_size, quote_sizes, fill_prices))
+
+    def _calculate_fill_price(self, quote_size: float, direction: Literal['long', 'short']) -> float:
+        base_asset_reserve, quote_asset_reserve, sqrt_k, peg_multiplier = self.amm_key
+        _, entry_price, _, _ = calculate_trade_slippage(
+            direction=position_direction(direction),
+            quote_asset_amount=int(round(quote_size * QUOTE_PRECISION)),
+            base_asset_reserve=base_asset_reserve,
+            quote_asset_reserve=quote_asset_reserve,
+            sqrt_k=sqrt_k,
+            peg_multiplier=peg_multiplier
+        )
+        return entry_price / MARK_PRICE_PRECISION
+
+    def price_impact(self, quote_size: float, direction: Literal['long', 'short']) -> float:
+        """Get the fill price of a trade relative to the mark price, e.g. 0.01 for 1%."""
+        return self.fill_price(quote_size, direction) / self.mark_price - 1
+
+    def size_for_price(self, fill_price: float, direction: Literal['long', 'short']) -> float:
+        """Get the largest quote size that fills at no worse than a target average price.
+
+        Prices better than the mark give zero, prices beyond the table give its largest size."""
+        if direction == 'long':
+            return float(np.interp(fill_price, self.long_fill_prices, self.long_quote_sizes))
+        return float(np.interp(fill_price, self._short_fill_prices_ascending, self._short_quote_sizes_by_price))
+
+
+class SlippageTables:
+    """Slippage tables of all drift markets, rebuilt only when a market's AMM curve changes."""
+
+    def __init__(
+            self, min_quote_size: float = DEFAULT_MIN_QUOTE_SIZE, max_quote_size: float = DEFAULT_MAX_QUOTE_SIZE,
+            number_of_sizes: int = DEFAULT_NUMBER_OF_SIZES
+    ) -> None:
+        self.min_quote_size = min_quote_size
+        self.max_quote_size = max_quote_size
+        self.number_of_sizes = number_of_sizes
+        self.tables: Dict[int, SlippageTable] = {}
+
+    def update(self, drift_markets) -> Dict[int, bool]:
+        """Refresh the tables from a DriftMarkets account.
+
+        :return: For every initialized market index, whether its table was rebuilt."""
+        rebuilt = {}
+        for market_index, market in enumerate(drift_markets.markets):
+            if not market.initialized or market.amm.base_asset_reserve == 0:
+                continue
+            table = self.tables.get(market_index)
+            if table is not None and table.amm_key == get_amm_key(market.amm):
+                rebuilt[market_index] = False
+                continue
+            self.tables[market_index] = SlippageTable.from_amm(
+                amm=market.amm,
+                min_quote_size=self.min_quote_size,
+                max_quote_size=self.max_quote_size,
+                number_of_sizes=self.number_of_sizes
+            )
+            rebuilt[market_index] = True
+        return rebuilt
+
+    def get(self, market_index: int) -> Optional[SlippageTable]:
+        """Get the table of a market, if it has been built."""
+        return self.tables.get(market_index)
+
+    def fill_price(self, market_index: int, quote_size: float, direction: Literal['long', 'short']) -> float:
+        """Get the average fill price of a trade on a market."""
+        return self.tables[market_index].fill_price(quote_size, direction)
+
+    def size_for_price(self, market_index: int, fill_price: float, direction: Literal['long', 'short']) -> float:
+        """Get the largest quote size on a market that fills at no worse than a target average price."""
+        return self.tables[market_index].size_for_price(fill_price, direction)
@@ -0,0 +1,129 @@
+"""Delta reconciliation of program accounts by data hash and slot."""
+import hashlib
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple, Type, Union
+
+from solana.publickey import PublicKey
+from solana.rpc.async_api import AsyncClient as SolanaClient
+
+from sdk.calls.asynchronous import load_program_accounts_bytes
+from sdk.state.core import ElementCore
+from sdk.state.user import UserAccount, UserPositions
+
+RECONCILED_ACCOUNTS = {
+    'User': UserAccount,
+    'UserPositions': UserPositions
+}
+
+
+def hash_account_data(data: bytes) -> bytes:
+    """Get a short digest of account data to detect changes."""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class AccountChange(NamedTuple):
+    """An account that was created, changed or closed since the previous refresh."""
+    pubkey: str
+    account_name: str
+    slot: Optional[int]
+    previous: Optional[ElementCore]
+    current: Optional[ElementCore]
+
+
+class AccountReconciler:
+    """Keeps decoded user accounts and positions in sync with the chain.
+
+    Every refresh still lists all accounts, but only hashes their bytes; accounts are re-decoded, and change events
+    emitted, only for the ones whose bytes changed, so the CPU spent scales with churn rather than population."""
+
+    def __init__(self, account_classes: Optional[Dict[str, Type[ElementCore]]] = None) -> None:
+        self.account_classes = account_classes or RECONCILED_ACCOUNTS
+        # pubkey -> (data hash, slot at which the data was read)
+        self.hashes: Dict[str, Tuple[bytes, Optional[int]]] = {}
+        self.account_names: Dict[str, str] = {}
+        self.accounts: Dict[str, ElementCore] = {}
+        self.listeners: List[Callable[[AccountChange], None]] = []
+        self._snapshot = None
+
+    def subscribe(self, listener: Callable[[AccountChange], None]) -> None:
+        """Call a function with every change event."""
+        self.listeners.append(listener)
+
+    def get(self, pubkey: Union[PublicKey, str]) -> Optional[ElementCore]:
+        """Get the latest decoded account."""
+        key = pubkey.__str__()
+        if key not in self.accounts and self._snapshot is not None and key in self._snapshot:
+            self.accounts[key] = self._snapshot.get(key)
+        return self.accounts.get(key)
+
+    def pubkeys(self, account_name: Optional[str] = None) -> List[str]:
+        """Get the tracked public keys, optionally only those of one account type."""
+        return [pubkey for pubkey, name in self.account_names.items() if account_name in (None, name)]
+
+    def seed_from_snapshot(self, reader) -> None:
+        """Start from a snapshot (see sdk.archive.snapshot), so the first refresh only decodes what changed since.
+
+        Accounts of the snapshot are decoded lazily when asked for.
+
+        :param reader: An open SnapshotReader, which must stay open while the reconciler uses it."""
+        self._snapshot = reader
+        class_names = {account_class.__name__: name for name, account_class in self.account_classes.items()}
+        for kind, account_name in class_names.items():
+            for pubkey in reader.pubkeys(kind=kind):
+                self.hashes[pubkey] = (hash_account_data(reader.raw(pubkey)), reader.slot)
+                self.account_names[pubkey] = account_name
+
+    def apply(
+            self, account_name: str, accounts: Iterable[Tuple[Union[PublicKey, str], bytes]],
+            slot: Optional[int] = None, complete: bool = True
+    ) -> List[AccountChange]:
+        """Reconcile freshly read account data with the local state.
+
+        :param account_name: The anchor name of the account type, e.g. 'User'.
+        :param accounts: The public key and raw data of each account.
+        :param slot: The slot at which the data was read.
+        :param complete: Whether the accounts are all accounts of the type, so that missing ones were closed.
+        :return: The change events, which are also sent to the listeners."""
+        account_class = self.account_classes[account_name]
+        changes = []
+        seen = set()
+        for pubkey, data in accounts:
+            key = pubkey.__str__()
+            seen.add(key)
+            data_hash = hash_account_data(data)
+            known = self.hashes.get(key)
+            if known is not None and known[0] == data_hash:
+                self.hashes[key] = (data_hash, slot)
+                continue
+            previous = self.get(key) if known is not None else None
+            current = account_class.parse(bytes_data=data)
+            self.hashes[key] = (data_hash, slot)
+            self.account_names[key] = account_name
+            self.accounts[key] = current
+            changes.append(AccountChange(key, account_name, slot, previous, current))
+        if complete:
+            for key in self.pubkeys(account_name=account_name):
+                if key not in seen:
+                    changes.append(AccountChange(key, account_name, slot, self.get(key), None))
+                    del self.hashes[key]
+                    del self.account_names[key]
+                    self.accounts.pop(key, None)
+        for change in changes:
+            for listener in self.listeners:
+                listener(change)
+        return changes
+
+    async def refresh(self, client: SolanaClient) -> List[AccountChange]:
+        """List every tracked account type from the chain and reconcile it.
+
+        :param client: Solana client object.
+        :return: The change events."""
+        slot_resp = await client.get_slot()
+        slot = slot_resp.get('result')
+        changes = []
+        for account_name in self.account_classes:
+            accounts = await load_program_accounts_bytes(
+                client=client,
+                account_name=account_name
+            )
+            changes += self.apply(account_name=account_name, accounts=accounts, slot=slot)
+        return changes
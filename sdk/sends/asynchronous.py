@@ -10,7 +10,9 @@ from solana.keypair import Keypair
 
 from sdk.constants import *
 from sdk.instructions.all import *
-from sdk.utils import get_user_account_address
+from sdk.math.funding import UnsettledFunding
+from sdk.utils import get_user_account_address, pack_transaction_instructions
+from sdk import instrumentation
 
 
 async def sign_and_send_transaction_instructions(
@@ -24,13 +26,14 @@ async def sign_and_send_transaction_instructions(
     transaction = Transaction()
     transaction.fee_payer = keypair.public_key
     transaction.add(*transaction_instructions)
-    response = await client.send_transaction(
-        transaction,
-        *signers,
-        opts=TxOpts(
-            preflight_commitment=commitment
+    with instrumentation.collector.measure(instrumentation.NETWORK, 'send_transaction'):
+        response = await client.send_transaction(
+            transaction,
+            *signers,
+            opts=TxOpts(
+                preflight_commitment=commitment
+            )
         )
-    )
     return response
 
 
@@ -143,17 +146,20 @@ async def send_deposit_collateral(
 
 
 async def send_liquidate(
-        client: SolanaClient, commitment: Commitment, wallet: Keypair, liquidator: PublicKey, user_positions: PublicKey
+        client: SolanaClient, commitment: Commitment, wallet: Keypair, user: PublicKey, user_positions: PublicKey
 ) -> RPCResponse:
-    """Send a liquidate instruction."""
+    """Send a liquidate instruction, with the user-account of the wallet as liquidator.
+
+    :param user: The user-account to liquidate.
+    :param user_positions: The positions account of the user-account to liquidate."""
     instruction_object = LiquidateInstruction()
-    user = get_user_account_address(
+    liquidator = get_user_account_address(
         authority=wallet.public_key
     )
     transaction_instruction = instruction_object.get_instruction(
         state=CLEARING_HOUSE_ADDRESSES.state,
         authority=wallet.public_key,
-        liquidator=PublicKey,
+        liquidator=liquidator,
         user=user,
         collateral_vault=CLEARING_HOUSE_ADDRESSES.collateral_vault,
         collateral_vault_authority=CLEARING_HOUSE_ADDRESSES.collateral_vault_authority,
@@ -163,6 +169,7 @@ async def send_liquidate(
         markets=CLEARING_HOUSE_ADDRESSES.markets,
         user_positions=user_positions,
         trade_history=CLEARING_HOUSE_ADDRESSES.history.trade,
+        liquidation_history=CLEARING_HOUSE_ADDRESSES.history.liquidation,
         funding_payment_history=CLEARING_HOUSE_ADDRESSES.history.funding_payment,
         program_id=CLEARING_HOUSE_ADDRESSES.program
     )
@@ -235,6 +242,44 @@ async def send_settle_funding_payment(
     return rpc_response
 
 
+async def send_settle_funding_payments(
+        client: SolanaClient, commitment: Commitment, wallet: Keypair, users: List[UnsettledFunding],
+        max_instructions_per_transaction: int = MAX_SETTLE_FUNDING_PAYMENTS_PER_TRANSACTION
+) -> List[RPCResponse]:
+    """Settle the funding payments of many users, packing their instructions into as few transactions as fit.
+
+    Settling is open to anyone, the wallet only pays the transaction fees.
+
+    :param users: The users to settle, as ranked by sdk.math.funding.get_unsettled_funding; only their user-account
+    and positions account addresses are used.
+    :param max_instructions_per_transaction: The most settlements in one transaction.
+    :return: The responses, one per transaction, sent concurrently."""
+    transaction_instructions = [
+        SettleFundingPaymentInstruction().get_instruction(
+            state=CLEARING_HOUSE_ADDRESSES.state,
+            user=unsettled_funding.user,
+            markets=CLEARING_HOUSE_ADDRESSES.markets,
+            user_positions=unsettled_funding.user_positions,
+            funding_payment_history=CLEARING_HOUSE_ADDRESSES.history.funding_payment,
+            program_id=CLEARING_HOUSE_ADDRESSES.program
+        ) for unsettled_funding in users
+    ]
+    batches = pack_transaction_instructions(
+        transaction_instructions=transaction_instructions,
+        fee_payer=wallet.public_key,
+        max_instructions=max_instructions_per_transaction
+    )
+    rpc_responses = await asyncio.gather(*[
+        sign_and_send_transaction_instructions(
+            client=client,
+            keypair=wallet,
+            transaction_instructions=batch,
+            commitment=commitment
+        ) for batch in batches
+    ])
+    return list(rpc_responses)
+
+
 async def send_withdraw_collateral(
         client: SolanaClient, commitment: Commitment, wallet: Keypair, amount: int, user_positions: PublicKey,
         user_collateral_account: PublicKey
@@ -1,6 +1,8 @@
+"""Synchronous functions to send instructions to the blockchain, to be executed by the Drift protocol."""
 from typing import List
 
 from solana.rpc.api import Client
+from solana.rpc.commitment import Commitment
 from solana.transaction import TransactionInstruction, Transaction
 from solana.rpc.types import TxOpts, RPCResponse
 from solana.publickey import PublicKey
@@ -8,28 +10,58 @@ from solana.keypair import Keypair
 
 from sdk.constants import *
 from sdk.instructions.all import *
-from sdk.utils import get_user_account_address
+from sdk.math.funding import UnsettledFunding
+from sdk.utils import get_user_account_address, pack_transaction_instructions
+from sdk import instrumentation
 
 
-def sign_and_send_transaction_instructions(client: Client, keypair: Keypair,
-                                           transaction_instructions: List[TransactionInstruction]) -> RPCResponse:
+def sign_and_send_transaction_instructions(
+        client: Client,
+        keypair: Keypair,
+        commitment: Commitment,
+        transaction_instructions: List[TransactionInstruction]
+) -> RPCResponse:
+    """Sign a transaction instruction and send it."""
     signers = [keypair]
     transaction = Transaction()
     transaction.fee_payer = keypair.public_key
     transaction.add(*transaction_instructions)
-    transaction_options = TxOpts(
-        preflight_commitment='single'
+    with instrumentation.collector.measure(instrumentation.NETWORK, 'send_transaction'):
+        response = client.send_transaction(
+            transaction,
+            *signers,
+            opts=TxOpts(
+                preflight_commitment=commitment
+            )
+        )
+    return response
+
+
+def send_initialize(
+        client: Client, wallet: Keypair, commitment: Commitment, clearing_house_nonce: int,
+        collateral_vault_nonce: int, insurance_vault_nonce: int, admin_controls_prices: int, admin: PublicKey
+) -> RPCResponse:
+    """Send an initialize instruction."""
+    instruction_object = InitializeInstruction(
+        clearing_house_nonce=clearing_house_nonce,
+        collateral_vault_nonce=collateral_vault_nonce,
+        insurance_vault_nonce=insurance_vault_nonce,
+        admin_controls_prices=admin_controls_prices
     )
-    response = client.send_transaction(
-        transaction,
-        *signers,
-        opts=transaction_options
+    transaction_instruction = instruction_object.get_instruction(
+        admin=admin
     )
-    return response
+    rpc_response = sign_and_send_transaction_instructions(
+        client=client,
+        keypair=wallet,
+        transaction_instructions=[transaction_instruction],
+        commitment=commitment
+    )
+    return rpc_response
 
 
 def send_close_position(
-        client: Client, wallet: Keypair, market_index: int, user_positions: PublicKey
+        client: Client, commitment: Commitment, wallet: Keypair, market_index: int, user_positions: PublicKey
 ) -> RPCResponse:
     """Send a close-position instruction."""
     instruction_object = ClosePositionInstruction(
@@ -51,12 +83,16 @@ def send_close_position(
     rpc_response = sign_and_send_transaction_instructions(
         client=client,
         keypair=wallet,
-        transaction_instructions=[transaction_instruction]
+        transaction_instructions=[transaction_instruction],
+        commitment=commitment
     )
     return rpc_response
 
 
-def send_delete_user(client: Client, wallet: Keypair, user_positions: PublicKey) -> RPCResponse:
+def send_delete_user(
+        client: Client, commitment: Commitment, wallet: Keypair, user_positions: PublicKey
+) -> RPCResponse:
+    """Send a delete-user instruction."""
     instruction_object = DeleteUserInstruction()
     user = get_user_account_address(
         authority=wallet.public_key
@@ -70,14 +106,18 @@ def send_delete_user(client: Client, wallet: Keypair, user_positions: PublicKey)
     rpc_response = sign_and_send_transaction_instructions(
         client=client,
         keypair=wallet,
-        transaction_instructions=transaction_instruction
+        transaction_instructions=[transaction_instruction],
+        commitment=commitment
     )
     return rpc_response
 
 
-def send_deposit_collateral(client: Client, wallet: Keypair, amount: int, user_collateral_account: PublicKey,
-                            user_positions: PublicKey) -> RPCResponse:
-    instruction_object = DepositCollateralInstruction(
+def send_deposit_collateral(
+        client: Client, commitment: Commitment, wallet: Keypair, amount: int, user_collateral_account: PublicKey,
+        user_positions: PublicKey
+) -> RPCResponse:
+    """Send a deposit-collateral instruction."""
+    instruction_object = DepositCollateralInstruction.from_user_precision(
         amount=amount
     )
     user = get_user_account_address(
@@ -86,7 +126,7 @@ def send_deposit_collateral(client: Client, wallet: Keypair, amount: int, user_c
     transaction_instruction = instruction_object.get_instruction(
         state=CLEARING_HOUSE_ADDRESSES.state,
         user=user,
-        authority=wallet,
+        authority=wallet.public_key,
         collateral_vault=CLEARING_HOUSE_ADDRESSES.collateral_vault,
         user_collateral_account=user_collateral_account,
         token_program=TOKEN_PROGRAM_ID,
@@ -99,20 +139,27 @@ def send_deposit_collateral(client: Client, wallet: Keypair, amount: int, user_c
     rpc_response = sign_and_send_transaction_instructions(
         client=client,
         keypair=wallet,
-        transaction_instructions=[transaction_instruction]
+        transaction_instructions=[transaction_instruction],
+        commitment=commitment
     )
     return rpc_response
 
 
-def send_liquidate(client: Client, wallet: Keypair, liquidator: PublicKey, user_positions: PublicKey) -> RPCResponse:
+def send_liquidate(
+        client: Client, commitment: Commitment, wallet: Keypair, user: PublicKey, user_positions: PublicKey
+) -> RPCResponse:
+    """Send a liquidate instruction, with the user-account of the wallet as liquidator.
+
+    :param user: The user-account to liquidate.
+    :param user_positions: The positions account of the user-account to liquidate."""
     instruction_object = LiquidateInstruction()
-    user = get_user_account_address(
+    liquidator = get_user_account_address(
         authority=wallet.public_key
     )
     transaction_instruction = instruction_object.get_instruction(
         state=CLEARING_HOUSE_ADDRESSES.state,
         authority=wallet.public_key,
-        liquidator=PublicKey,
+        liquidator=liquidator,
         user=user,
         collateral_vault=CLEARING_HOUSE_ADDRESSES.collateral_vault,
         collateral_vault_authority=CLEARING_HOUSE_ADDRESSES.collateral_vault_authority,
@@ -122,21 +169,25 @@ def send_liquidate(client: Client, wallet: Keypair, liquidator: PublicKey, user_
         markets=CLEARING_HOUSE_ADDRESSES.markets,
         user_positions=user_positions,
         trade_history=CLEARING_HOUSE_ADDRESSES.history.trade,
+        liquidation_history=CLEARING_HOUSE_ADDRESSES.history.liquidation,
         funding_payment_history=CLEARING_HOUSE_ADDRESSES.history.funding_payment,
         program_id=CLEARING_HOUSE_ADDRESSES.program
     )
     rpc_response = sign_and_send_transaction_instructions(
         client=client,
         keypair=wallet,
-        transaction_instructions=[transaction_instruction]
+        transaction_instructions=[transaction_instruction],
+        commitment=commitment
     )
     return rpc_response
 
 
-def send_open_position(client: Client, wallet: Keypair, direction: int, quote_asset_amount: int, market_index: int,
-                       limit_price: int, user_positions: PublicKey) -> RPCResponse:
-    instruction_object = OpenPositionInstruction(
-        name='openP',
+def send_open_position(
+        client: Client, commitment: Commitment, wallet: Keypair, direction: int, quote_asset_amount: int,
+        market_index: int, limit_price: int, user_positions: PublicKey
+) -> RPCResponse:
+    """Send an open-position instruction."""
+    instruction_object = OpenPositionInstruction.from_user_precision(
         direction=direction,
         quote_asset_amount=quote_asset_amount,
         market_index=market_index,
@@ -160,12 +211,16 @@ def send_open_position(client: Client, wallet: Keypair, direction: int, quote_as
     rpc_response = sign_and_send_transaction_instructions(
         client=client,
         keypair=wallet,
-        transaction_instructions=[transaction_instruction]
+        transaction_instructions=[transaction_instruction],
+        commitment=commitment
     )
     return rpc_response
 
 
-def send_settle_funding_payment(client: Client, wallet: Keypair, user_positions: PublicKey) -> RPCResponse:
+def send_settle_funding_payment(
+        client: Client, commitment: Commitment, wallet: Keypair, user_positions: PublicKey
+) -> RPCResponse:
+    """Send a settle-funding-payment instruction."""
     instruction_object = SettleFundingPaymentInstruction()
     user = get_user_account_address(
         authority=wallet.public_key
@@ -181,14 +236,56 @@ def send_settle_funding_payment(client: Client, wallet: Keypair, user_positions:
     rpc_response = sign_and_send_transaction_instructions(
         client=client,
         keypair=wallet,
-        transaction_instructions=transaction_instruction
+        transaction_instructions=[transaction_instruction],
+        commitment=commitment
     )
     return rpc_response
 
 
-def send_withdraw_collateral(client: Client, wallet: Keypair, amount: int, user_positions: PublicKey,
-                        user_collateral_account: PublicKey) -> RPCResponse:
-    instruction_object = WithdrawCollateralInstruction(
+def send_settle_funding_payments(
+        client: Client, commitment: Commitment, wallet: Keypair, users: List[UnsettledFunding],
+        max_instructions_per_transaction: int = MAX_SETTLE_FUNDING_PAYMENTS_PER_TRANSACTION
+) -> List[RPCResponse]:
+    """Settle the funding payments of many users, packing their instructions into as few transactions as fit.
+
+    Settling is open to anyone, the wallet only pays the transaction fees.
+
+    :param users: The users to settle, as ranked by sdk.math.funding.get_unsettled_funding; only their user-account
+    and positions account addresses are used.
+    :param max_instructions_per_transaction: The most settlements in one transaction.
+    :return: The responses, one per transaction."""
+    transaction_instructions = [
+        SettleFundingPaymentInstruction().get_instruction(
+            state=CLEARING_HOUSE_ADDRESSES.state,
+            user=unsettled_funding.user,
+            markets=CLEARING_HOUSE_ADDRESSES.markets,
+            user_positions=unsettled_funding.user_positions,
+            funding_payment_history=CLEARING_HOUSE_ADDRESSES.history.funding_payment,
+            program_id=CLEARING_HOUSE_ADDRESSES.program
+        ) for unsettled_funding in users
+    ]
+    batches = pack_transaction_instructions(
+        transaction_instructions=transaction_instructions,
+        fee_payer=wallet.public_key,
+        max_instructions=max_instructions_per_transaction
+    )
+    rpc_responses = [
+        sign_and_send_transaction_instructions(
+            client=client,
+            keypair=wallet,
+            transaction_instructions=batch,
+            commitment=commitment
+        ) for batch in batches
+    ]
+    return rpc_responses
+
+
+def send_withdraw_collateral(
+        client: Client, commitment: Commitment, wallet: Keypair, amount: int, user_positions: PublicKey,
+        user_collateral_account: PublicKey
+) -> RPCResponse:
+    """Send a withdraw-collateral instruction."""
+    instruction_object = WithdrawCollateralInstruction.from_user_precision(
         amount=amount
     )
     user = get_user_account_address(
@@ -213,7 +310,7 @@ def send_withdraw_collateral(client: Client, wallet: Keypair, amount: int, user_
     rpc_response = sign_and_send_transaction_instructions(
         client=client,
         keypair=wallet,
-        transaction_instructions=transaction_instruction
+        transaction_instructions=[transaction_instruction],
+        commitment=commitment
     )
     return rpc_response
-
@@ -1,5 +1,16 @@
-"""Easy importing."""
-from sdk.state.history.all import *
-from sdk.state.clearing_house import ClearingHouseState
-from sdk.state.market import DriftMarket, DriftMarkets
-from sdk.state.user import UserAccount, UserPositions, MarketPosition
+"""Easy importing, each account class is imported on first use."""
+from sdk.lazy import lazy_attributes
+from sdk.state.history import all as history_all
+
+_ATTRIBUTE_MODULES = {
+    **{name: 'sdk.state.history.all' for name in history_all.__all__},
+    'ClearingHouseState': 'sdk.state.clearing_house',
+    'DriftMarket': 'sdk.state.market',
+    'DriftMarkets': 'sdk.state.market',
+    'UserAccount': 'sdk.state.user',
+    'UserPositions': 'sdk.state.user',
+    'MarketPosition': 'sdk.state.user'
+}
+
+__all__ = list(_ATTRIBUTE_MODULES)
+__getattr__, __dir__ = lazy_attributes(globals(), _ATTRIBUTE_MODULES)
@@ -4,6 +4,8 @@ from typing import Union
 from abc import ABC, abstractmethod
 from construct import Struct, Container
 
+from sdk import instrumentation
+
 class ElementCore(ABC):
     """Core functionality for modelling drift solana accounts."""
     layout: Struct = None
@@ -15,10 +17,16 @@ class ElementCore(ABC):
         pass
 
     @classmethod
-    def parse(cls, bytes_data: bytes):
-        """Create an object from bytes."""
-        container = cls.layout.parse(bytes_data)
-        obj = cls.from_container(container=container)
+    def parse(cls, bytes_data: Union[bytes, memoryview]):
+        """Create an object from bytes, or a memoryview of them."""
+        collector = instrumentation.collector
+        if not collector.enabled:
+            container = cls.layout.parse(bytes_data)
+            return cls.from_container(container=container)
+        with collector.measure(instrumentation.PARSE, cls.__name__):
+            container = cls.layout.parse(bytes_data)
+        with collector.measure(instrumentation.MATERIALIZE, cls.__name__):
+            obj = cls.from_container(container=container)
         return obj
 
     @abstractmethod
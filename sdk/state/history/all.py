@@ -1,7 +1,14 @@
-"""Easy importing."""
-from sdk.state.history.curve import CurveHistory
-from sdk.state.history.deposit import DepositHistory
-from sdk.state.history.funding_payment import FundingPaymentHistory
-from sdk.state.history.funding_rate import FundingRateHistory
-from sdk.state.history.liquidation import LiquidationHistory
-from sdk.state.history.trade import TradeHistory
+"""Easy importing, each history class is imported on first use."""
+from sdk.lazy import lazy_attributes
+
+_ATTRIBUTE_MODULES = {
+    'CurveHistory': 'sdk.state.history.curve',
+    'DepositHistory': 'sdk.state.history.deposit',
+    'FundingPaymentHistory': 'sdk.state.history.funding_payment',
+    'FundingRateHistory': 'sdk.state.history.funding_rate',
+    'LiquidationHistory': 'sdk.state.history.liquidation',
+    'TradeHistory': 'sdk.state.history.trade'
+}
+
+__all__ = list(_ATTRIBUTE_MODULES)
+__getattr__, __dir__ = lazy_attributes(globals(), _ATTRIBUTE_MODULES)
@@ -1,8 +1,34 @@
 """Core functionality for modelling history accounts."""
-from construct import Container
+from typing import Dict, List
+from construct import Container, FormatField, Flag, BytesInteger
+import numpy as np
+from solana.publickey import PublicKey
 
+from sdk.layouts import Base58EncodingLayout
 from sdk.state.core import ElementCore
 
+# the discriminator and the head precede the records
+HISTORY_HEADER_SIZE = 16
+
+
+def _record_dtype(record_layout) -> np.dtype:
+    """Get the packed NumPy dtype of a record layout, 128-bit integers split into low and high 64-bit words."""
+    fields = []
+    for subcon in record_layout.subcons:
+        field_layout = subcon.subcon
+        if isinstance(field_layout, BytesInteger):
+            fields.append((f'{subcon.name}_lo', '<u8'))
+            fields.append((f'{subcon.name}_hi', '<i8' if field_layout.signed else '<u8'))
+        elif isinstance(field_layout, Base58EncodingLayout):
+            fields.append((subcon.name, 'V32'))
+        elif field_layout is Flag:
+            fields.append((subcon.name, '?'))
+        elif isinstance(field_layout, FormatField):
+            fields.append((subcon.name, field_layout.fmtstr))
+        else:
+            raise Exception(f'Cannot decode field of type {field_layout}.')
+    return np.dtype(fields)
+
 
 class HistoryCore(ElementCore):
     """Object containing core functionality for modelling history accounts."""
@@ -19,3 +45,55 @@ class HistoryCore(ElementCore):
             'records': [record.to_dict() for record in self.records]
         }
         return my_dict
+
+    def ordered_records(self, skip_empty: bool = True) -> List[ElementCore]:
+        """Get the records of the ring buffer from oldest to newest.
+
+        :param skip_empty: Leave out slots that were never written (ts == 0)."""
+        records = self.records[self.head:] + self.records[:self.head]
+        if skip_empty:
+            records = [record for record in records if record.ts != 0]
+        return records
+
+    @classmethod
+    def decode_columns(cls, bytes_data, skip_empty: bool = True) -> Dict[str, np.ndarray]:
+        """Decode the records of a history account straight into columns, from oldest to newest, without building
+        record objects.
+
+        Int128 fields become exact integers in object arrays and public keys base58 strings, as in to_columns.
+
+        :param bytes_data: The raw account data, e.g. a memoryview into a snapshot.
+        :param skip_empty: Leave out slots that were never written (ts == 0)."""
+        record_layout = cls.layout.records.subcon.subcon
+        record_dtype = _record_dtype(record_layout)
+        head = int.from_bytes(bytes(bytes_data[8:HISTORY_HEADER_SIZE]), 'little')
+        count = (len(bytes_data) - HISTORY_HEADER_SIZE) // record_dtype.itemsize
+        records = np.frombuffer(bytes_data, dtype=record_dtype, count=count, offset=HISTORY_HEADER_SIZE)
+        records = np.concatenate([records[head:], records[:head]])
+        if skip_empty:
+            records = records[records['ts'] != 0]
+        columns = {}
+        for subcon in record_layout.subcons:
+            field_layout = subcon.subcon
+            if isinstance(field_layout, BytesInteger):
+                high = records[f'{subcon.name}_hi'].astype(object)
+                columns[subcon.name] = high * 2 ** 64 + records[f'{subcon.name}_lo'].astype(object)
+            elif isinstance(field_layout, Base58EncodingLayout):
+                # base58 encoding is slow and the same keys recur, so encode each distinct key once
+                keys, inverse = np.unique(records[subcon.name], return_inverse=True)
+                encoded = np.array([PublicKey(key.tobytes()).__str__() for key in keys], dtype=object)
+                columns[subcon.name] = encoded[inverse.reshape(-1)]
+            else:
+                columns[subcon.name] = records[subcon.name].copy()
+        return columns
+
+    def to_columns(self, skip_empty: bool = True) -> Dict[str, list]:
+        """Get the records from oldest to newest as columns, keyed by field name.
+
+        :param skip_empty: Leave out slots that were never written (ts == 0)."""
+        records = self.ordered_records(skip_empty=skip_empty)
+        field_names = [subcon.name for subcon in type(self.records[0]).layout.subcons]
+        columns = {
+            field_name: [getattr(record, field_name) for record in records] for field_name in field_names
+        }
+        return columns
@@ -22,7 +22,7 @@ class DepositRecord(ElementCore):
 
     def __init__(
             self, ts: int, record_id: int, user_authority: PublicKey, user: PublicKey, direction: int,
-            collateral_before: int, cumulative_deposits_before: int
+            collateral_before: int, cumulative_deposits_before: int, amount: int
     ) -> None:
         self.ts = ts
         self.record_id = record_id
@@ -31,6 +31,7 @@ class DepositRecord(ElementCore):
         self.direction = direction
         self.collateral_before = collateral_before
         self.cumulative_deposits_before = cumulative_deposits_before
+        self.amount = amount
 
     @classmethod
     def from_container(cls, container: Container):
@@ -42,7 +43,8 @@ class DepositRecord(ElementCore):
             user=container.user,
             direction=container.direction,
             collateral_before=container.collateral_before,
-            cumulative_deposits_before=container.cumulative_deposits_before
+            cumulative_deposits_before=container.cumulative_deposits_before,
+            amount=container.amount
         )
         return deposit_record
 
@@ -55,7 +57,8 @@ class DepositRecord(ElementCore):
             'user': self.user.__str__(),
             'direction': self.direction,
             'collateral_before': self.collateral_before,
-            'cumulative_deposits_before': self.cumulative_deposits_before
+            'cumulative_deposits_before': self.cumulative_deposits_before,
+            'amount': self.amount
         }
         return my_dict
 
@@ -1,7 +1,6 @@
 """This module models a funding-rate-history buffer account."""
 from construct import Int64ul, Int64sl, Struct, Container, Padding
 from typing import List
-from solana.publickey import PublicKey
 from sdk.layouts import Int128ul, Int128sl
 from sdk.state.core import ElementCore
 from sdk.state.history.core import HistoryCore
@@ -21,22 +20,17 @@ class FundingRateRecord(ElementCore):
     )
 
     def __init__(
-            self, ts: int, record_id: int, user_authority: PublicKey, user: PublicKey, market_index: int,
-            funding_payment: int, base_asset_amount: int, user_last_cumulative_funding: int,
-            user_last_funding_rate_ts: int, amm_cumulative_funding_long: int,
-            amm_cumulative_funding_short: int
+            self, ts: int, record_id: int, market_index: int, funding_rate: int, cumulative_funding_rate_long: int,
+            cumulative_funding_rate_short: int, oracle_price_twap: int, mark_price_twap: int
     ) -> None:
         self.ts = ts
         self.record_id = record_id
-        self.user_authority = user_authority
-        self.user = user
         self.market_index = market_index
-        self.funding_payment = funding_payment
-        self.base_asset_amount = base_asset_amount
-        self.user_last_cumulative_funding = user_last_cumulative_funding
-        self.user_last_funding_rate_ts = user_last_funding_rate_ts
-        self.amm_cumulative_funding_long = amm_cumulative_funding_long
-        self.amm_cumulative_funding_short = amm_cumulative_funding_short
+        self.funding_rate = funding_rate
+        self.cumulative_funding_rate_long = cumulative_funding_rate_long
+        self.cumulative_funding_rate_short = cumulative_funding_rate_short
+        self.oracle_price_twap = oracle_price_twap
+        self.mark_price_twap = mark_price_twap
 
     @classmethod
     def from_container(cls, container: Container):
@@ -44,15 +38,12 @@ class FundingRateRecord(ElementCore):
         funding_rate_record = cls(
             ts=container.ts,
             record_id=container.record_id,
-            user_authority=container.user_authority,
-            user=container.user,
             market_index=container.market_index,
-            funding_payment=container.funding_payment,
-            base_asset_amount=contianer.base_asset_amount,
-            user_last_cumulative_funding=container.user_last_cumulative_funding,
-            user_last_funding_rate_ts=container.user_last_funding_rate_ts,
-            amm_cumulative_funding_long=container.amm_cumulative_funding_long,
-            amm_cumulative_funding_short=container.amm_cumulative_funding_short
+            funding_rate=container.funding_rate,
+            cumulative_funding_rate_long=container.cumulative_funding_rate_long,
+            cumulative_funding_rate_short=container.cumulative_funding_rate_short,
+            oracle_price_twap=container.oracle_price_twap,
+            mark_price_twap=container.mark_price_twap
         )
         return funding_rate_record
 
@@ -61,15 +52,12 @@ class FundingRateRecord(ElementCore):
         my_dict = {
             'ts': self.ts,
             'record_id': self.record_id,
-            'user_authority': self.user_authority.__str__(),
-            'user': self.user.__str__(),
             'market_index': self.market_index,
-            'funding_payment': self.funding_payment,
-            'base_asset_amount': self.base_asset_amount,
-            'user_last_cumulative_funding': self.user_last_cumulative_funding,
-            'user_last_funding_rate_ts': self.user_last_funding_rate_ts,
-            'amm_cumulative_funding_long': self.amm_cumulative_funding_long,
-            'amm_cumulative_funding_short': self.amm_cumulative_funding_short
+            'funding_rate': self.funding_rate,
+            'cumulative_funding_rate_long': self.cumulative_funding_rate_long,
+            'cumulative_funding_rate_short': self.cumulative_funding_rate_short,
+            'oracle_price_twap': self.oracle_price_twap,
+            'mark_price_twap': self.mark_price_twap
         }
         return my_dict
 
@@ -56,7 +56,7 @@ class LiquidationRecord(ElementCore):
             ts=container.ts,
             record_id=container.record_id,
             user_authority=PublicKey(container.user_authority),
-            user=PublicKey(contianer.user),
+            user=PublicKey(container.user),
             partial=container.partial,
             base_asset_value=container.base_asset_value,
             base_asset_value_closed=container.base_asset_value_closed,
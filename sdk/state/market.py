@@ -117,9 +117,14 @@ class DriftAmm(ElementCore):
 
     def get_mark_price(self) -> float:
         """Get the current mark price in the AMM."""
-        unpegged_price = self.quote_asset_reserve / self.base_asset_reserve
-        pegged_price = unpegged_price * self.peg_multiplier
-        mark_price = pegged_price * PRICE_TO_PEG_PRECISION_RATIO / MARK_PRICE_PRECISION
+        # imported here so that parsing accounts does not pull in numpy
+        from sdk.math.amm import calculate_mark_price
+        exact_mark_price = calculate_mark_price(
+            base_asset_reserve=self.base_asset_reserve,
+            quote_asset_reserve=self.quote_asset_reserve,
+            peg_multiplier=self.peg_multiplier
+        )
+        mark_price = exact_mark_price / MARK_PRICE_PRECISION
         return mark_price
 
 
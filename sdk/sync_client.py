@@ -0,0 +1,316 @@
+"""Synchronous client to interact with the Drift protocol."""
+import base58
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple, Type
+from construct import Int8ul
+
+import requests
+from requests.adapters import HTTPAdapter
+from solana.publickey import PublicKey
+from solana.keypair import Keypair
+from solana.rpc.api import Client
+from solana.rpc.commitment import Commitment
+from solana.rpc.providers.http import HTTPProvider
+from solana.rpc.types import RPCMethod, RPCResponse
+
+from sdk.constants import *
+from sdk.state.all import *
+from sdk.state.core import ElementCore
+from sdk.calls.synchronous import *
+from sdk.sends.synchronous import *
+from sdk.utils import (
+    get_user_account_address, position_direction, get_collateral_account_address, get_market_index
+)
+
+DEFAULT_MAX_WORKERS = 8
+
+HISTORY_CLASSES = {
+    'curve': CurveHistory,
+    'deposit': DepositHistory,
+    'funding_payment': FundingPaymentHistory,
+    'funding_rate': FundingRateHistory,
+    'liquidation': LiquidationHistory,
+    'trade': TradeHistory
+}
+
+
+class SessionHTTPProvider(HTTPProvider):
+    """HTTP provider sending every request through one pooled requests.Session, so connections are reused."""
+
+    def __init__(self, endpoint: Optional[str] = None, pool_size: int = DEFAULT_MAX_WORKERS) -> None:
+        super().__init__(endpoint)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def make_request(self, method: RPCMethod, *params: Any) -> RPCResponse:
+        request_kwargs = self._before_request(method=method, params=params, is_async=False)
+        raw_response = self.session.post(**request_kwargs)
+        return self._after_request(raw_response=raw_response, method=method)
+
+    def close(self) -> None:
+        """Close the pooled connections."""
+        self.session.close()
+
+
+class SyncDriftClient:
+    """Synchronous client to interact with the drift protocol, with the same interface as DriftClient.
+
+    Reads of several accounts go out concurrently on a bounded thread pool."""
+
+    def __init__(
+            self, connector: Optional[Client], endpoint: Optional[str], commitment: Optional[Commitment],
+            wallet: Optional[Keypair], user_account: Optional[PublicKey], user_positions: Optional[PublicKey],
+            user_collateral_account: Optional[PublicKey], max_workers: int = DEFAULT_MAX_WORKERS
+    ) -> None:
+        self.connector = connector
+        self.endpoint = endpoint
+        self.commitment = Commitment(commitment)
+        self.wallet = wallet
+        self.user_account = user_account
+        self.user_positions = user_positions
+        self.user_collateral_account = user_collateral_account
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='drift')
+
+    @classmethod
+    def create(
+            cls, private_key: str or List[int], endpoint: str = MAINNET_ENDPOINT,
+            commitment: Commitment = CONFIRMED, max_workers: int = DEFAULT_MAX_WORKERS
+    ):
+        """Instantiate a synchronous Drift-client from a private key.
+
+        :param private_key: The private key of the wallet, either as a string (e.g., Phantom) or a list of 8-bit
+        integers (e.g., Solflare).
+        :param endpoint: The http endpoint of the rpc node to which instructions are to be sent.
+        :param commitment: The Solana-commitment object specifying the validity of state, see Solana docs for
+        more info.
+        :param max_workers: The number of concurrent requests, and of pooled connections."""
+        if type(private_key) == str:
+            private_key_bytes = base58.b58decode(private_key.encode('utf-8'))
+        elif type(private_key) == list:
+            private_key_bytes = Int8ul[64].build(private_key)
+        else:
+            raise Exception('Invalid private key.')
+
+        wallet_keypair = Keypair.from_secret_key(
+            secret_key=private_key_bytes
+        )
+        connector = Client(
+            endpoint=endpoint,
+            commitment=commitment
+        )
+        connector._provider = SessionHTTPProvider(
+            endpoint=endpoint,
+            pool_size=max_workers
+        )
+        user_account_address = get_user_account_address(
+            authority=wallet_keypair.public_key
+        )
+        user_account = call_user_account(
+            client=connector,
+            address=user_account_address
+        )
+        user_positions_address = user_account.positions_account
+        user_collateral_account_address = get_collateral_account_address(
+            authority=wallet_keypair.public_key
+        )
+        drift_client = cls(
+            connector=connector,
+            endpoint=endpoint,
+            commitment=commitment,
+            wallet=wallet_keypair,
+            user_account=user_account_address,
+            user_positions=user_positions_address,
+            user_collateral_account=user_collateral_account_address,
+            max_workers=max_workers
+        )
+        return drift_client
+
+    def close(self) -> None:
+        """Close connections and stop the thread pool."""
+        self.executor.shutdown(wait=True)
+        if isinstance(self.connector._provider, SessionHTTPProvider):
+            self.connector._provider.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    """CONCURRENT READS"""
+
+    def map_calls(self, calls: List[Tuple[Callable, PublicKey]]) -> list:
+        """Run account calls, e.g. (call_markets, address), concurrently and return their results in order."""
+        futures = [
+            self.executor.submit(call, client=self.connector, address=address) for call, address in calls
+        ]
+        return [future.result() for future in futures]
+
+    def get_accounts(self, account_class: Type[ElementCore], addresses: List[PublicKey]) -> List[ElementCore]:
+        """Get many accounts of one type concurrently.
+
+        :param account_class: The class to parse the accounts with, e.g. UserPositions.
+        :param addresses: The public addresses of the accounts."""
+        futures = [
+            self.executor.submit(load_account_bytes, client=self.connector, address=address) for address in addresses
+        ]
+        accounts = [account_class.parse(bytes_data=future.result()) for future in futures]
+        return accounts
+
+    def get_user_state(self) -> Tuple[UserAccount, UserPositions]:
+        """Get your user-account and your positions concurrently."""
+        user_account, user_positions = self.map_calls([
+            (call_user_account, self.user_account),
+            (call_positions_account, self.user_positions)
+        ])
+        return user_account, user_positions
+
+    def get_history(self) -> Dict[str, ElementCore]:
+        """Get every history buffer concurrently, by history type."""
+        history_types = list(HISTORY_CLASSES)
+        futures = [
+            self.executor.submit(
+                load_account_bytes,
+                client=self.connector,
+                address=getattr(CLEARING_HOUSE_ADDRESSES.history, history_type)
+            ) for history_type in history_types
+        ]
+        history = {
+            history_type: HISTORY_CLASSES[history_type].parse(bytes_data=future.result())
+            for history_type, future in zip(history_types, futures)
+        }
+        return history
+
+    """GET ACCOUNTS"""
+
+    def get_clearing_house(self) -> ClearingHouseState:
+        """Get the current state of the ClearingHouse."""
+        clearing_house = call_clearing_house(
+            client=self.connector,
+            address=CLEARING_HOUSE_ADDRESSES.state
+        )
+        return clearing_house
+
+    def get_user_account(self) -> UserAccount:
+        """Get your user-account."""
+        user_account = call_user_account(
+            client=self.connector,
+            address=self.user_account
+        )
+        return user_account
+
+    def get_positions(self) -> UserPositions:
+        """Get your positions."""
+        user_positions = call_positions_account(
+            client=self.connector,
+            address=self.user_positions
+        )
+        return user_positions
+
+    def get_all_markets(self) -> DriftMarkets:
+        """Get all markets."""
+        drift_markets = call_markets(
+            client=self.connector,
+            address=CLEARING_HOUSE_ADDRESSES.markets
+        )
+        return drift_markets
+
+    def get_market(self, symbol: str) -> DriftMarket:
+        """Get a single market."""
+        market_index = get_market_index(
+            symbol=symbol
+        )
+        all_markets = self.get_all_markets()
+        drift_market = all_markets.markets[market_index]
+        return drift_market
+
+    """SEND INSTRUCTIONS"""
+
+    def open_position(
+            self, market: str, direction: Literal['long', 'short'], quote_amount: int
+    ) -> RPCResponse:
+        """Open a position."""
+        market_index = get_market_index(
+            symbol=market
+        )
+        int_direction = position_direction(
+            direction=direction
+        )
+        open_position_response = send_open_position(
+            client=self.connector,
+            wallet=self.wallet,
+            user_positions=self.user_positions,
+            quote_asset_amount=quote_amount,
+            market_index=market_index,
+            direction=int_direction,
+            limit_price=0,
+            commitment=self.commitment
+        )
+        return open_position_response
+
+    def close_position(
+            self, market: str
+    ) -> RPCResponse:
+        """Completely close a position.
+
+        :param market: The market in which the position is held."""
+        market_index = get_market_index(
+            symbol=market
+        )
+        close_position_response = send_close_position(
+            client=self.connector,
+            wallet=self.wallet,
+            market_index=market_index,
+            user_positions=self.user_positions,
+            commitment=self.commitment
+        )
+        return close_position_response
+
+    def deposit_collateral(
+            self, amount: Number
+    ) -> RPCResponse:
+        """Deposit collateral."""
+        deposit_collateral_response = send_deposit_collateral(
+            client=self.connector,
+            wallet=self.wallet,
+            user_positions=self.user_positions,
+            amount=amount,
+            user_collateral_account=self.user_collateral_account,
+            commitment=self.commitment
+        )
+        return deposit_collateral_response
+
+    def withdraw_collateral(
+            self, amount: Number
+    ) -> RPCResponse:
+        """Withdraw collateral."""
+        withdraw_collateral_response = send_withdraw_collateral(
+            client=self.connector,
+            wallet=self.wallet,
+            user_positions=self.user_positions,
+            amount=amount,
+            user_collateral_account=self.user_collateral_account,
+            commitment=self.commitment
+        )
+        return withdraw_collateral_response
+
+    def to_dict(self) -> dict:
+        """For pretty printing."""
+        my_dict = {
+            'connector': {
+                'endpoint': self.endpoint,
+                'commitment': self.commitment
+            },
+            'wallet_address': self.wallet.public_key.__str__(),
+            'user_account_address': self.user_account.__str__(),
+            'user_positions_address': self.user_positions.__str__(),
+            'user_collateral_account': self.user_collateral_account.__str__()
+        }
+        return my_dict
+
+    def __str__(self):
+        my_dict = self.to_dict()
+        return json.dumps(my_dict, sort_keys=False, indent=4)
@@ -0,0 +1,313 @@
+import os
+import tempfile
+from types import SimpleNamespace
+
+import numpy as np
+from solana.keypair import Keypair
+from solana.publickey import PublicKey
+
+from sdk.archive.snapshot import SnapshotAccount, SnapshotReader, write_snapshot
+from sdk.constants import SWAP_DIRECTION
+from sdk.math.amm import (
+    to_exact_array, calculate_mark_price, swap_quote_asset, swap_base_asset, calculate_base_asset_value,
+    calculate_trade_slippage, calculate_repeg_cost, calculate_adjust_k_cost, calculate_swap_output, get_amm_arrays
+)
+from sdk.math.funding import (
+    DEFAULT_MINIMUM_FUNDING_PAYMENT, FundingRateArrays, UnsettledFunding, calculate_funding_payment,
+    get_unsettled_funding, get_funding_rate_arrays
+)
+from sdk.math.margin import (
+    MarginEngine, get_position_columns, calculate_margin, approximate_margin_ratio, to_float_columns
+)
+from sdk.math.slippage import SlippageTable
+from sdk.sends.synchronous import send_settle_funding_payments
+from sdk.utils import position_direction
+
+
+# A SOL-PERP sized curve: sqrt_k of 5M SOL, mark price around 142.6 USDC and
+# reserves in AMM_RESERVE_PRECISION. The expected values below were worked out
+# step by step with python integers, following the u128 math of the program
+
+sqrt_k = 50_000_000_000_000_000_000
+base_asset_reserve = 49_993_835_296_402_114_120
+quote_asset_reserve = 50_006_165_463_763_018_730
+peg_multiplier = 142_573
+
+mark_price = calculate_mark_price(base_asset_reserve, quote_asset_reserve, peg_multiplier)
+print("Mark price: ", mark_price)
+
+assert mark_price == 1_426_081_633_144
+
+# A 1000 USDC long takes base out of the pool at a price a bit above the mark
+
+base_asset_amount, new_base_asset_reserve, new_quote_asset_reserve = swap_quote_asset(
+    1_000_000_000, SWAP_DIRECTION.add, base_asset_reserve, quote_asset_reserve, sqrt_k, peg_multiplier
+)
+print("Base asset bought: ", base_asset_amount)
+
+assert base_asset_amount == 70_122_114_621_150
+assert new_base_asset_reserve == 49_993_765_174_287_492_970
+assert new_quote_asset_reserve == 50_006_235_603_270_499_108
+
+price_impact, entry_price, new_mark_price, _ = calculate_trade_slippage(
+    position_direction('long'), 1_000_000_000, base_asset_reserve, quote_asset_reserve, sqrt_k, peg_multiplier
+)
+print("Entry price: ", entry_price, "price impact: ", price_impact)
+
+assert entry_price == 1_426_083_633_391
+assert new_mark_price == 1_426_085_633_640
+assert price_impact == 14_026
+
+# Selling 25 SOL into the pool returns less quote than buying 25 SOL out of
+# it costs, the buyer paying one extra unit of quote asset
+
+quote_asset_amount, _, _ = swap_base_asset(
+    250_000_000_000_000, SWAP_DIRECTION.add, base_asset_reserve, quote_asset_reserve, sqrt_k, peg_multiplier
+)
+assert quote_asset_amount == 3_565_186_254
+assert calculate_base_asset_value(
+    250_000_000_000_000, base_asset_reserve, quote_asset_reserve, sqrt_k, peg_multiplier
+) == quote_asset_amount
+
+quote_asset_amount, _, _ = swap_base_asset(
+    250_000_000_000_000, SWAP_DIRECTION.remove, base_asset_reserve, quote_asset_reserve, sqrt_k, peg_multiplier
+)
+assert quote_asset_amount == 3_565_221_912
+
+# With 12,345.678 SOL of net longs, raising the peg to 143 costs the fee pool
+# the gain of the longs, and so does raising sqrt_k by 1%
+
+market_base_asset_amount = 123_456_780_000_000_000
+repeg_cost = calculate_repeg_cost(
+    market_base_asset_amount, base_asset_reserve, quote_asset_reserve, sqrt_k, peg_multiplier, 143_000
+)
+print("Repeg cost: ", repeg_cost)
+
+assert repeg_cost == 5_259_915_616
+
+adjust_k_cost = calculate_adjust_k_cost(
+    market_base_asset_amount, base_asset_reserve, quote_asset_reserve, sqrt_k, peg_multiplier, sqrt_k * 101 // 100
+)
+print("Adjust k cost: ", adjust_k_cost)
+
+assert adjust_k_cost == 42_835_591
+
+# The batch path over object arrays gives the same integers as the scalar one
+
+quote_asset_amounts = to_exact_array([1, 1_000_000_000, 250_000_000_000])
+batch_base_asset_amount, _, _ = swap_quote_asset(
+    quote_asset_amounts, SWAP_DIRECTION.add, base_asset_reserve, quote_asset_reserve, sqrt_k, peg_multiplier
+)
+assert [
+    swap_quote_asset(int(amount), SWAP_DIRECTION.add, base_asset_reserve, quote_asset_reserve, sqrt_k,
+                     peg_multiplier)[0]
+    for amount in quote_asset_amounts
+] == list(batch_base_asset_amount)
+assert batch_base_asset_amount[1] == 70_122_114_621_150
+assert calculate_repeg_cost(
+    to_exact_array([market_base_asset_amount, -market_base_asset_amount]), base_asset_reserve, quote_asset_reserve,
+    sqrt_k, peg_multiplier, 143_000
+)[0] == repeg_cost
+assert np.all(calculate_adjust_k_cost(
+    market_base_asset_amount, base_asset_reserve, quote_asset_reserve, sqrt_k, peg_multiplier,
+    to_exact_array([sqrt_k, sqrt_k * 101 // 100])
+) == [0, adjust_k_cost])
+
+# In a batch, a swap draining the pool only voids its own row, while on its
+# own it raises
+
+new_output_asset_reserve, _ = calculate_swap_output(
+    to_exact_array([10**13, base_asset_reserve + 1]), base_asset_reserve, SWAP_DIRECTION.remove, sqrt_k
+)
+assert new_output_asset_reserve[0] > quote_asset_reserve
+assert np.isnan(new_output_asset_reserve[1])
+try:
+    calculate_swap_output(base_asset_reserve + 1, base_asset_reserve, SWAP_DIRECTION.remove, sqrt_k)
+    assert False
+except Exception as e:
+    assert str(e) == 'Trade size too large.'
+
+# The slippage tables start at the mark price and get worse with size on
+# both sides, so their lookups can be inverted
+
+amm = SimpleNamespace(
+    base_asset_reserve=base_asset_reserve, quote_asset_reserve=quote_asset_reserve, sqrt_k=sqrt_k,
+    peg_multiplier=peg_multiplier
+)
+slippage_table = SlippageTable.from_amm(amm)
+print("Short fill prices: ", slippage_table.short_fill_prices[:3])
+
+assert slippage_table.long_fill_prices[0] == slippage_table.short_fill_prices[0] == mark_price / 1e10
+assert np.all(np.diff(slippage_table.long_fill_prices) >= 0)
+assert np.all(np.diff(slippage_table.short_fill_prices) <= 0)
+assert slippage_table.fill_price(0, 'short') == slippage_table.mark_price
+assert slippage_table.size_for_price(slippage_table.mark_price, 'short') == 0
+short_size = slippage_table.size_for_price(slippage_table.mark_price * 0.999, 'short')
+print("Short size for a 0.1% worse fill: ", short_size)
+
+assert short_size > 0
+assert abs(slippage_table.fill_price(short_size, 'short') / (slippage_table.mark_price * 0.999) - 1) < 1e-6
+
+# Beyond the largest size of a table, fill prices come from the exact swap
+# math rather than the last grid point, and a short draining the pool raises
+
+oversized_quote_size = 2 * slippage_table.long_quote_sizes[-1]
+_, oversized_entry_price, _, _ = calculate_trade_slippage(
+    position_direction('long'), int(oversized_quote_size * 1_000_000), base_asset_reserve, quote_asset_reserve, sqrt_k,
+    peg_multiplier
+)
+print("Oversized long fill price: ", slippage_table.fill_price(oversized_quote_size, 'long'))
+
+assert slippage_table.fill_price(oversized_quote_size, 'long') == oversized_entry_price / 1e10
+assert slippage_table.fill_price(oversized_quote_size, 'long') > slippage_table.long_fill_prices[-1]
+assert slippage_table.price_impact(oversized_quote_size, 'long') > slippage_table.price_impact(
+    slippage_table.long_quote_sizes[-1], 'long'
+)
+try:
+    slippage_table.fill_price(1e9, 'short')
+    assert False
+except Exception as e:
+    assert str(e) == 'Trade size too large.'
+
+# Funding is settled against the cumulative rate of the side of the position:
+# when it rises by 0.01 USDC per SOL, a 1 SOL long pays 10_000 QUOTE_PRECISION
+# and a 1 SOL short receives as much, truncated toward zero like on-chain
+
+one_sol = 10_000_000_000_000
+funding_rate_delta = 1_000_000_000_000
+funding_payment = calculate_funding_payment(one_sol, 0, funding_rate_delta, 0)
+print("Funding payment of a long: ", funding_payment)
+
+assert funding_payment == -10_000
+assert calculate_funding_payment(-one_sol, 0, 0, funding_rate_delta) == 10_000
+assert calculate_funding_payment(-one_sol, 0, funding_rate_delta, 0) == 0
+assert calculate_funding_payment(one_sol, 0, funding_rate_delta + 1, 0) == -10_000
+assert calculate_funding_payment(one_sol, 0, -funding_rate_delta - 1, 0) == 10_000
+assert list(calculate_funding_payment(
+    to_exact_array([one_sol, -one_sol]), 0, to_exact_array([funding_rate_delta] * 2), 0
+)) == [-10_000, 0]
+
+# The unsettled funding of many users keeps those moving their collateral by
+# at least the minimum of 1 USDC, largest first, and their settlements are
+# packed into transactions of at most 10 instructions
+
+funding_users = [PublicKey(i + 1) for i in range(24)]
+funding_user_positions = [PublicKey(100 + i) for i in range(24)]
+empty_position = SimpleNamespace(market_index=0, base_asset_amount=0, quote_asset_amount=0,
+                                 last_cumulative_funding_rate=0)
+funding_position_columns = get_position_columns(
+    SimpleNamespace(positions=[
+        SimpleNamespace(market_index=0, base_asset_amount=-(i + 1) * 10 * one_sol, quote_asset_amount=0,
+                        last_cumulative_funding_rate=0),
+        SimpleNamespace(market_index=1, base_asset_amount=one_sol, quote_asset_amount=0,
+                        last_cumulative_funding_rate=0),
+    ] + [empty_position] * 3)
+    for i in range(24)
+)
+funding_rate_arrays = FundingRateArrays(
+    cumulative_funding_rate_long=to_exact_array([0, 0]),
+    cumulative_funding_rate_short=to_exact_array([funding_rate_delta, 0])
+)
+unsettled_funding = get_unsettled_funding(
+    funding_users, funding_user_positions, funding_position_columns, funding_rate_arrays
+)
+print("Largest unsettled funding: ", unsettled_funding[0])
+
+assert [unsettled.user for unsettled in unsettled_funding] == funding_users[9:][::-1]
+assert unsettled_funding[-1].funding_payment == DEFAULT_MINIMUM_FUNDING_PAYMENT
+assert unsettled_funding[0] == UnsettledFunding(
+    user=funding_users[-1], user_positions=funding_user_positions[-1], funding_payment=2_400_000,
+    positions_to_settle=1
+)
+
+
+class FakeSolanaClient:
+    transactions = []
+
+    def send_transaction(self, transaction, *signers, opts=None):
+        self.transactions.append(transaction)
+        return {'result': str(len(self.transactions))}
+
+
+fake_solana_client = FakeSolanaClient()
+rpc_responses = send_settle_funding_payments(
+    fake_solana_client, 'processed', Keypair.from_seed(bytes(32)), unsettled_funding
+)
+assert len(rpc_responses) == 2
+assert [len(transaction.instructions) for transaction in fake_solana_client.transactions] == [10, 5]
+assert fake_solana_client.transactions[0].instructions[0].keys[1].pubkey == funding_users[-1]
+assert fake_solana_client.transactions[0].instructions[0].keys[3].pubkey == funding_user_positions[-1]
+
+# The margin engine computes users in float64 and only those near a margin
+# ratio threshold exactly; users one unit of margin ratio inside and outside
+# every threshold are flagged as the integer math of the clearing house does
+
+margin_markets = SimpleNamespace(markets=[SimpleNamespace(amm=SimpleNamespace(
+    base_asset_reserve=base_asset_reserve, quote_asset_reserve=quote_asset_reserve, sqrt_k=sqrt_k,
+    peg_multiplier=peg_multiplier, cumulative_funding_rate_long=0, cumulative_funding_rate_short=0
+))])
+margin_amm_arrays = get_amm_arrays(market.amm for market in margin_markets.markets)
+margin_funding_rate_arrays = get_funding_rate_arrays(market.amm for market in margin_markets.markets)
+margin_engine = MarginEngine(SimpleNamespace(
+    margin_ratio_initial=2000, margin_ratio_partial=625, margin_ratio_maintenance=500
+))
+
+margin_collateral = []
+margin_positions = []
+for position_base_asset_amount in [10 * one_sol, -7 * one_sol, 250_000 * one_sol]:
+    position_value = calculate_base_asset_value(
+        abs(position_base_asset_amount), base_asset_reserve, quote_asset_reserve, sqrt_k, peg_multiplier
+    ) if position_base_asset_amount > 0 else swap_base_asset(
+        -position_base_asset_amount, SWAP_DIRECTION.remove, base_asset_reserve, quote_asset_reserve, sqrt_k,
+        peg_multiplier
+    )[0]
+    for target_margin_ratio in [250, 499, 500, 501, 624, 625, 626, 1999, 2000, 2001, 20000]:
+        # the least collateral reaching the margin ratio, with the position bought at its value
+        margin_collateral.append(-(-target_margin_ratio * position_value // 10_000))
+        margin_positions.append(SimpleNamespace(positions=[SimpleNamespace(
+            market_index=0, base_asset_amount=position_base_asset_amount, quote_asset_amount=position_value,
+            last_cumulative_funding_rate=0
+        )] + [empty_position] * 4))
+margin_collateral = to_exact_array(margin_collateral)
+margin_position_columns = get_position_columns(margin_positions)
+exact_margin = calculate_margin(
+    margin_collateral, margin_position_columns, margin_amm_arrays, margin_funding_rate_arrays
+)
+print("Exact margin ratios: ", list(exact_margin.margin_ratio))
+
+assert list(exact_margin.margin_ratio) == [250, 499, 500, 501, 624, 625, 626, 1999, 2000, 2001, 20000] * 3
+
+for exact in [False, True]:
+    user_margin = margin_engine.calculate(margin_collateral, margin_position_columns, margin_markets, exact=exact)
+    # the users far from every threshold keep their float64 margin ratio, off by rounding only
+    assert np.all(np.abs(user_margin.margin_ratio - exact_margin.margin_ratio).astype(np.float64) <= 1)
+    near_threshold = (exact_margin.margin_ratio != 250) & (exact_margin.margin_ratio != 20000)
+    assert list(user_margin.margin_ratio[near_threshold]) == list(exact_margin.margin_ratio[near_threshold])
+    assert list(user_margin.partially_liquidatable) == list(exact_margin.margin_ratio <= 625)
+    assert list(user_margin.fully_liquidatable) == list(exact_margin.margin_ratio <= 500)
+    assert list(user_margin.free_collateral >= 0) == list(exact_margin.margin_ratio >= 2000)
+
+# The float64 margin ratio used to screen users stays within one unit of the
+# exact one, so a screening threshold with any margin keeps every user at risk
+
+approximate_ratio = approximate_margin_ratio(
+    np.asarray(margin_collateral, dtype=np.float64), to_float_columns(margin_position_columns), margin_amm_arrays,
+    margin_funding_rate_arrays
+)
+print("Approximate margin ratios: ", approximate_ratio.tolist())
+
+assert np.all(np.abs(approximate_ratio - exact_margin.margin_ratio.astype(np.float64)) <= 1)
+assert np.all((approximate_ratio <= 626)[exact_margin.margin_ratio <= 625])
+assert not np.any((approximate_ratio <= 626)[exact_margin.margin_ratio > 627])
+
+
+# Raw views of a snapshot share its memory map, so closing the reader while one
+# is alive leaves the map to be released with the last view
+
+with tempfile.TemporaryDirectory() as snapshot_directory:
+    snapshot_path = os.path.join(snapshot_directory, 'snapshot')
+    write_snapshot(snapshot_path, [SnapshotAccount(pubkey=PublicKey(1), kind='UserAccount', data=b'account')])
+    with SnapshotReader(snapshot_path) as snapshot_reader:
+        raw_account = snapshot_reader.raw(PublicKey(1))
+    assert bytes(raw_account) == b'account'
+    raw_account.release()
@@ -1,7 +1,7 @@
 """General utility."""
-from typing import Literal, Optional
+from hashlib import sha256
+from typing import List, Literal, Optional
 from solana.publickey import PublicKey
-from solana.rpc.api import Client
 from sdk.constants import *
 
 
@@ -17,6 +17,13 @@ def get_user_account_address(authority: PublicKey) -> PublicKey:
     return user_account_address
 
 
+def get_account_discriminator(account_name: str) -> bytes:
+    """Get the 8-byte anchor discriminator that prefixes the data of an account type, e.g. 'User'."""
+    formatted_string = f'account:{account_name}'
+    discriminator = sha256(formatted_string.encode('utf-8')).digest()[:8]
+    return discriminator
+
+
 def get_clearing_house_state_address() -> PublicKey:
     """Get the Drift clearing-house address."""
     clearing_house_state_address_tuple = PublicKey.find_program_address(
@@ -70,4 +77,42 @@ def get_market_index(symbol: str) -> Optional[int]:
         raise Exception('Invalid market symbol.')
 
 
+def get_transaction_size(transaction_instructions: list, fee_payer: PublicKey) -> int:
+    """Get the size in bytes of a signed transaction holding instructions."""
+    # imported here so that importing the utils does not pull in the signing libraries
+    from solana.transaction import Transaction
+    transaction = Transaction(
+        # any blockhash has the same size
+        recent_blockhash=str(PublicKey(0)),
+        fee_payer=fee_payer
+    )
+    transaction.add(*transaction_instructions)
+    message = transaction.serialize_message()
+    # the message header starts with the number of signatures, each 64 bytes, prefixed by their count
+    number_of_signatures = message[0]
+    return 1 + 64 * number_of_signatures + len(message)
+
+
+def pack_transaction_instructions(
+        transaction_instructions: list, fee_payer: PublicKey, max_instructions: int
+) -> List[list]:
+    """Split instructions, in order, into as few transactions as fit MAX_TRANSACTION_SIZE.
 
+    :param transaction_instructions: The instructions to send.
+    :param fee_payer: The public key paying for the transactions.
+    :param max_instructions: The most instructions in one transaction, e.g. to stay within its compute budget."""
+    batches = []
+    batch = []
+    for transaction_instruction in transaction_instructions:
+        candidate_batch = batch + [transaction_instruction]
+        if batch and (
+                len(candidate_batch) > max_instructions
+                or get_transaction_size(candidate_batch, fee_payer) > MAX_TRANSACTION_SIZE
+        ):
+            batches.append(batch)
+            batch = [transaction_instruction]
+        else:
+            batch = candidate_batch
+    if batch:
+        batches.append(batch)
+    return batches